@@ -1,83 +1,348 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
-import requests
-from io import BytesIO
 import threading
 import time
 import subprocess
-from utils.login_fetcher import fetch_steam_cookies
-from utils.steam_fetcher import fetch_wallpaper_ids,WallpaperInfo
-from utils.display_utils import get_displays
-from utils.process_utils import kill_wallpaper_processes, WallpaperManager
-import asyncio
+import sys
+from utils.display_utils import DisplayTopology
+from utils.process_utils import PREFETCH_OFF, PREFETCH_STANDBY
+from utils.control import ControlClient, ControlError, spawn_daemon
+from utils.thumbnail_cache import ThumbnailCache
+from utils.thumbnail_decode import ThumbnailDecoder
+from utils.preview_downloader import PreviewDownloader
+from utils.preview_resolver import PreviewResolver
+from utils.library import LOCAL_PREVIEW, WallpaperLibrary
+from utils.workshop_scanner import WorkshopScanner
 import concurrent.futures
-from queue import Queue
+from queue import Empty, Queue
+from collections import OrderedDict
 import os
 import json
 import os.path
 from tkinter import simpledialog  # Add this import at the top
 
+# Not needed for the first frame, imported where they are used:
+# PIL (previews), requests (downloads), utils.steam_fetcher (HTML parsing and
+# the HTTP stack), utils.login_fetcher (browser_cookie3)
+HEAVY_MODULES = ['PIL', 'requests', 'bs4', 'lxml', 'browser_cookie3', 'psutil', 'asyncio']
+STARTUP_BUDGET = 0.5  # Seconds from interpreter start to the first painted frame
+
 class ScrollableFrame(ttk.Frame):
     def __init__(self, container, *args, **kwargs):
         super().__init__(container, *args, **kwargs)
         self.canvas = tk.Canvas(self)  # Make canvas accessible
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
         self.scrollable_frame = ttk.Frame(self.canvas)
 
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
+        self.scrollable_frame.bind("<Configure>", self._on_frame_configure)
 
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.frame_window = self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
 
         self.canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar.pack(side="right", fill="y")
+
+        # Virtualized list state, see set_virtual_rows()
+        self.virtual = False
+        self.item_count = 0
+        self.row_height = 1
+        self.create_row = None
+        self.bind_row = None
+        self.row_key = None
+        self.row_pool = []
+        self.row_windows = []
+        self.row_indices = []
+        self.row_keys = []  # Key of the item each pooled row is bound to
+        self.on_view_change = None  # on_view_change(first, last) after the visible rows changed
+        self.bind_count = 0  # bind_row() calls so far, to see how much a refresh touched
+
+    def _on_frame_configure(self, event):
+        if not self.virtual:
+            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+
+    def _on_canvas_configure(self, event):
+        if self.virtual:
+            for window in self.row_windows:
+                self.canvas.itemconfigure(window, width=event.width)
+            self._ensure_pool()
+            self.refresh_rows()
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.virtual:
+            self.refresh_rows()
 
     def scroll_to_top(self):
         self.canvas.yview_moveto(0)
 
+    def set_virtual_rows(self, item_count, row_height, create_row, bind_row, row_key=None, top_index=None):
+        """Show item_count fixed-height rows backed by a small pool of widgets.
+
+        create_row(parent) builds one reusable row widget and bind_row(row, index)
+        points it at the item at index. Only enough rows to cover the viewport
+        are created; they are re-bound to other items as the view scrolls.
+
+        row_key(index) identifies the item at index. Calling this again with
+        new items reconciles by key: a row already showing an item is only
+        moved to the item's new position, so just the rows for new or changed
+        items are re-bound. Without row_key every row is re-bound. top_index
+        scrolls that item to the top first, e.g. to keep the view steady.
+        """
+        if create_row is not self.create_row or row_height != self.row_height:
+            self.clear_rows()
+        self.virtual = True
+        self.canvas.itemconfigure(self.frame_window, state="hidden")
+        self.item_count = item_count
+        self.row_height = row_height
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.row_key = row_key
+        self.canvas.configure(scrollregion=(0, 0, 0, item_count * row_height))
+        if top_index is not None and item_count:
+            self.canvas.yview_moveto(top_index / item_count)
+        self._ensure_pool()
+        self.refresh_rows(force=row_key is None)
+
+    def clear_rows(self):
+        """Destroy the row pool so the next set_virtual_rows() builds fresh rows"""
+        for window, row in zip(self.row_windows, self.row_pool):
+            self.canvas.delete(window)
+            row.destroy()
+        self.row_pool = []
+        self.row_windows = []
+        self.row_indices = []
+        self.row_keys = []
+
+    def _ensure_pool(self):
+        """Grow the pool to cover the viewport height plus one partial row"""
+        viewport = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        needed = viewport // self.row_height + 2
+        if len(self.row_pool) >= needed:
+            return
+        width = max(self.canvas.winfo_width(), int(self.canvas.cget("width")))
+        while len(self.row_pool) < needed:
+            row = self.create_row(self.canvas)
+            window = self.canvas.create_window(0, 0, window=row, anchor="nw", width=width, state="hidden")
+            self.row_pool.append(row)
+            self.row_windows.append(window)
+            self.row_indices.append(None)
+            self.row_keys.append(None)
+
+    def visible_range(self):
+        """Return the (first, last) item indices currently in the viewport"""
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.row_height))
+        last = min(self.item_count, first + len(self.row_pool)) - 1
+        return first, last
+
+    def refresh_rows(self, force=False):
+        """Re-bind pooled rows to the items that are now in view.
+
+        Rows keep the item they show as long as it stays in view, wherever it
+        moved to; only the leftover rows are re-bound, so scrolling by one row
+        or inserting one item re-binds a single widget.
+        """
+        if not self.row_pool:
+            return
+        if force:
+            self.row_keys = [None] * len(self.row_pool)
+        first, _ = self.visible_range()
+        last = min(self.item_count, first + len(self.row_pool))
+        key_of = self.row_key or (lambda index: index)
+        wanted = {key_of(index): index for index in range(first, last)}
+
+        placed = {}  # index -> slot of the row already showing its item
+        free = []
+        for slot, key in enumerate(self.row_keys):
+            index = wanted.get(key) if key is not None else None
+            if index is not None and index not in placed:
+                placed[index] = slot
+            else:
+                free.append(slot)
+
+        for index in range(first, last):
+            slot = placed.get(index)
+            if slot is None:
+                slot = free.pop()
+                self.bind_row(self.row_pool[slot], index)
+                self.bind_count += 1
+                self.row_keys[slot] = key_of(index)
+                self.row_indices[slot] = None
+            if self.row_indices[slot] != index:
+                window = self.row_windows[slot]
+                self.canvas.coords(window, 0, index * self.row_height)
+                self.canvas.itemconfigure(window, state="normal")
+                self.row_indices[slot] = index
+        for slot in free:
+            if self.row_indices[slot] is not None or self.row_keys[slot] is not None:
+                self.canvas.itemconfigure(self.row_windows[slot], state="hidden")
+                self.row_indices[slot] = None
+                self.row_keys[slot] = None
+        if self.on_view_change:
+            self.on_view_change(first, last - 1)
+
 class LoginApp:
+    THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024  # Disk budget for resized previews
+    ROW_HEIGHT = 108  # 100px preview plus padding
+    PHOTO_CACHE_SIZE = 200  # PhotoImages kept around for recently shown rows
+    DISPLAY_POLL_MS = 500  # How often queued display changes are applied
+    IMAGE_PUMP_MS = 16  # Image pump period while previews are arriving, about once per frame
+    IMAGE_IDLE_MS = 100  # ... and while nothing is queued
+    IMAGE_BATCH_SIZE = 8  # Most previews attached per pump tick
+    IMAGE_BATCH_BUDGET = 0.008  # Seconds of UI thread time per tick before yielding
+    SEARCH_DELAY_MS = 150  # Typing pause before the list is filtered
+    WORKSHOP_POLL_MS = 500  # How often queued workshop changes are applied
+    STARTUP_POLL_MS = 20  # How often the startup tasks on the executor are checked
+
     def __init__(self, root):
         self.root = root
         self.root.title("Linux Wallpaper Engine")
-        self.cache_file = os.path.join(os.path.dirname(__file__), "wallpapers.txt")
+        self.cache_file = os.path.join(os.path.dirname(__file__), "wallpapers.txt")  # Pre-library cache, migrated once
+        self.library_file = os.path.join(os.path.dirname(__file__), "library.db")
         self.config_file = os.path.join(os.path.dirname(__file__), ".config")
+        self.refresh_state_file = os.path.join(os.path.dirname(__file__), ".refresh_state")
+        self.thumbnail_dir = os.path.join(os.path.dirname(__file__), ".thumbnails")
+        self.steam_session_file = os.path.join(os.path.dirname(__file__), ".steam_session")
+        self.workshop_index_file = os.path.join(os.path.dirname(__file__), ".workshop_index")
         self.steam_username = self.load_config()
         
-        # Kill any existing wallpaper processes first
-        kill_wallpaper_processes()
-        time.sleep(0.2)  # Give processes time to die
-        
         # Initialize basic variables
         
         self.wallpapers = []
+        self.shown_wallpapers = []  # self.wallpapers filtered by the search box
+        self.wallpaper_titles = {}  # id -> title, for installed wallpapers
         self.selected_wallpapers = []
+        self.library = None  # Opened in finish_startup()
+        self.workshop = None  # Installed wallpapers, scanned in finish_startup()
+        self.workshop_changes = Queue()
+        self.search_var = tk.StringVar()
+        self.search_job = None
         self.is_auto_switching = False
         self.switch_interval = tk.IntVar(value=300)
-        self.wallpaper_manager = WallpaperManager()
+        self.preload_next = tk.BooleanVar(value=False)
+        self.governor_enabled = tk.BooleanVar(value=False)
+        # Engines and auto-switching live in the wallpaper daemon, see wallpaper_changer.py
+        self.daemon = ControlClient()
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
         self.button_cooldown = {}
         self.change_queue = Queue()
         self.wallpaper_checkboxes = {}  # Add dictionary to store checkbox variables
-        self.image_cache = {}  # Add image cache
+        self.thumbnail_cache = None  # Indexed in finish_startup()
+        self.thumbnail_decoder = None  # Created in finish_startup()
+        self.photo_cache = OrderedDict()  # preview url -> PhotoImage, LRU
+        self.placeholder_image = tk.PhotoImage(width=100, height=100)
         self.future_tasks = set()  # Track async tasks
-        self.silent_mode = True  # Add silent mode state
+        self.pending_previews = {}  # preview url -> index of the row waiting for it
+        self.preview_downloader = None  # Created in finish_startup()
+        self.preview_resolver = None  # Created in finish_startup()
+        self.local_previews = {}  # preview url -> preview file of the installed wallpaper
+        self.finished_images = Queue()  # (preview url, PIL image or None) from the loader threads
+        self.pump_stats = {'batches': 0, 'images': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+        self.silent_mode = True  # Add silent mode state, synced from the daemon
+        # Cached outputs; hotplug changes arrive as diffs through display_changes
+        self.display_topology = DisplayTopology()
+        self.display_changes = Queue()
 
         # Initialize GUI elements first
         self.setup_gui()
-        
-        # Start worker thread
+
+        # The rest of startup waits until the window has been drawn once
+        self.startup_marks = [('created', time.monotonic())]
+        self.startup_done = False
+        self.startup_scheduled = False
+        self.startup_pending = set()  # Startup tasks still running on the executor
+        self.root.bind('<Map>', self._on_first_map, add='+')
+        if self.root.winfo_ismapped():
+            self._on_first_map(None)  # Already shown, e.g. by the username prompt
+
+    def _on_first_map(self, event):
+        if self.startup_scheduled or (event is not None and event.widget is not self.root):
+            return
+        self.startup_scheduled = True
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        """Second startup phase, after the first paint.
+
+        The slow parts run on the executor: indexing the thumbnail cache and
+        loading the library, reading the displays, and reaching the daemon.
+        Each hands its result back to the Tk thread through after_future(),
+        so the window stays responsive while they finish in any order.
+        """
+        self.root.update_idletasks()  # Flush the first frame before the slow part
+        self.startup_marks.append(('first_paint', time.monotonic()))
+        self.modules_at_first_paint = set(sys.modules)
+
+        # decode_processes=N in the config decodes previews on N worker processes
+        self.thumbnail_decoder = ThumbnailDecoder(processes=self.get_config_int('decode_processes', 0))
+        self.preview_downloader = PreviewDownloader(self.on_preview_downloaded)
+        self.wallpaper_frame.on_view_change = self.preview_downloader.set_viewport
         self.start_wallpaper_worker()
-        
-        # Try loading from cache silently
-        if os.path.exists(self.cache_file):
-            self.load_from_cache()
+        self.login_button.config(state='disabled')  # Until the library is open
+
+        self.startup_pending = {'library', 'displays', 'daemon'}
+        self.after_future(self.executor.submit(self.open_library), self.library_opened, 'library')
+        self.after_future(self.executor.submit(self.display_topology.refresh), self.displays_read, 'displays')
+        self.after_future(self.executor.submit(self.start_daemon), self.daemon_started, 'daemon')
+
+    def after_future(self, future, callback, step):
+        """Run callback(future) on the Tk thread once future is done, then mark step finished"""
+        if not future.done():
+            self.root.after(self.STARTUP_POLL_MS, self.after_future, future, callback, step)
+            return
+        try:
+            callback(future)
+        finally:
+            self.startup_pending.discard(step)
+            if not self.startup_pending:
+                self.startup_marks.append(('ready', time.monotonic()))
+                self.startup_done = True
+
+    def open_library(self):
+        """On the executor: index the thumbnail cache, open the library and scan the installed wallpapers"""
+        thumbnail_cache = ThumbnailCache(self.thumbnail_dir, max_bytes=self.THUMBNAIL_CACHE_BYTES)
+        library = WallpaperLibrary(self.library_file)
+        library.migrate_json(self.cache_file)
+        # Installed wallpapers come straight from disk, no network or cookies needed.
+        # Warm starts only stat each item against .workshop_index.
+        workshop = WorkshopScanner(index_path=self.workshop_index_file)
+        workshop.refresh()
+        library.apply_local(workshop.wallpapers(), full=True)
+        return thumbnail_cache, library, workshop
+
+    def library_opened(self, future):
+        try:
+            self.thumbnail_cache, self.library, self.workshop = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load the wallpaper library: {str(e)}")
+            # Fetching from Steam still works, the list just is not stored
+            self.thumbnail_cache = ThumbnailCache(self.thumbnail_dir, max_bytes=self.THUMBNAIL_CACHE_BYTES)
+        finally:
+            self.login_button.config(state='normal')
+        self.preview_resolver = PreviewResolver(self.thumbnail_cache, self.thumbnail_decoder)
+        self.pump_images()
+        if self.library is None:
+            return
+        self.workshop.add_listener(self.on_workshop_change)
+        self.workshop.start()
+        self.poll_workshop_changes()
+        if self.library.count():
+            self.load_from_library()
             self.display_wallpapers()  # No parameters needed anymore
             self.login_button.config(text="Refresh Wallpapers")
 
+    def displays_read(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to detect displays: {str(e)}")
+        else:
+            self.load_displays()
+        self.display_topology.add_listener(self.on_display_change)  # After the initial read
+        self.display_topology.start()
+        self.poll_display_changes()
+
     def load_config(self):
         """Load configuration from file"""
         try:
@@ -91,6 +356,27 @@ class LoginApp:
             print(f"Error loading config: {e}")
             return self.prompt_username()
 
+    def get_config_value(self, key, default=None):
+        """Read an optional key=value setting from the config file"""
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r') as f:
+                    for line in f:
+                        if line.startswith(f'{key}='):
+                            return line.strip().split('=', 1)[1]
+        except Exception as e:
+            print(f"Error loading config: {e}")
+        return default
+
+    def get_config_int(self, key, default=0):
+        """A whole-number setting; a value that does not parse is reported and replaced by default"""
+        value = self.get_config_value(key, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            print(f"Ignoring {key}={value!r} in the config, using {default}", file=sys.stderr)
+            return default
+
     def prompt_username(self):
         """Prompt user for Steam username and save it"""
         username = simpledialog.askstring(
@@ -106,8 +392,13 @@ class LoginApp:
     def save_config(self, username):
         """Save configuration to file"""
         try:
+            # Keep any other settings already in the file
+            lines = []
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r') as f:
+                    lines = [l.rstrip('\n') for l in f if not l.startswith('steam_username=')]
             with open(self.config_file, 'w') as f:
-                f.write(f"steam_username={username}")
+                f.write('\n'.join([f"steam_username={username}"] + lines))
         except Exception as e:
             print(f"Error saving config: {e}")
 
@@ -122,7 +413,8 @@ class LoginApp:
         self.controls_frame.pack(fill="x", pady=5)
 
         # Change button text based on cache status
-        button_text = "Refresh Wallpapers" if os.path.exists(self.cache_file) else "Load Steam Wallpapers"
+        has_list = os.path.exists(self.library_file) or os.path.exists(self.cache_file)
+        button_text = "Refresh Wallpapers" if has_list else "Load Steam Wallpapers"
         self.login_button = ttk.Button(self.controls_frame, text=button_text, command=self.login)
         self.login_button.pack(side="left", padx=5)
 
@@ -158,11 +450,27 @@ class LoginApp:
         self.toggle_switch_btn = ttk.Button(self.auto_switch_frame, text="Start Auto Switch", command=self.toggle_auto_switch)
         self.toggle_switch_btn.pack(side="left", padx=5)
 
+        ttk.Checkbutton(
+            self.auto_switch_frame,
+            text="Preload next",
+            variable=self.preload_next,
+            command=self.toggle_preload
+        ).pack(side="left", padx=5)
+
         # Add display selection frame between controls and wallpaper list
         self.display_frame = ttk.LabelFrame(self.main_frame, text="Displays")
         self.display_frame.pack(fill="x", pady=5)
-        self.display_vars = {}  # Store display checkbuttons
-        self.load_displays()
+        self.display_vars = {}  # Store display checkbuttons, filled by load_displays()
+        self.display_widgets = {}  # display name -> Frame holding its checkbutton
+
+        # Search over id, title, tags and type
+        self.search_frame = ttk.Frame(self.main_frame)
+        self.search_frame.pack(fill="x")
+        ttk.Label(self.search_frame, text="Search:").pack(side="left")
+        ttk.Entry(self.search_frame, textvariable=self.search_var, width=30).pack(side="left", padx=5)
+        self.search_status = ttk.Label(self.search_frame)
+        self.search_status.pack(side="left", padx=5)
+        self.search_var.trace_add('write', self.on_search_changed)
 
         # Scrollable wallpaper list
         self.wallpaper_frame = ScrollableFrame(self.main_frame)
@@ -176,6 +484,135 @@ class LoginApp:
         )
         self.silent_button.pack(side="left", padx=5)
 
+        # Pause or throttle the engines while the system is busy or on battery
+        ttk.Checkbutton(
+            self.controls_frame,
+            text="Pause when busy",
+            variable=self.governor_enabled,
+            command=self.toggle_governor
+        ).pack(side="left", padx=5)
+
+        ttk.Button(self.controls_frame, text="Engine Stats", command=self.show_stats).pack(side="left", padx=5)
+        ttk.Button(self.controls_frame, text="Failures", command=self.show_failures).pack(side="left", padx=5)
+
+    def start_daemon(self):
+        """On the executor: use the running wallpaper daemon, starting one if there is none.
+
+        Returns its status, None when it did not come up. A daemon answers
+        ping while it is still starting; status waits until it is done.
+        """
+        if not self.daemon.ping():
+            src_dir = os.path.dirname(os.path.abspath(__file__))
+            spawn_daemon(os.path.join(src_dir, "wallpaper_changer.py"),
+                         log_path=os.path.join(src_dir, ".daemon.log"))
+            if not self.daemon.wait_ready(5.0):
+                return None
+        return self.daemon.call('status')
+
+    def daemon_started(self, future):
+        try:
+            status = future.result()
+        except Exception as e:
+            print(f"Error starting the wallpaper daemon: {e}", file=sys.stderr)
+            status = None
+        if not status:
+            messagebox.showerror("Error", "Could not start the wallpaper daemon, see .daemon.log")
+            return
+        self.apply_daemon_status(status)
+
+    def apply_daemon_status(self, status):
+        """Show the daemon's settings, which other clients may have changed"""
+        self.silent_mode = status['silent']
+        self.silent_button.config(text=f"Silent Mode: {'On' if self.silent_mode else 'Off'}")
+        self.governor_enabled.set(status['governor'])
+        self.preload_next.set(status['prefetch'] == PREFETCH_STANDBY)
+        self.is_auto_switching = bool(status['playlists'])
+        self.toggle_switch_btn.configure(
+            text="Stop Auto Switch" if self.is_auto_switching else "Start Auto Switch")
+
+    def send_command(self, cmd, **args):
+        """Send a request to the daemon; failures are reported and return None"""
+        try:
+            return self.daemon.call(cmd, **args)
+        except ControlError as e:
+            print(f"Daemon request '{cmd}' failed: {e}", file=sys.stderr)
+            return None
+
+    def show_stats(self):
+        """Open a window with live per-display engine resource usage"""
+        window = tk.Toplevel(self.root)
+        window.title("Engine Stats")
+        columns = ("display", "wallpaper", "pid", "cpu", "rss", "pss", "threads", "uptime", "restarts")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=6)
+        for column in columns:
+            tree.heading(column, text=column.upper() if column in ("cpu", "rss", "pss") else column.title())
+            tree.column(column, width=80, anchor="e")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        pump_label = ttk.Label(window)
+        pump_label.pack(anchor="w", padx=5, pady=(0, 5))
+        preview_label = ttk.Label(window)
+        preview_label.pack(anchor="w", padx=5, pady=(0, 5))
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            stats = self.pump_stats
+            average = stats['total_ms'] / stats['batches'] if stats['batches'] else 0.0
+            pump_label.configure(text=(
+                f"Preview pump: {stats['images']} images in {stats['batches']} batches, "
+                f"UI thread {average:.1f} ms avg / {stats['max_ms']:.1f} ms max per batch"))
+            if self.preview_resolver:
+                preview_label.configure(text=self.preview_resolver.summary())
+            tree.delete(*tree.get_children())
+            engine_stats = self.send_command('stats') or {'interval': 5, 'displays': {}}
+            for display, s in sorted(engine_stats['displays'].items()):
+                tree.insert("", "end", values=(
+                    display, s['wallpaper_id'], s['pid'],
+                    f"{s['cpu_percent']:.1f}%",
+                    f"{s['rss_bytes'] / 1048576:.0f} MB",
+                    f"{s['pss_bytes'] / 1048576:.0f} MB",
+                    s['threads'],
+                    f"{s['uptime']:.0f}s",
+                    s['restarts']
+                ))
+            window.after(int(engine_stats['interval'] * 1000), refresh)
+
+        refresh()
+
+    def show_failures(self):
+        """Open a window with the engine failure log and the quarantined wallpapers"""
+        failures = self.send_command('failures') or {'log': [], 'quarantined': []}
+        window = tk.Toplevel(self.root)
+        window.title("Engine Failures")
+
+        columns = ("time", "display", "wallpaper", "status", "uptime", "action")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=12)
+        for column in columns:
+            tree.heading(column, text=column.title())
+            tree.column(column, width=100)
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        for entry in reversed(failures['log']):
+            tree.insert("", "end", values=(
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.get('time', 0))),
+                entry.get('display'),
+                entry.get('wallpaper_id'),
+                entry.get('returncode'),
+                f"{entry.get('uptime', 0):.1f}s",
+                entry.get('action')
+            ))
+
+        quarantine_label = ttk.Label(window)
+        quarantine_label.pack(fill="x", padx=5)
+
+        def update_quarantine(ids):
+            quarantine_label.config(text=f"Quarantined: {', '.join(ids) if ids else 'none'}")
+
+        def release_all():
+            update_quarantine(self.send_command('release') or [])
+
+        update_quarantine(failures['quarantined'])
+        ttk.Button(window, text="Release Quarantine", command=release_all).pack(pady=5)
+
     def start_wallpaper_worker(self):
         """Start background worker for wallpaper changes"""
         def worker():
@@ -184,62 +621,179 @@ class LoginApp:
                     wallpaper_id, display_name = self.change_queue.get()
                     if wallpaper_id is None:  # Shutdown signal
                         break
-                    self.wallpaper_manager.change_wallpaper(display_name, wallpaper_id)
+                    self.send_command('set', wallpaper_id=wallpaper_id, displays=[display_name])
                 except Exception as e:
                     print(f"Error in wallpaper worker: {e}")
         
         self.worker_thread = threading.Thread(target=worker, daemon=True)
         self.worker_thread.start()
 
-    def save_to_cache(self):
-        """Save wallpapers to cache file"""
+    def save_to_library(self):
+        """Store the refreshed list; only new, moved and removed wallpapers are written"""
         try:
-            cache_data = [{'id': w.id, 'preview_url': w.preview_url} for w in self.wallpapers]
-            with open(self.cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            changes = self.library.apply_refresh(self.wallpapers)
+            print(f"Library: +{changes['added']} ~{changes['updated']} -{changes['removed']}")
         except Exception as e:
-            print(f"Error saving cache: {e}")
+            print(f"Error saving library: {e}")
+
+    def load_from_library(self):
+        """Load the wallpaper list from the library"""
+        from utils.steam_fetcher import WallpaperInfo
 
-    def load_from_cache(self):
-        """Load wallpapers from cache file if it exists"""
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                self.wallpapers = [WallpaperInfo(id=w['id'], preview_url=w['preview_url']) 
-                                 for w in cache_data]
-                print(f"Loaded {len(self.wallpapers)} wallpapers from cache")
-                return True
+            self.wallpapers = [WallpaperInfo(id=wallpaper_id, preview_url=url)
+                               for wallpaper_id, url in self.library.subscriptions()]
+            self.wallpaper_titles = self.library.titles()
+            self.local_previews = self.library.local_previews()
+            print(f"Loaded {len(self.wallpapers)} wallpapers from the library")
+            return True
         except Exception as e:
-            print(f"Error loading cache: {e}")
+            print(f"Error loading library: {e}")
             self.wallpapers = []  # Reset wallpapers on error
         return False
 
+    def on_workshop_change(self, changed, removed):
+        """Workshop scanner listener; runs on the watcher thread, so only queue the change"""
+        self.workshop_changes.put((changed, removed))
+
+    def poll_workshop_changes(self):
+        updated = False
+        while True:
+            try:
+                changed, removed = self.workshop_changes.get_nowait()
+            except Empty:
+                break
+            try:
+                self.library.apply_local(changed, removed)
+                updated = True
+            except Exception as e:
+                print(f"Error storing workshop changes: {e}")
+        if updated:
+            self.load_from_library()
+            self.display_wallpapers()  # Only the rows that changed are rebuilt
+        self.root.after(self.WORKSHOP_POLL_MS, self.poll_workshop_changes)
+
+    def load_refresh_state(self):
+        """Load the page-probe state saved by the last refresh"""
+        try:
+            if os.path.exists(self.refresh_state_file):
+                with open(self.refresh_state_file, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading refresh state: {e}")
+        return {}
+
+    def save_refresh_state(self, state):
+        """Save the page-probe state for the next incremental refresh"""
+        try:
+            with open(self.refresh_state_file, 'w') as f:
+                json.dump(state, f)
+        except Exception as e:
+            print(f"Error saving refresh state: {e}")
+
     def cleanup_tasks(self):
         """Clean up pending tasks"""
-        for future in self.future_tasks:
+        if self.preview_downloader:
+            self.preview_downloader.cancel_all()
+        for future in list(self.future_tasks):
             if not future.done():
                 future.cancel()
         self.future_tasks.clear()
 
-    def load_preview_image(self, url):
-        """Optimized image loading with caching"""
-        if url in self.image_cache:
-            return self.executor.submit(lambda: self.image_cache[url])
-        
-        def fetch_and_cache():
-            try:
-                response = requests.get(url, timeout=5)
-                img = Image.open(BytesIO(response.content))
-                img = img.resize((100, 100), Image.Resampling.LANCZOS)
-                self.image_cache[url] = img
-                return img
-            except Exception:
-                return None
+    def load_preview_image(self, url, index):
+        """Start loading the preview for the row at index.
 
-        future = self.executor.submit(fetch_and_cache)
+        The resolver tries the disk cache and the installed wallpaper's own
+        preview file on the executor; only what is found in neither goes to
+        the viewport ordered downloader. The result is handed to
+        pump_images() through finished_images.
+        """
+        if url in self.pending_previews:
+            # Already on its way; the row may have moved, and its priority with it
+            self.pending_previews[url] = index
+            self.preview_downloader.update(url, index)
+            return
+        self.pending_previews[url] = index
+
+        def resolved(future):
+            # Runs on the loader thread; only thread-safe queues are touched from here
+            self.future_tasks.discard(future)
+            if future.cancelled():
+                self.finished_images.put((url, None))
+            elif future.exception() is None and future.result() is not None:
+                self.finished_images.put((url, future.result()))
+            elif url.startswith(LOCAL_PREVIEW):
+                self.preview_resolver.record('failed')  # Installed-only, nothing to download
+                self.finished_images.put((url, None))
+            else:
+                self.preview_downloader.request(url, self.pending_previews.get(url, index))
+
+        # An installed library is served from disk without touching the network
+        future = self.executor.submit(self.preview_resolver.resolve, url, self.local_previews.get(url))
         self.future_tasks.add(future)
-        return future
+        future.add_done_callback(resolved)
+
+    def on_preview_downloaded(self, url, data, cancelled):
+        """Downloader callback, on its worker thread: decode and cache on the executor"""
+        if data is None:
+            # Rows scrolled far away are dropped by the downloader, that is not a failure
+            self.preview_resolver.record('cancelled' if cancelled else 'failed')
+            self.finished_images.put((url, None))
+            return
+        self.preview_resolver.record('network')
+
+        def decode():
+            img = self.thumbnail_decoder.decode(data)
+            self.thumbnail_cache.put(url, img)
+            return img
+
+        try:
+            future = self.executor.submit(decode)
+        except RuntimeError:
+            return  # Shutting down
+        future.add_done_callback(lambda f: self.finished_images.put(
+            (url, None if f.cancelled() or f.exception() else f.result())))
+
+    def pump_images(self):
+        """Attach finished previews to their rows on the Tk thread.
+
+        One timer for all rows: each tick drains at most IMAGE_BATCH_SIZE
+        results or IMAGE_BATCH_BUDGET seconds, whichever comes first, and
+        records how long the batch held the UI thread.
+        """
+        start = time.perf_counter()
+        handled = 0
+        while handled < self.IMAGE_BATCH_SIZE and time.perf_counter() - start < self.IMAGE_BATCH_BUDGET:
+            try:
+                url, img = self.finished_images.get_nowait()
+            except Empty:
+                break
+            handled += 1
+            self.pending_previews.pop(url, None)
+            rows = [row for row in self.wallpaper_frame.row_pool
+                    if row.wallpaper and row.wallpaper.preview_url == url]
+            if img is None or not rows:
+                continue  # Failed, or scrolled away; the thumbnail is on disk for next time
+            photo = self.photo_cache.get(url)
+            if photo is None:
+                from PIL import ImageTk
+                photo = ImageTk.PhotoImage(img)
+                self.photo_cache[url] = photo
+                while len(self.photo_cache) > self.PHOTO_CACHE_SIZE:
+                    self.photo_cache.popitem(last=False)
+            for row in rows:
+                row.image_label.configure(image=photo)
+
+        if handled:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            stats = self.pump_stats
+            stats['batches'] += 1
+            stats['images'] += handled
+            stats['total_ms'] += elapsed_ms
+            stats['last_ms'] = elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        busy = handled or not self.finished_images.empty()
+        self.root.after(self.IMAGE_PUMP_MS if busy else self.IMAGE_IDLE_MS, self.pump_images)
 
     def toggle_wallpaper(self, wallpaper_info):
         """Toggle individual wallpaper selection"""
@@ -249,44 +803,53 @@ class LoginApp:
         else:
             self.selected_wallpapers.append(wallpaper_info)
             self.wallpaper_checkboxes[wallpaper_info.id].set(True)
+        self.sync_auto_switch()
 
     def toggle_auto_switch(self):
         self.is_auto_switching = not self.is_auto_switching
         if self.is_auto_switching:
+            if not self.start_auto_switch():
+                self.is_auto_switching = False
+                return
             self.toggle_switch_btn.configure(text="Stop Auto Switch")
-            # Start a new thread for auto-switching with immediate first change
-            threading.Thread(target=self.auto_switch_wallpapers, args=(True,), daemon=True).start()
         else:
             self.toggle_switch_btn.configure(text="Start Auto Switch")
+            self.send_command('playlist', wallpaper_ids=[])
+
+    def toggle_preload(self):
+        """Keep the next auto-switch wallpaper on standby so switches are gapless"""
+        mode = PREFETCH_STANDBY if self.preload_next.get() else PREFETCH_OFF
+        self.send_command('config', prefetch=mode)
 
-    def auto_switch_wallpapers(self, change_immediately=False):
-        """Handle wallpaper auto-switching"""
+    def start_auto_switch(self, switch_now=True):
+        """Hand the selected wallpapers to the auto-switch scheduler"""
         if not self.selected_wallpapers:
             print("No wallpapers selected for auto-switch")
-            return
+            return False
 
-        current_index = 0
-        selected_displays = [name for name, var in self.display_vars.items() if var.get()]
-        
+        selected_displays = self.get_selected_displays()
         if not selected_displays:
             print("No displays selected for auto-switch")
-            return
+            return False
 
-        while self.is_auto_switching and self.selected_wallpapers:
-            wallpaper = self.selected_wallpapers[current_index]
-            print(f"Auto-switching to wallpaper {current_index + 1}/{len(self.selected_wallpapers)}: {wallpaper.id}")
-            
-            # Change wallpaper on all selected displays
-            for display in selected_displays:
-                self.wallpaper_manager.change_wallpaper(display, wallpaper.id)
-            
-            # If not immediate change, wait for interval
-            if not change_immediately:
-                time.sleep(self.switch_interval.get())
-            change_immediately = False
-            
-            # Move to next wallpaper
-            current_index = (current_index + 1) % len(self.selected_wallpapers)
+        try:
+            interval = self.switch_interval.get()
+        except tk.TclError:
+            messagebox.showerror("Error", "Interval must be a whole number of seconds")
+            return False
+
+        wallpaper_ids = [w.id for w in self.selected_wallpapers]
+        return self.send_command('playlist', wallpaper_ids=wallpaper_ids, displays=selected_displays,
+                                 interval=interval, switch_now=switch_now) is not None
+
+    def sync_auto_switch(self):
+        """Apply selection changes to a running auto-switch without restarting its timers"""
+        if not self.is_auto_switching:
+            return
+        if not self.selected_wallpapers:
+            self.toggle_auto_switch()
+        else:
+            self.start_auto_switch(switch_now=False)
 
     def login(self):
         """Modified login to use configured username"""
@@ -297,91 +860,151 @@ class LoginApp:
                     messagebox.showerror("Error", "Steam username is required")
                     return
 
+            from utils.login_fetcher import fetch_steam_cookies, forget_steam_session
+            from utils.steam_fetcher import SteamAuthError, refresh_wallpapers
+
             self.login_button.config(state='disabled', text="Loading...")
-            steam_cookies = fetch_steam_cookies()
+            # Served from .steam_session until it expires or the browser's cookies change
+            steam_cookies = fetch_steam_cookies(self.steam_session_file)
             steam_url = f"https://steamcommunity.com/id/{self.steam_username}/myworkshopfiles/"
             print(f"Fetching wallpapers for user: {self.steam_username}")
-            self.wallpapers = fetch_wallpaper_ids(steam_url, steam_cookies)
-            self.save_to_cache()
-            self.display_wallpapers()
+            # Installed wallpapers Steam never listed are not part of the subscription diff
+            subscribed = [w for w in self.wallpapers if not w.preview_url.startswith(LOCAL_PREVIEW)]
+            try:
+                result = refresh_wallpapers(steam_url, steam_cookies, subscribed, self.load_refresh_state())
+            except SteamAuthError:
+                print("Steam rejected the saved session, reading the browser cookies again")
+                forget_steam_session(self.steam_session_file)
+                fresh_cookies = fetch_steam_cookies(self.steam_session_file, force=True)
+                if fresh_cookies == steam_cookies:
+                    raise Exception("Steam rejected your session. Please log in to Steam in your browser again.")
+                result = refresh_wallpapers(steam_url, fresh_cookies, subscribed, self.load_refresh_state())
+            print(f"Refresh: +{len(result.added)} -{len(result.removed)} ~{len(result.updated)} "
+                  f"in {result.requests} request(s)")
+            if not result.wallpapers:
+                raise Exception("No wallpapers found. Make sure you're logged in and have subscribed wallpapers.")
+            if result.changed or not subscribed:
+                self.wallpapers = result.wallpapers
+                if self.library:
+                    self.save_to_library()
+                    self.load_from_library()  # Installed-only wallpapers stay after the subscriptions
+                self.display_wallpapers()
+            self.save_refresh_state(result.state)
         except Exception as e:
             messagebox.showerror("Error", str(e))
         finally:
             self.login_button.config(state='normal', text="Refresh Wallpapers")
 
-    def display_wallpapers(self):
-        """Optimized wallpaper display"""
-        # Clear existing
-        for widget in self.wallpaper_frame.scrollable_frame.winfo_children():
-            widget.destroy()
+    def on_search_changed(self, *args):
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(self.SEARCH_DELAY_MS, self.apply_search)
 
-        if not self.wallpapers:
-            return
+    def apply_search(self):
+        self.search_job = None
+        if self.library is not None:
+            self.display_wallpapers()
 
+    def filter_wallpapers(self):
+        """self.wallpapers narrowed down to the library's matches for the search box"""
+        text = self.search_var.get().strip()
+        if not text:
+            self.search_status.configure(text="")
+            return self.wallpapers
+        start = time.perf_counter()
+        matches = set(self.library.search(text))
+        shown = [w for w in self.wallpapers if w.id in matches]
+        self.search_status.configure(
+            text=f"{len(shown)} of {len(self.wallpapers)} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return shown
+
+    def display_wallpapers(self):
+        """Show self.wallpapers, filtered by the search box, as a virtualized list.
+
+        On later calls the new list is reconciled against the rows on screen
+        by wallpaper: rows of wallpapers still in view are only moved, and
+        selection and loaded previews carry over. The wallpaper at the top of
+        the view stays there if it is still in the list.
+        """
         # Use fixed size
         self.root.minsize(500, 400)
         self.wallpaper_frame.canvas.configure(width=480, height=400)
-        
-        # Batch process wallpapers
-        BATCH_SIZE = 10
-        total = len(self.wallpapers)
-        progress = ttk.Progressbar(self.wallpaper_frame.scrollable_frame, 
-                                 length=200, 
-                                 mode='determinate')
-        progress.pack(pady=10)
-
-        def process_batch(start_idx):
-            if start_idx >= total:
-                progress.destroy()
-                self.wallpaper_frame.scroll_to_top()
-                return
 
-            end_idx = min(start_idx + BATCH_SIZE, total)
-            batch = self.wallpapers[start_idx:end_idx]
-            
-            for wallpaper in batch:
-                self.create_wallpaper_entry(wallpaper)
+        frame = self.wallpaper_frame
+        top_id = None
+        if frame.row_key is not None:
+            first, _ = frame.visible_range()
+            top_id = next((row.wallpaper.id for row, index in zip(frame.row_pool, frame.row_indices)
+                           if index == first and row.wallpaper), None)
 
-            progress['value'] = (end_idx / total) * 100
-            self.root.update_idletasks()
-            
-            # Schedule next batch
-            self.root.after(10, lambda: process_batch(end_idx))
+        # Selection state lives in per-wallpaper variables keyed by id, not in the row widgets
+        by_id = {w.id: w for w in self.wallpapers}
+        selected_ids = {w.id for w in self.selected_wallpapers}
+        for wallpaper_id in list(self.wallpaper_checkboxes):
+            if wallpaper_id not in by_id:
+                del self.wallpaper_checkboxes[wallpaper_id]
+        for wallpaper in self.wallpapers:
+            if wallpaper.id not in self.wallpaper_checkboxes:
+                self.wallpaper_checkboxes[wallpaper.id] = tk.BooleanVar(
+                    value=wallpaper.id in selected_ids)
+        # Refreshed entries replace their old versions, removed ones drop out
+        selected = [by_id[w.id] for w in self.selected_wallpapers if w.id in by_id]
+        selection_changed = selected != self.selected_wallpapers
+        self.selected_wallpapers = selected
 
-        # Start batch processing
-        process_batch(0)
+        shown = self.shown_wallpapers = self.filter_wallpapers()
+        top_index = next((i for i, w in enumerate(shown) if w.id == top_id), 0)
+        bound_before = frame.bind_count
+        frame.set_virtual_rows(
+            len(shown),
+            self.ROW_HEIGHT,
+            self.create_wallpaper_row,
+            self.bind_wallpaper_row,
+            row_key=lambda index: self.shown_wallpapers[index],
+            top_index=top_index
+        )
+        print(f"Wallpaper list: {len(shown)} of {len(self.wallpapers)} entries shown, "
+              f"{frame.bind_count - bound_before} row(s) re-bound")
+        if selection_changed:
+            self.sync_auto_switch()
 
-    def create_wallpaper_entry(self, wallpaper):
-        """Create single wallpaper entry"""
-        frame = ttk.Frame(self.wallpaper_frame.scrollable_frame)
-        frame.pack(fill="x", pady=2, padx=5)
-        
-        var = tk.BooleanVar()
-        self.wallpaper_checkboxes[wallpaper.id] = var
-        check = ttk.Checkbutton(frame, 
-                               command=lambda w=wallpaper: self.toggle_wallpaper(w),
-                               variable=var)
-        check.pack(side="left")
-
-        future = self.load_preview_image(wallpaper.preview_url)
-        def update_image():
-            if future.done():
-                img = future.result()
-                if img:
-                    photo = ImageTk.PhotoImage(img)
-                    label = ttk.Label(frame, image=photo)
-                    label.image = photo
-                    label.pack(side="left")
-            else:
-                self.root.after(100, update_image)
-        
-        self.root.after(100, update_image)
-        ttk.Label(frame, text=f"ID: {wallpaper.id}").pack(side="left", padx=5)
-        self.create_display_buttons(frame, wallpaper)
+    def create_wallpaper_row(self, parent):
+        """Create one reusable wallpaper row; bind_wallpaper_row fills it in"""
+        row = ttk.Frame(parent, height=self.ROW_HEIGHT)
+        row.pack_propagate(False)
+        row.wallpaper = None
+
+        row.check = ttk.Checkbutton(row, command=lambda r=row: self.toggle_wallpaper(r.wallpaper))
+        row.check.pack(side="left", padx=5)
+
+        row.image_label = ttk.Label(row, image=self.placeholder_image)
+        row.image_label.pack(side="left")
+
+        row.id_label = ttk.Label(row)
+        row.id_label.pack(side="left", padx=5)
+        self.create_display_buttons(row)
+        return row
+
+    def bind_wallpaper_row(self, row, index):
+        """Point a pooled row at the wallpaper at index"""
+        wallpaper = self.shown_wallpapers[index]
+        row.wallpaper = wallpaper
+        row.check.configure(variable=self.wallpaper_checkboxes[wallpaper.id])
+        title = self.wallpaper_titles.get(wallpaper.id)
+        row.id_label.configure(text=f"{title}\nID: {wallpaper.id}" if title else f"ID: {wallpaper.id}")
 
-    def create_display_buttons(self, frame, wallpaper):
+        url = wallpaper.preview_url
+        if url in self.photo_cache:
+            self.preview_resolver.record('memory')
+            self.photo_cache.move_to_end(url)
+            row.image_label.configure(image=self.photo_cache[url])
+            return
+        row.image_label.configure(image=self.placeholder_image)
+        self.load_preview_image(url, index)
+
+    def create_display_buttons(self, row):
         """Create display control buttons including All Displays button"""
-        display_frame = ttk.Frame(frame)
+        display_frame = ttk.Frame(row)
         display_frame.pack(side="right", padx=5)
         
         # Add "All Displays" button with more prominence
@@ -389,7 +1012,7 @@ class LoginApp:
             display_frame,
             text="Set All Displays",  # Changed text to be more clear
             style='Accent.TButton',  # Optional: create a distinct style
-            command=lambda w=wallpaper: self.set_wallpaper_all_displays(w)
+            command=lambda r=row: self.set_wallpaper_all_displays(r.wallpaper)
         )
         all_displays_btn.pack(side="right", padx=5)  # Changed to right side
         
@@ -398,13 +1021,25 @@ class LoginApp:
         
         # Individual display buttons section
         ttk.Label(display_frame, text="Single display:").pack(side="left", padx=5)
-        for display_name in self.display_vars.keys():
+        row.display_button_frame = display_frame
+        row.display_buttons = {}  # display name -> Button
+        self.sync_display_buttons(row)
+
+    def sync_display_buttons(self, row):
+        """Add and remove a row's single-display buttons to match the known displays"""
+        for display_name in list(row.display_buttons):
+            if display_name not in self.display_vars:
+                row.display_buttons.pop(display_name).destroy()
+        for display_name in self.display_vars:
+            if display_name in row.display_buttons:
+                continue
             btn = ttk.Button(
-                display_frame,
+                row.display_button_frame,
                 text=display_name,
-                command=lambda w=wallpaper, d=display_name: self.wallpaper_manager.change_wallpaper(d, w.id)
+                command=lambda r=row, d=display_name: self.change_wallpaper(r.wallpaper.id, d)
             )
             btn.pack(side="left", padx=2)
+            row.display_buttons[display_name] = btn
 
     def set_wallpaper_all_displays(self, wallpaper):
         """Set the wallpaper on all displays simultaneously"""
@@ -412,8 +1047,9 @@ class LoginApp:
         if not selected_displays:
             selected_displays = list(self.display_vars.keys())
             
-        # Send all display changes as a single command
-        self.wallpaper_manager.change_wallpaper_all_displays(wallpaper.id, selected_displays)
+        # Switch all displays in the background; it waits for the engines to come up
+        self.executor.submit(self.send_command, 'set', wallpaper_id=wallpaper.id,
+                             displays=selected_displays, wait=True)
 
     def handle_button_click(self, wallpaper_id, display_name, button):
         """Queue wallpaper change without blocking GUI"""
@@ -428,91 +1064,227 @@ class LoginApp:
         self.change_queue.put((wallpaper_id, display_name))
 
     def refresh_displays(self):
-        # Clear existing display frame
-        for widget in self.display_frame.winfo_children():
-            widget.destroy()
-        self.display_vars.clear()
-        
-        # Reload displays
-        self.load_displays()
-        
-        # Force update of wallpaper buttons if wallpapers are loaded
-        if self.wallpapers:
-            self.display_wallpapers()
+        """Re-read the display topology now and apply whatever changed"""
+        try:
+            self.display_topology.refresh()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to detect displays: {str(e)}")
+            return
+        self.apply_display_changes()
+
+    def on_display_change(self, diff):
+        """Topology listener; may run on the watcher thread, so only queue the diff"""
+        self.display_changes.put(diff)
+
+    def poll_display_changes(self):
+        self.apply_display_changes()
+        self.root.after(self.DISPLAY_POLL_MS, self.poll_display_changes)
+
+    def apply_display_changes(self):
+        while True:
+            try:
+                diff = self.display_changes.get_nowait()
+            except Empty:
+                return
+            self.apply_display_diff(diff)
+
+    def apply_display_diff(self, diff):
+        """Update only the display widgets and row buttons a topology change affects"""
+        for display in diff.removed:
+            print(f"Display removed: {display.name}")
+            self.display_vars.pop(display.name, None)
+            frame = self.display_widgets.pop(display.name, None)
+            if frame:
+                frame.destroy()
+        for old, new in diff.modified:
+            print(f"Display changed: {new.name} {self.describe_display(new)}")
+            frame = self.display_widgets.get(new.name)
+            if frame:
+                frame.check.configure(text=f"{new.name}\n({self.describe_display(new)})")
+        for display in diff.added:
+            print(f"Display added: {display.name} {self.describe_display(display)}")
+            self.add_display_widget(display)
+
+        if diff.added or diff.removed:
+            for row in self.wallpaper_frame.row_pool:
+                self.sync_display_buttons(row)
     
     def toggle_silent(self):
         """Toggle silent mode"""
-        self.silent_mode = self.wallpaper_manager.toggle_silent_mode()
+        config = self.send_command('config', silent=not self.silent_mode)
+        if config is None:
+            return
+        self.silent_mode = config['silent']
         self.silent_button.config(
             text=f"Silent Mode: {'On' if self.silent_mode else 'Off'}"
         )
         print(f"Silent mode {'enabled' if self.silent_mode else 'disabled'}")
 
+    def toggle_governor(self):
+        """Enable or disable the load governor"""
+        self.send_command('config', governor=self.governor_enabled.get())
+
     def load_displays(self):
         try:
             # Clear existing displays first
             for widget in self.display_frame.winfo_children():
                 widget.destroy()
+            self.display_vars.clear()
+            self.display_widgets.clear()
             
-            displays = get_displays()
+            displays = self.display_topology.displays()
             if not displays:
                 messagebox.showwarning("Warning", "No displays detected!")
                 return
 
             for display in displays:
-                var = tk.BooleanVar(value=display.primary)
-                frame = ttk.Frame(self.display_frame)
-                frame.pack(side="left", padx=5)
-                
-                cb = ttk.Checkbutton(
-                    frame,
-                    text=f"{display.name}\n({display.resolution})",
-                    variable=var
-                )
-                cb.pack(side="top")
-                self.display_vars[display.name] = var
-
-            # Force GUI update
-            self.display_frame.update()
+                self.add_display_widget(display)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to detect displays: {str(e)}")
 
+    @staticmethod
+    def describe_display(display):
+        text = display.resolution
+        if display.refresh:
+            text += f" @ {display.refresh:.0f}Hz"
+        if display.rotation != 'normal':
+            text += f", {display.rotation}"
+        return text
+
+    def add_display_widget(self, display):
+        var = tk.BooleanVar(value=display.primary)
+        frame = ttk.Frame(self.display_frame)
+        frame.pack(side="left", padx=5)
+        
+        frame.check = ttk.Checkbutton(
+            frame,
+            text=f"{display.name}\n({self.describe_display(display)})",
+            variable=var
+        )
+        frame.check.pack(side="top")
+        self.display_vars[display.name] = var
+        self.display_widgets[display.name] = frame
+
     def get_selected_displays(self):
         return [name for name, var in self.display_vars.items() if var.get()]
 
     def change_wallpaper(self, wallpaper_id, display_name):
-        """Non-blocking wallpaper change"""
-        self.wallpaper_manager.change_wallpaper(display_name, wallpaper_id)
+        """Non-blocking wallpaper change, the daemon queues it"""
+        self.send_command('set', wallpaper_id=wallpaper_id, displays=[display_name])
 
     def toggle_all_wallpapers(self):
-        """Toggle selection state of all wallpapers"""
-        all_selected = len(self.selected_wallpapers) == len(self.wallpapers)
+        """Toggle selection state of all wallpapers shown, i.e. all search results"""
+        shown_ids = {w.id for w in self.shown_wallpapers}
+        selected_ids = {w.id for w in self.selected_wallpapers}
+        all_selected = bool(shown_ids) and shown_ids <= selected_ids
         
         if all_selected:
             # Deselect all
-            self.selected_wallpapers.clear()
+            self.selected_wallpapers = [w for w in self.selected_wallpapers if w.id not in shown_ids]
             self.select_all_btn.config(text="Select All Wallpapers")
         else:
-            # Select all - create a new list with all wallpapers
-            self.selected_wallpapers = self.wallpapers.copy()
+            # Select all - keep list order
+            self.selected_wallpapers = [w for w in self.wallpapers if w.id in selected_ids | shown_ids]
             self.select_all_btn.config(text="Deselect All")
 
         # Update all checkboxes to match current state
-        for wallpaper in self.wallpapers:
+        for wallpaper in self.shown_wallpapers:
             self.wallpaper_checkboxes[wallpaper.id].set(not all_selected)
+        self.sync_auto_switch()
 
     def __del__(self):
         """Enhanced cleanup"""
+        # Any part of startup may not have happened yet
         self.cleanup_tasks()
+        self.display_topology.stop()
+        if self.workshop:
+            self.workshop.stop()
         self.change_queue.put((None, None))
-        self.wallpaper_manager.kill_all()
+        # The engines belong to the daemon and keep running after the GUI closes
         self.executor.shutdown(wait=False)
-        self.image_cache.clear()
+        if self.thumbnail_decoder:
+            self.thumbnail_decoder.shutdown()
+        if self.preview_downloader:
+            self.preview_downloader.shutdown()
+        if self.library:
+            self.library.close()
+
+def report_startup(root, app):
+    """--startup-probe: print the startup marks once startup is done, then quit.
+
+    Exits right away, without the usual cleanup.
+    """
+    def check():
+        if not app.startup_done:
+            root.after(20, check)
+            return
+        loaded = [m for m in HEAVY_MODULES if m in app.modules_at_first_paint]
+        print("STARTUP " + json.dumps({'marks': dict(app.startup_marks), 'heavy_before_paint': loaded}),
+              flush=True)
+        os._exit(0)
+    root.after(0, check)
+
+def benchmark_startup(runs=5):
+    """Report per-module import cost and time to first paint; returns 1 when over budget.
+
+    Needs a display and a configured steam_username, as it starts the real GUI.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    # Import cost of this module, from the `python -X importtime` log
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gui'],
+                         cwd=here, capture_output=True, text=True)
+    costs = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            costs.append((int(cumulative_us), int(self_us), name.strip()))
+    print(f"{'module':<40} {'self ms':>8} {'total ms':>9}")
+    for cumulative_us, self_us, name in sorted(costs, reverse=True)[:15]:
+        print(f"{name:<40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>9.1f}")
+    total = next((c for c, _, name in costs if name == 'gui'), 0)
+    print(f"{'import gui, total':<40} {'':>8} {total / 1000:>9.1f}")
+
+    first_paint, ready, heavy = [], [], set()
+    for _ in range(runs):
+        start = time.monotonic()
+        out = subprocess.run([sys.executable, os.path.join(here, 'gui.py'), '--startup-probe'],
+                             cwd=here, capture_output=True, text=True, timeout=60)
+        reports = [line for line in out.stdout.splitlines() if line.startswith('STARTUP ')]
+        if not reports:
+            print(f"Startup probe failed:\n{out.stderr}", file=sys.stderr)
+            return 1
+        # time.monotonic() is system-wide, so marks compare directly with start
+        report = json.loads(reports[-1][len('STARTUP '):])
+        first_paint.append(report['marks']['first_paint'] - start)
+        ready.append(report['marks']['ready'] - start)
+        heavy.update(report['heavy_before_paint'])
+
+    first_paint.sort()
+    ready.sort()
+    print(f"first paint: median {first_paint[len(first_paint) // 2] * 1000:.0f}ms, "
+          f"worst {first_paint[-1] * 1000:.0f}ms (budget {STARTUP_BUDGET * 1000:.0f}ms)")
+    print(f"ready:       median {ready[len(ready) // 2] * 1000:.0f}ms")
+    failed = first_paint[len(first_paint) // 2] > STARTUP_BUDGET
+    if heavy:
+        print(f"Loaded before first paint: {', '.join(sorted(heavy))}")
+        failed = True
+    return 1 if failed else 0
 
 def main():
+    # Usage: python gui.py [--bench-startup [runs]]
+    if '--bench-startup' in sys.argv:
+        i = sys.argv.index('--bench-startup')
+        runs = int(sys.argv[i + 1]) if len(sys.argv) > i + 1 else 5
+        sys.exit(benchmark_startup(runs))
     root = tk.Tk()
     app = LoginApp(root)
+    if '--startup-probe' in sys.argv:
+        report_startup(root, app)
     root.mainloop()
 
 if __name__ == "__main__":
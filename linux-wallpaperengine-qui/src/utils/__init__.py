@@ -1,14 +1,38 @@
-from .login_fetcher import fetch_steam_cookies
-from .steam_fetcher import fetch_wallpaper_ids, WallpaperInfo
-from .display_utils import get_displays, DisplayInfo
-from .process_utils import kill_wallpaper_processes, WallpaperManager
+import importlib
+
+# Submodules are imported on first attribute access, so importing one light
+# module (say utils.process_utils) does not pull in browser_cookie3, requests
+# or PIL through this package
+_EXPORTS = {
+    'fetch_steam_cookies': '.login_fetcher',
+    'fetch_wallpaper_ids': '.steam_fetcher',
+    'iter_wallpapers': '.steam_fetcher',
+    'WallpaperInfo': '.steam_fetcher',
+    'get_displays': '.display_utils',
+    'DisplayInfo': '.display_utils',
+    'kill_wallpaper_processes': '.process_utils',
+    'WallpaperManager': '.process_utils',
+    'ThumbnailCache': '.thumbnail_cache',
+}
 
 __all__ = [
     'fetch_steam_cookies',
     'fetch_wallpaper_ids',
+    'iter_wallpapers',
     'WallpaperInfo',
     'get_displays',
     'DisplayInfo',
     'kill_wallpaper_processes',
-    'WallpaperManager'
-]
\ No newline at end of file
+    'WallpaperManager',
+    'ThumbnailCache'
+]
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
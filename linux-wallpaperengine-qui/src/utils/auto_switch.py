@@ -0,0 +1,272 @@
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+class Playlist:
+    def __init__(self, display: str, wallpaper_ids: List[str], interval: float, position: int = 0):
+        self.display = display
+        self.wallpaper_ids = list(wallpaper_ids)
+        self.interval = interval
+        self.position = position  # Index of the wallpaper currently shown
+        self.next_due = 0.0
+        self.generation = 0  # Renewed on every reschedule to invalidate old heap entries
+
+    def current(self) -> str:
+        return self.wallpaper_ids[self.position]
+
+class AutoSwitchScheduler:
+    """Single timer thread driving auto-switch for every display.
+
+    Each display has its own playlist and interval. Deadlines advance by
+    whole intervals on the monotonic clock, so switch time never shifts the
+    schedule. Ticks missed while suspended are skipped rather than replayed.
+    Changes wake the thread immediately. The current position per display is
+    saved to state_file and picked up again by set_playlist(). pause() holds
+    every schedule and resume() continues with the time that was left.
+    """
+    SWITCH = 'switch'
+    PREPARE = 'prepare'
+
+    def __init__(self, switch: Callable[[str, str], None],
+                 prepare: Optional[Callable[[str, str], None]] = None,
+                 state_file: Optional[str] = None,
+                 prefetch_lead: float = 5.0,
+                 skip: Optional[Callable[[str], bool]] = None):
+        self.switch = switch  # switch(display, wallpaper_id), must not block for long
+        self.prepare = prepare  # prepare(display, wallpaper_id) ahead of the next switch
+        self.state_file = state_file
+        self.prefetch_lead = prefetch_lead
+        self.is_skipped = skip or (lambda wallpaper_id: False)  # e.g. quarantined wallpapers
+        self.playlists: Dict[str, Playlist] = {}
+        self.heap = []  # (due, seq, display, generation, kind)
+        self.seq = 0
+        self.generations = 0
+        self.cond = threading.Condition()
+        self.saved_state = self._load_state()
+        self.paused_at = None  # monotonic time of pause(), None while running
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _load_state(self) -> Dict:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading auto-switch state: {e}", file=sys.stderr)
+            return {}
+
+    def _save_state(self):
+        """Persist the shown wallpaper per display. Caller holds the condition."""
+        if not self.state_file:
+            return
+        for display, playlist in self.playlists.items():
+            self.saved_state[display] = {'current': playlist.current(), 'interval': playlist.interval}
+        try:
+            tmp_path = f"{self.state_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.saved_state, f)
+            os.replace(tmp_path, self.state_file)
+        except Exception as e:
+            print(f"Error saving auto-switch state: {e}", file=sys.stderr)
+
+    def _push(self, due: float, playlist: Playlist, kind: str):
+        self.seq += 1
+        heapq.heappush(self.heap, (due, self.seq, playlist.display, playlist.generation, kind))
+
+    def _schedule(self, playlist: Playlist):
+        """Queue the next switch (and its prefetch) for playlist. Caller holds the condition."""
+        self.generations += 1
+        playlist.generation = self.generations
+        self._push(playlist.next_due, playlist, self.SWITCH)
+        if self.prepare and len(playlist.wallpaper_ids) > 1:
+            self._push(max(time.monotonic(), playlist.next_due - self.prefetch_lead), playlist, self.PREPARE)
+        self.cond.notify()
+
+    def set_playlist(self, display: str, wallpaper_ids: List[str], interval: float,
+                     switch_now: bool = True, resume: bool = True):
+        """Start or replace auto-switching on display.
+
+        With resume, continue from the wallpaper that was shown last time
+        (from this session or the saved state) if it is still in the list.
+        """
+        if not wallpaper_ids:
+            self.remove(display)
+            return
+        wallpaper_ids = [str(w) for w in wallpaper_ids]
+        interval = max(1.0, float(interval))
+        with self.cond:
+            old = self.playlists.get(display)
+            last = old.current() if old else self.saved_state.get(display, {}).get('current')
+            found = resume and last in wallpaper_ids
+            position = wallpaper_ids.index(last) if found else 0
+            playlist = Playlist(display, wallpaper_ids, interval, position)
+            self.playlists[display] = playlist
+
+            if old and (not switch_now or old.current() == playlist.current()):
+                playlist.next_due = old.next_due  # Keep the running schedule
+            elif switch_now:
+                playlist.next_due = time.monotonic()
+            else:
+                playlist.next_due = time.monotonic() + interval
+            if playlist.next_due <= time.monotonic() or not found:
+                # The next tick advances onto position, so start one step behind it
+                playlist.position = (position - 1) % len(wallpaper_ids)
+            self._schedule(playlist)
+
+    def set_interval(self, display: str, interval: float):
+        """Change the interval; the pending deadline moves with it"""
+        with self.cond:
+            playlist = self.playlists.get(display)
+            if not playlist:
+                return
+            interval = max(1.0, float(interval))
+            playlist.next_due += interval - playlist.interval
+            playlist.interval = interval
+            self._schedule(playlist)
+
+    def skip(self, display: str):
+        """Advance display to its next wallpaper right away"""
+        with self.cond:
+            playlist = self.playlists.get(display)
+            if playlist:
+                playlist.next_due = time.monotonic()
+                self._schedule(playlist)
+
+    def remove(self, display: str):
+        with self.cond:
+            playlist = self.playlists.pop(display, None)
+            if playlist:
+                playlist.generation = -1  # Orphans its heap entries
+                self.cond.notify()
+
+    def stop_all(self):
+        with self.cond:
+            for display in list(self.playlists):
+                self.playlists.pop(display).generation = -1
+            self.heap.clear()
+            self.cond.notify()
+
+    def pause(self):
+        with self.cond:
+            if self.paused_at is None:
+                self.paused_at = time.monotonic()
+                self.cond.notify()
+
+    def resume(self):
+        """Continue after pause(); deadlines move by the time spent paused"""
+        with self.cond:
+            if self.paused_at is None:
+                return
+            held = time.monotonic() - self.paused_at
+            self.paused_at = None
+            for playlist in self.playlists.values():
+                playlist.next_due += held
+                self._schedule(playlist)
+
+    def is_paused(self) -> bool:
+        return self.paused_at is not None
+
+    def status(self) -> Dict[str, Dict]:
+        """Per display: playlist length, shown wallpaper, interval and seconds to the next switch"""
+        with self.cond:
+            now = self.paused_at or time.monotonic()
+            return {display: {'wallpapers': len(p.wallpaper_ids), 'current': p.current(),
+                              'interval': p.interval, 'next_in': max(0.0, p.next_due - now)}
+                    for display, p in self.playlists.items()}
+
+    def is_active(self) -> bool:
+        with self.cond:
+            return bool(self.playlists)
+
+    def shutdown(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            action = self._next_action()
+            if action is None:
+                return
+            # Outside the condition: prepare may spawn an engine and wait for
+            # it, and status(), pause() or skip() must not queue up behind that
+            fn, display, wallpaper_id = action
+            self._call(fn, display, wallpaper_id)
+
+    def _next_action(self):
+        """Wait for the next due entry and apply it to the schedule.
+
+        Returns the (callback, display, wallpaper id) to run once the
+        condition is released, or None on shutdown.
+        """
+        with self.cond:
+            while self.running:
+                if self.paused_at is not None:
+                    self.cond.wait()
+                    continue
+                now = time.monotonic()
+                # Drop entries belonging to removed or rescheduled playlists
+                while self.heap:
+                    _, _, display, generation, _ = self.heap[0]
+                    playlist = self.playlists.get(display)
+                    if playlist and playlist.generation == generation:
+                        break
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                due = self.heap[0][0]
+                if due > now:
+                    self.cond.wait(due - now)
+                    continue
+
+                _, _, display, _, kind = heapq.heappop(self.heap)
+                playlist = self.playlists[display]
+                if kind == self.PREPARE:
+                    upcoming = self._peek(playlist)
+                    if upcoming is not None:
+                        return self.prepare, display, upcoming
+                    continue
+
+                advanced = self._advance(playlist)
+                # Advance from the deadline, not from now, so the schedule never drifts
+                playlist.next_due += playlist.interval
+                if playlist.next_due <= now:
+                    missed = int((now - playlist.next_due) // playlist.interval) + 1
+                    playlist.next_due += missed * playlist.interval
+                self._save_state()
+                self._schedule(playlist)
+                if advanced:
+                    return self.switch, display, playlist.current()
+            return None
+
+    def _peek(self, playlist: Playlist) -> Optional[str]:
+        """Next playable wallpaper after the current one, or None if all are skipped"""
+        count = len(playlist.wallpaper_ids)
+        for step in range(1, count + 1):
+            wallpaper_id = playlist.wallpaper_ids[(playlist.position + step) % count]
+            if not self.is_skipped(wallpaper_id):
+                return wallpaper_id
+        return None
+
+    def _advance(self, playlist: Playlist) -> bool:
+        """Move to the next playable wallpaper; False if there is none"""
+        count = len(playlist.wallpaper_ids)
+        for _ in range(count):
+            playlist.position = (playlist.position + 1) % count
+            if not self.is_skipped(playlist.current()):
+                return True
+        return False
+
+    def _call(self, fn, display: str, wallpaper_id: str):
+        try:
+            fn(display, wallpaper_id)
+        except Exception as e:
+            print(f"Error in auto-switch for {display}: {e}", file=sys.stderr)
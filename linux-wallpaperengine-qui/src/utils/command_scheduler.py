@@ -0,0 +1,136 @@
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+class CommandScheduler:
+    """Coalescing per-display queue of wallpaper changes.
+
+    Only the newest request per display survives. A request is dispatched
+    once no newer one has arrived for ``debounce`` seconds (but never later
+    than ``max_delay`` after the first one of the burst). Requests for the
+    wallpaper a display already shows are dropped. Displays switch in
+    parallel; a display with a switch in flight collects new requests until
+    it is done.
+    """
+
+    def __init__(self, execute: Callable[[str, str], object],
+                 current: Callable[[str], Optional[str]],
+                 debounce: float = 0.15, max_delay: float = 1.0):
+        self.execute = execute  # execute(display, wallpaper_id), blocking
+        self.current = current  # current(display) -> wallpaper id on screen, or None
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.pending: Dict[str, Tuple[str, float, float]] = {}  # display -> (wallpaper id, due, first seen)
+        self.in_flight = set()
+        self.stats = {'submitted': 0, 'coalesced': 0, 'dropped_noop': 0, 'executed': 0}
+        self.cond = threading.Condition()
+        self.running = True
+        self.dispatcher_thread = threading.Thread(target=self._dispatch, daemon=True)
+        self.dispatcher_thread.start()
+
+    def submit(self, display: str, wallpaper_id: str):
+        now = time.monotonic()
+        with self.cond:
+            self.stats['submitted'] += 1
+            first_seen = now
+            if display in self.pending:
+                self.stats['coalesced'] += 1
+                first_seen = self.pending[display][2]
+            due = min(now + self.debounce, first_seen + self.max_delay)
+            self.pending[display] = (str(wallpaper_id), due, first_seen)
+            self.cond.notify()
+
+    def cancel(self, display: str):
+        """Forget any pending request for display"""
+        with self.cond:
+            self.pending.pop(display, None)
+
+    def _dispatch(self):
+        with self.cond:
+            while self.running:
+                now = time.monotonic()
+                waiting = {d: entry for d, entry in self.pending.items() if d not in self.in_flight}
+                due = [d for d, (_, at, _) in waiting.items() if at <= now]
+                if not due:
+                    timeout = min((at for _, at, _ in waiting.values()), default=None)
+                    self.cond.wait(None if timeout is None else max(0.0, timeout - now))
+                    continue
+                for display in due:
+                    wallpaper_id = self.pending.pop(display)[0]
+                    if self.current(display) == wallpaper_id:
+                        self.stats['dropped_noop'] += 1
+                        continue
+                    self.in_flight.add(display)
+                    threading.Thread(target=self._run, args=(display, wallpaper_id), daemon=True).start()
+
+    def _run(self, display: str, wallpaper_id: str):
+        try:
+            self.execute(display, wallpaper_id)
+        except Exception as e:
+            print(f"Error changing wallpaper on {display}: {e}", file=sys.stderr)
+        finally:
+            with self.cond:
+                self.stats['executed'] += 1
+                self.in_flight.discard(display)
+                self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.pending.clear()
+            self.cond.notify()
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fixtures', 'fake_engine')
+
+def check(clicks: int = 10, interval: float = 0.02) -> int:
+    """Click through wallpapers on two displays against the fake engine; returns the number of failures.
+
+    Each click lands within the debounce window of the previous one, so
+    every display must spawn exactly one engine, showing the last click.
+    """
+    import shutil
+    import tempfile
+    from .process_utils import WallpaperManager
+
+    os.environ['PATH'] = FIXTURE_DIR + os.pathsep + os.environ.get('PATH', '')
+    displays = ('CHECK-1', 'CHECK-2')
+    last = str(100 + clicks - 1)
+    failures = 0
+    state_dir = tempfile.mkdtemp()
+    manager = WallpaperManager(state_dir=state_dir)
+    try:
+        for click in range(clicks):
+            for display in displays:
+                manager.change_wallpaper(display, str(100 + click))
+            time.sleep(interval)
+
+        def settled():
+            with manager.scheduler.cond:
+                busy = manager.scheduler.pending or manager.scheduler.in_flight
+            return not busy and all(manager.current_wallpaper(d) for d in displays)
+
+        deadline = time.monotonic() + 5.0
+        while not settled() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        for display in displays:
+            spawns, shown = manager.spawn_count(display), manager.current_wallpaper(display)
+            ok = spawns == 1 and shown == last
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':>4}  {display}: {clicks} clicks, {spawns} spawn(s), "
+                  f"showing {shown} (expected {last})")
+        print(f"      scheduler: {manager.scheduler.stats}")
+    finally:
+        manager.kill_all()
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return failures
+
+def main():
+    # python -m utils.command_scheduler --check [clicks]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--check':
+        sys.exit(1 if check(int(sys.argv[2]) if len(sys.argv) > 2 else 10) else 0)
+    print("Usage: python -m utils.command_scheduler --check [clicks]")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+SOCKET_NAME = 'linux-wallpaperengine-qui.sock'
+STARTUP_TIMEOUT = 30.0  # How long requests wait for the daemon to finish starting
+
+class ControlError(Exception):
+    """The daemon could not be reached or refused a request"""
+
+def default_socket_path() -> str:
+    """$XDG_RUNTIME_DIR/<name>, or a per-user path in /tmp without a runtime dir"""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join('/tmp', f"{SOCKET_NAME[:-5]}-{os.getuid()}.sock")
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One JSON request per line, answered in order on the same connection
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                reply = {'ok': True, 'result': self.server.dispatch(request['cmd'], request.get('args') or {})}
+            except Exception as e:
+                reply = {'ok': False, 'error': str(e) or e.__class__.__name__}
+            try:
+                self.wfile.write((json.dumps(reply) + '\n').encode())
+                self.wfile.flush()
+            except OSError:
+                return  # Client went away
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """JSON-lines control API on a Unix socket.
+
+    Each request is {"cmd": name, "args": {...}} on one line; the reply is
+    {"ok": true, "result": ...} or {"ok": false, "error": message}.
+    dispatch(cmd, args) runs on the connection's thread and its exceptions
+    become error replies. The socket is only accessible to its owner.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, dispatch: Callable[[str, Dict], Any]):
+        self.path = path
+        self.dispatch = dispatch
+        self.thread = None
+        if os.path.exists(path):
+            if ControlClient(path).ping():
+                raise ControlError(f"Another daemon is already listening on {path}")
+            os.unlink(path)  # Left behind by a daemon that did not exit cleanly
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+class ControlClient:
+    """Client for ControlServer.
+
+    Every call uses its own short-lived connection, so the client can be
+    shared between threads and a slow request never holds up another.
+    The default timeout outlasts STARTUP_TIMEOUT, so a request sent while
+    the daemon is still starting gets its answer.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: float = STARTUP_TIMEOUT + 15.0):
+        self.path = path or default_socket_path()
+        self.timeout = timeout
+
+    def call(self, cmd: str, **args) -> Any:
+        """Send one request and return its result; raises ControlError"""
+        request = (json.dumps({'cmd': cmd, 'args': args}) + '\n').encode()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall(request)
+                with sock.makefile('rb') as reader:
+                    line = reader.readline()
+        except OSError as e:
+            raise ControlError(f"Cannot reach the wallpaper daemon at {self.path}: {e}")
+        if not line:
+            raise ControlError("The wallpaper daemon closed the connection")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise ControlError(reply.get('error', 'request failed'))
+        return reply.get('result')
+
+    def ping(self) -> bool:
+        try:
+            self.call('ping')
+            return True
+        except ControlError:
+            return False
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for a daemon to answer"""
+        deadline = time.monotonic() + timeout
+        while not self.ping():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+def spawn_daemon(script: str, log_path: Optional[str] = None, socket_path: Optional[str] = None):
+    """Start `python script daemon` detached from the caller's session"""
+    import subprocess
+    command = [sys.executable, script, 'daemon']
+    if socket_path:
+        command += ['--socket', socket_path]
+    log = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    try:
+        return subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                                start_new_session=True, close_fds=True)
+    finally:
+        if log_path:
+            log.close()
@@ -1,30 +1,244 @@
+import hashlib
+import os
+import re
 import subprocess
 import shutil
-from typing import List, NamedTuple
+import sys
+import threading
+from typing import Callable, List, NamedTuple, Optional, Tuple
 
 class DisplayInfo(NamedTuple):
     name: str
     resolution: str
     primary: bool
+    width: int = 0
+    height: int = 0
+    x: int = 0
+    y: int = 0
+    rotation: str = 'normal'  # normal, left, right or inverted
+    refresh: Optional[float] = None  # Hz of the current mode
+
+class DisplayDiff(NamedTuple):
+    added: List[DisplayInfo]
+    removed: List[DisplayInfo]
+    modified: List[Tuple[DisplayInfo, DisplayInfo]]  # (old, new) for outputs that moved or changed mode
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+# "HDMI-1 connected primary 1920x1080+1920+0 left (normal left inverted right x axis y axis) 527mm x 296mm"
+OUTPUT_RE = re.compile(
+    r'^(?P<name>\S+) connected'
+    r'(?P<primary> primary)?'
+    r'(?: (?P<width>\d+)x(?P<height>\d+)\+(?P<x>\d+)\+(?P<y>\d+))?'
+    r'(?: (?P<rotation>normal|left|right|inverted))?'
+)
+# "   1920x1080     60.00*+  50.00    59.94", the current rate is starred
+MODE_RE = re.compile(r'^\s+\d+x\d+\S*\s')
+CURRENT_RATE_RE = re.compile(r'(\d+(?:\.\d+)?)\*')
 
 def check_xrandr_installed():
     if not shutil.which('xrandr'):
         raise Exception("xrandr is not installed. Please install xrandr using your system's package manager (e.g., 'sudo apt install x11-xserver-utils' for Debian/Ubuntu)")
 
+def read_xrandr() -> str:
+    check_xrandr_installed()
+    # --current reports the server's state without reprobing the outputs
+    return subprocess.check_output(['xrandr', '--current']).decode()
+
+def parse_xrandr(output: str) -> List[DisplayInfo]:
+    """Active outputs from `xrandr --current`; connected outputs without a mode are skipped"""
+    displays = []
+    current = None
+    for line in output.split('\n'):
+        match = OUTPUT_RE.match(line)
+        if match:
+            current = None
+            if match.group('width') is None:
+                continue  # Connected but switched off
+            width, height = int(match.group('width')), int(match.group('height'))
+            current = DisplayInfo(
+                name=match.group('name'),
+                resolution=f"{width}x{height}",
+                primary=bool(match.group('primary')),
+                width=width,
+                height=height,
+                x=int(match.group('x')),
+                y=int(match.group('y')),
+                rotation=match.group('rotation') or 'normal',
+            )
+            displays.append(current)
+        elif current is not None and MODE_RE.match(line):
+            rate = CURRENT_RATE_RE.search(line)
+            if rate and current.refresh is None:
+                current = current._replace(refresh=float(rate.group(1)))
+                displays[-1] = current
+        elif line and not line[0].isspace():
+            current = None  # Disconnected output, screen line, ...
+    return displays
+
+def diff_displays(old: List[DisplayInfo], new: List[DisplayInfo]) -> DisplayDiff:
+    old_by_name = {d.name: d for d in old}
+    new_by_name = {d.name: d for d in new}
+    return DisplayDiff(
+        added=[d for d in new if d.name not in old_by_name],
+        removed=[d for d in old if d.name not in new_by_name],
+        modified=[(old_by_name[d.name], d) for d in new
+                  if d.name in old_by_name and old_by_name[d.name] != d],
+    )
+
 def get_displays() -> List[DisplayInfo]:
     try:
-        check_xrandr_installed()
-        output = subprocess.check_output(['xrandr', '--current']).decode()
-        displays = []
-        
-        for line in output.split('\n'):
-            if ' connected ' in line:
-                parts = line.split()
-                name = parts[0]
-                primary = 'primary' in line
-                resolution = next((p for p in parts if 'x' in p), 'unknown')
-                displays.append(DisplayInfo(name=name, resolution=resolution, primary=primary))
-        
-        return displays
+        return parse_xrandr(read_xrandr())
     except Exception as e:
         raise Exception(f"Failed to get displays: {str(e)}")
+
+class DisplayTopology:
+    """Cached model of the connected outputs with hotplug change detection.
+
+    displays() answers from the cache. refresh() re-reads xrandr but only
+    re-parses when the output text changed. Listeners get a DisplayDiff
+    for every change. With start(), changes are picked up in the
+    background: from RandR events when python-xlib is installed, otherwise
+    by polling xrandr every poll_interval seconds.
+    """
+
+    def __init__(self, query: Callable[[], str] = read_xrandr, poll_interval: float = 2.0):
+        self.query = query
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.current: Optional[List[DisplayInfo]] = None
+        self.output_hash = None
+        self.listeners: List[Callable[[DisplayDiff], None]] = []
+        self.running = False
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add_listener(self, callback: Callable[[DisplayDiff], None]):
+        """Register callback(diff), called from whichever thread saw the change"""
+        self.listeners.append(callback)
+
+    def displays(self) -> List[DisplayInfo]:
+        if self.current is None:
+            self.refresh()
+        return list(self.current or [])
+
+    def refresh(self) -> DisplayDiff:
+        """Re-read the topology; returns what changed since the last read"""
+        output = self.query()
+        output_hash = hashlib.sha1(output.encode()).digest()
+        with self.lock:
+            if output_hash == self.output_hash:
+                return DisplayDiff([], [], [])
+            self.output_hash = output_hash
+            displays = parse_xrandr(output)
+            diff = diff_displays(self.current or [], displays)
+            self.current = displays
+        if diff:
+            for callback in self.listeners:
+                try:
+                    callback(diff)
+                except Exception as e:
+                    print(f"Error in display listener: {e}", file=sys.stderr)
+        return diff
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wake.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    def _run(self):
+        try:
+            self._watch_randr()
+        except Exception as e:
+            if self.running:
+                print(f"RandR events unavailable ({e}), polling xrandr instead")
+        while self.running:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error polling displays: {e}", file=sys.stderr)
+            self.wake.wait(self.poll_interval)
+
+    def _watch_randr(self):
+        """Refresh on RandR screen/output change notifications, needs python-xlib"""
+        from Xlib import display as xdisplay
+        from Xlib.ext import randr
+
+        conn = xdisplay.Display()
+        if not conn.has_extension('RANDR'):
+            raise RuntimeError("no RANDR extension")
+        conn.screen().root.xrandr_select_input(
+            randr.RRScreenChangeNotifyMask | randr.RROutputChangeNotifyMask | randr.RRCrtcChangeNotifyMask)
+        conn.sync()
+        while self.running:
+            conn.next_event()  # Blocks until something changes
+            # One hotplug arrives as a burst of events, handle it once
+            self.wake.wait(0.2)
+            while conn.pending_events():
+                conn.next_event()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reading displays: {e}", file=sys.stderr)
+
+# Hand-checked `xrandr --current` samples, each with a hand-written <name>.json
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fixtures', 'xrandr')
+
+def record_xrandr(out_dir: str, name: str):
+    """Save the current xrandr output as out_dir/<name>.txt.
+
+    The expected <name>.json has to be written by hand from the output;
+    the parse is only printed as a starting point, since a file produced by
+    the parser could never catch a parser bug.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    output = read_xrandr()
+    with open(os.path.join(out_dir, f"{name}.txt"), 'w') as f:
+        f.write(output)
+    for display in parse_xrandr(output):
+        print(display)
+
+def check_recorded(sample_dir: str) -> int:
+    """Parse every recorded <name>.txt and compare with <name>.json; returns the number of mismatches"""
+    import json
+    failures = 0
+    for entry in sorted(os.listdir(sample_dir)):
+        if not entry.endswith('.txt'):
+            continue
+        base = os.path.join(sample_dir, entry[:-4])
+        with open(base + '.txt', 'r') as f:
+            parsed = [d._asdict() for d in parse_xrandr(f.read())]
+        if not os.path.exists(base + '.json'):
+            failures += 1
+            print(f"{entry}: no hand-written {entry[:-4]}.json, parsed {parsed}")
+            continue
+        with open(base + '.json', 'r') as f:
+            expected = json.load(f)
+        if parsed == expected:
+            print(f"{entry}: ok ({len(parsed)} outputs)")
+        else:
+            failures += 1
+            print(f"{entry}: MISMATCH\n  expected {expected}\n  parsed   {parsed}")
+    return failures
+
+def main():
+    if len(sys.argv) >= 4 and sys.argv[1] == '--record':
+        # python -m utils.display_utils --record <dir> <name>
+        record_xrandr(sys.argv[2], sys.argv[3])
+        return
+    if len(sys.argv) >= 2 and sys.argv[1] == '--check':
+        # python -m utils.display_utils --check [dir with <name>.txt and <name>.json]
+        sys.exit(1 if check_recorded(sys.argv[2] if len(sys.argv) > 2 else FIXTURE_DIR) else 0)
+    for display in get_displays():
+        print(display)
+
+if __name__ == "__main__":
+    main()
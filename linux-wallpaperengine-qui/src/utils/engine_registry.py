@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+ACTIVE = 'active'  # Showing on its display
+STANDBY = 'standby'  # Spawned ahead of time and stopped
+STARTING = 'starting'  # Spawned, not yet confirmed ready
+
+class EngineRegistry:
+    """Persistent record of the engines this app spawned.
+
+    Every engine is written to a small JSON file with its pid, process
+    group, start time (clock ticks since boot, which tells a live engine
+    from a reused pid), display, wallpaper and role. The next session
+    reads it to adopt the engines still running instead of killing every
+    process that merely looks like an engine. Without a path the registry
+    only lives in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[int, Dict] = self._load()  # pid -> entry
+
+    def _load(self) -> Dict[int, Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return {int(entry['pid']): entry for entry in json.load(f)}
+        except Exception as e:
+            print(f"Error loading engine registry: {e}", file=sys.stderr)
+            return {}
+
+    def _save(self):
+        """Write the registry atomically. Caller holds the lock."""
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self.entries.values()), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving engine registry: {e}", file=sys.stderr)
+
+    def record(self, proc, role: str = STARTING):
+        """Add a freshly spawned or adopted EngineProcess"""
+        if proc.start_ticks is None:
+            return  # Already gone
+        with self.lock:
+            self.entries[proc.pid] = {
+                'pid': proc.pid,
+                'pgid': proc.pgid,
+                'start_ticks': proc.start_ticks,
+                'display': proc.display,
+                'wallpaper_id': proc.wallpaper_id,
+                'command': proc.command,
+                'role': role,
+            }
+            self._save()
+
+    def set_role(self, proc, role: str):
+        with self.lock:
+            entry = self.entries.get(proc.pid)
+            if entry and entry['role'] != role:
+                entry['role'] = role
+                self._save()
+
+    def forget(self, proc):
+        with self.lock:
+            if self.entries.pop(proc.pid, None) is not None:
+                self._save()
+
+    def take_all(self) -> List[Dict]:
+        """Remove and return every entry left by a previous session"""
+        with self.lock:
+            entries = list(self.entries.values())
+            self.entries.clear()
+            self._save()
+        return entries
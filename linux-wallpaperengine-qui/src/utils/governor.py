@@ -0,0 +1,292 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+RUNNING = 'running'
+THROTTLED = 'throttled'
+PAUSED = 'paused'
+SEVERITY = {RUNNING: 0, THROTTLED: 1, PAUSED: 2}
+
+class LoadSample(NamedTuple):
+    load: float  # 1-minute load average divided by CPU count
+    engine_cpu: float  # CPU% of all engine process groups together, 100 = one core
+    on_battery: bool
+    battery_percent: Optional[float]
+    fullscreen: bool
+
+class GovernorPolicy(NamedTuple):
+    throttle_load: float = 0.75  # Normalized load at which engines get throttled
+    pause_load: float = 1.0  # ... and paused
+    release_margin: float = 0.15  # Load must fall this far below a threshold to relax
+    max_engine_cpu: float = 50.0  # Throttle when the engines use more than this
+    throttle_duty: float = 0.25  # Fraction of each period a throttled engine may run
+    throttle_period: float = 0.2  # Seconds per run/stop cycle while throttled
+    pause_on_battery: bool = True
+    battery_min_percent: float = 0.0  # With pause_on_battery off, still pause below this
+    pause_on_fullscreen: bool = False
+    min_dwell: float = 10.0  # Seconds a state is held before relaxing it
+    sample_interval: float = 2.0
+
+def sample_system(processes: List, cpu_cache: dict, check_fullscreen: bool = False) -> LoadSample:
+    """Take one LoadSample with psutil; cpu_cache keeps psutil.Process objects between calls"""
+    import psutil  # Only needed once the governor runs
+
+    load = os.getloadavg()[0] / (os.cpu_count() or 1)
+
+    engine_cpu = 0.0
+    live = set()
+    for proc in processes:
+        try:
+            root = cpu_cache.get(proc.pid) or psutil.Process(proc.pid)
+            cpu_cache[proc.pid] = root
+            members = [root] + root.children(recursive=True)
+            for member in members:
+                cached = cpu_cache.setdefault(member.pid, member)
+                live.add(member.pid)
+                # First call per process returns 0.0 and primes the counter
+                engine_cpu += cached.cpu_percent(None)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    for pid in list(cpu_cache):
+        if pid not in live:
+            del cpu_cache[pid]
+
+    battery = psutil.sensors_battery() if hasattr(psutil, 'sensors_battery') else None
+    on_battery = bool(battery and not battery.power_plugged)
+    battery_percent = battery.percent if battery else None
+
+    return LoadSample(load, engine_cpu, on_battery, battery_percent,
+                      check_fullscreen and fullscreen_window_active())
+
+def fullscreen_window_active() -> bool:
+    """Whether the focused X11 window is fullscreen, via xprop"""
+    try:
+        active = subprocess.check_output(['xprop', '-root', '_NET_ACTIVE_WINDOW'],
+                                         stderr=subprocess.DEVNULL, timeout=1).decode()
+        window_id = active.strip().split()[-1]
+        if window_id in ('0x0', '0'):
+            return False
+        state = subprocess.check_output(['xprop', '-id', window_id, '_NET_WM_STATE'],
+                                        stderr=subprocess.DEVNULL, timeout=1).decode()
+        return '_NET_WM_STATE_FULLSCREEN' in state
+    except Exception:
+        return False
+
+class Governor:
+    """Pauses or throttles the wallpaper engines while the system is busy.
+
+    Each sample yields a target state (running, throttled or paused).
+    Moving to a more restrictive state happens immediately. Relaxing
+    requires the load to drop release_margin below the threshold, and the
+    current state must have been held for min_dwell seconds. Throttling
+    duty-cycles the engine process groups with SIGSTOP/SIGCONT.
+    """
+
+    def __init__(self, get_processes: Callable[[], List],
+                 policy: Optional[GovernorPolicy] = None,
+                 sampler: Optional[Callable[[List], LoadSample]] = None):
+        self.get_processes = get_processes  # Active EngineProcess objects to govern
+        self.policy = policy or GovernorPolicy()
+        self.cpu_cache = {}
+        self.sampler = sampler or (lambda procs: sample_system(procs, self.cpu_cache,
+                                                               self.policy.pause_on_fullscreen))
+        self.state = RUNNING
+        self.state_since = time.monotonic()
+        self.last_sample = None
+        self.transitions = []  # (monotonic time, old state, new state, reason)
+        self.stopped = False  # Whether we currently hold the engines stopped
+        self.running = False
+        self.wake = threading.Event()
+        self.thread = None
+
+    def target_state(self, sample: LoadSample):
+        """Return (state, reason) the policy asks for, before hysteresis"""
+        p = self.policy
+        if sample.on_battery and p.pause_on_battery:
+            return PAUSED, 'on battery'
+        if sample.battery_percent is not None and sample.on_battery \
+                and sample.battery_percent < p.battery_min_percent:
+            return PAUSED, f"battery at {sample.battery_percent:.0f}%"
+        if sample.fullscreen and p.pause_on_fullscreen:
+            return PAUSED, 'fullscreen window'
+
+        # Hysteresis: the bar for leaving a state is lower than for entering it
+        margin = p.release_margin
+        pause_at = p.pause_load - (margin if self.state == PAUSED else 0)
+        throttle_at = p.throttle_load - (margin if SEVERITY[self.state] >= 1 else 0)
+        if sample.load >= pause_at:
+            return PAUSED, f"load {sample.load:.2f}"
+        if sample.load >= throttle_at:
+            return THROTTLED, f"load {sample.load:.2f}"
+        engine_cpu = sample.engine_cpu
+        if self.state == THROTTLED:
+            # Measured while duty-cycled; judge what the engines would use unthrottled
+            engine_cpu /= max(p.throttle_duty, 0.01)
+        cpu_at = p.max_engine_cpu * (1 - margin if self.state == THROTTLED else 1)
+        if engine_cpu >= cpu_at:
+            return THROTTLED, f"engines at {engine_cpu:.0f}% CPU"
+        return RUNNING, 'idle'
+
+    def evaluate(self, sample: LoadSample) -> str:
+        """Feed one sample and apply the resulting state; returns the state"""
+        self.last_sample = sample
+        target, reason = self.target_state(sample)
+        now = time.monotonic()
+        relaxing = SEVERITY[target] < SEVERITY[self.state]
+        if target != self.state and (not relaxing or now - self.state_since >= self.policy.min_dwell):
+            self.transitions.append((now, self.state, target, reason))
+            print(f"Governor: {self.state} -> {target} ({reason})")
+            self.state = target
+            self.state_since = now
+            self._apply(self.state == PAUSED)
+        elif self.state == PAUSED:
+            self._apply(True)  # Catch engines spawned since we paused
+        return self.state
+
+    def _apply(self, stop: bool):
+        sig = signal.SIGSTOP if stop else signal.SIGCONT
+        for proc in self.get_processes():
+            try:
+                os.killpg(proc.pgid, sig)
+            except ProcessLookupError:
+                pass
+            except Exception as e:
+                print(f"Governor could not signal {proc}: {e}", file=sys.stderr)
+        self.stopped = stop
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wake.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop governing and continue the engines the governor stopped.
+
+        Engines stopped by someone else, e.g. a pause, are left alone.
+        """
+        self.running = False
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+        if self.stopped:
+            self._apply(False)
+        self.state = RUNNING
+        self.state_since = time.monotonic()
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while self.running:
+            now = time.monotonic()
+            if now >= next_sample:
+                try:
+                    self.evaluate(self.sampler(self.get_processes()))
+                except Exception as e:
+                    print(f"Governor sample failed: {e}", file=sys.stderr)
+                next_sample = now + self.policy.sample_interval
+
+            if self.state == THROTTLED:
+                # Duty cycle: run for duty * period, stop for the rest
+                period = self.policy.throttle_period
+                run_for = period * self.policy.throttle_duty
+                self._apply(False)
+                if self.wake.wait(run_for):
+                    break
+                if self.state == THROTTLED and self.running:
+                    self._apply(True)
+                    if self.wake.wait(period - run_for):
+                        break
+            else:
+                if self.stopped and self.state == RUNNING:
+                    self._apply(False)
+                self.wake.wait(max(0.0, next_sample - time.monotonic()))
+        if self.stopped:
+            self._apply(False)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fixtures', 'fake_engine')
+
+class _FakeEngine(NamedTuple):
+    pid: int
+    pgid: int
+
+def check(min_dwell: float = 0.3) -> int:
+    """Feed a scripted LoadSample sequence to evaluate() and check the states and the engine.
+
+    The engine is the fake binary from fixtures/fake_engine in its own
+    process group, so the SIGSTOP/SIGCONT the governor sends are checked
+    on a real process. Returns the number of mismatches.
+    """
+    from .supervisor import read_proc_stat
+
+    proc = subprocess.Popen([os.path.join(FIXTURE_DIR, 'linux-wallpaperengine'), '111'],
+                            start_new_session=True)
+    engine = _FakeEngine(proc.pid, proc.pid)
+    governor = Governor(lambda: [engine], GovernorPolicy(min_dwell=min_dwell),
+                        sampler=lambda procs: None)
+
+    def sample(load=0.2, engine_cpu=10.0, on_battery=False):
+        return LoadSample(load, engine_cpu, on_battery, 80.0 if on_battery else None, False)
+
+    # (seconds to wait first, sample, expected state, engine stopped afterwards, what it shows)
+    dwell = min_dwell + 0.05
+    script = [
+        (0, sample(), RUNNING, False, 'idle'),
+        (0, sample(load=0.8), THROTTLED, False, 'throttles at once'),
+        (0, sample(load=0.65), THROTTLED, False, 'held: still above throttle_load - release_margin'),
+        (0, sample(load=1.05), PAUSED, True, 'pauses at once'),
+        (0, sample(load=0.9), PAUSED, True, 'held: still above pause_load - release_margin'),
+        (0, sample(load=0.5), PAUSED, True, 'held: min_dwell not over yet'),
+        (dwell, sample(load=0.5), RUNNING, False, 'relaxes after min_dwell'),
+        (0, sample(engine_cpu=60.0), THROTTLED, False, 'engines over max_engine_cpu'),
+        (dwell, sample(engine_cpu=14.0), THROTTLED, False, 'held: 14% while duty-cycled is 56% unthrottled'),
+        (dwell, sample(engine_cpu=8.0), RUNNING, False, 'relaxes once the unthrottled estimate is low'),
+        (0, sample(on_battery=True), PAUSED, True, 'pauses on battery'),
+        (dwell, sample(), RUNNING, False, 'back on AC'),
+    ]
+    failures = 0
+    try:
+        for wait, load_sample, expected, stopped, what in script:
+            time.sleep(wait)
+            state = governor.evaluate(load_sample)
+            time.sleep(0.05)  # Let the signal land
+            engine_stopped = read_proc_stat(engine.pid).state == 'T'
+            ok = state == expected and engine_stopped == stopped
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':>4}  load {load_sample.load:.2f} cpu {load_sample.engine_cpu:>4.0f}% "
+                  f"battery {'yes' if load_sample.on_battery else 'no':<3} -> {state:<9} "
+                  f"engine {'stopped' if engine_stopped else 'running'}  ({what})")
+
+        # stop() continues what the governor stopped, and only that
+        for governor_stopped in (True, False):
+            if governor_stopped:
+                governor.evaluate(sample(on_battery=True))
+            else:
+                os.killpg(engine.pgid, signal.SIGSTOP)  # Like a pause, from outside the governor
+            governor.stop()
+            time.sleep(0.05)
+            engine_stopped = read_proc_stat(engine.pid).state == 'T'
+            ok = engine_stopped != governor_stopped
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':>4}  stop() with the engine stopped by "
+                  f"{'the governor' if governor_stopped else 'someone else'}: "
+                  f"engine {'stopped' if engine_stopped else 'running'}")
+            os.killpg(engine.pgid, signal.SIGCONT)
+    finally:
+        proc.kill()
+        proc.wait()
+    return failures
+
+def main():
+    # python -m utils.governor --check
+    if len(sys.argv) >= 2 and sys.argv[1] == '--check':
+        sys.exit(1 if check() else 0)
+    print("Usage: python -m utils.governor --check")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+
+class HealthMonitor:
+    """Restarts crashed engines with exponential backoff and quarantines repeat offenders.
+
+    Fed by the supervisor's exit callbacks, so a crash is seen as soon as
+    the child exits. restart(display, wallpaper_id) returns the LaunchResult
+    of the attempt, or None when the display no longer needs it; a failed
+    attempt schedules the next one with a longer delay. A wallpaper that
+    fails quarantine_after times within failure_window seconds is
+    quarantined and no longer restarted.
+    Restarts and quarantines are appended to a JSON-lines failure log, and
+    the quarantine list is saved so it survives restarts.
+    """
+
+    def __init__(self, restart: Callable[[str, str], Optional[object]],
+                 log_path: Optional[str] = None,
+                 quarantine_path: Optional[str] = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0,
+                 quarantine_after: int = 3, failure_window: float = 600.0,
+                 stable_after: float = 60.0):
+        self.restart = restart  # restart(display, wallpaper_id) -> LaunchResult or None
+        self.log_path = log_path
+        self.quarantine_path = quarantine_path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.quarantine_after = quarantine_after
+        self.failure_window = failure_window
+        self.stable_after = stable_after  # A run this long resets the backoff
+        self.lock = threading.Lock()
+        self.failures: Dict[str, deque] = {}  # wallpaper id -> monotonic failure times
+        self.consecutive: Dict[str, int] = {}  # display -> crashes since last stable run
+        self.pending: Dict[str, threading.Timer] = {}  # display -> scheduled restart
+        self.restarts: Dict[str, int] = {}  # display -> restart attempts after crashes
+        self.recent = deque(maxlen=200)  # Log entries of this session, newest last
+        self.quarantined: Set[str] = self._load_quarantine()
+
+    def _load_quarantine(self) -> Set[str]:
+        if not self.quarantine_path or not os.path.exists(self.quarantine_path):
+            return set()
+        try:
+            with open(self.quarantine_path, 'r') as f:
+                return set(json.load(f))
+        except Exception as e:
+            print(f"Error loading quarantine list: {e}", file=sys.stderr)
+            return set()
+
+    def _save_quarantine(self):
+        if not self.quarantine_path:
+            return
+        try:
+            with open(self.quarantine_path, 'w') as f:
+                json.dump(sorted(self.quarantined), f)
+        except Exception as e:
+            print(f"Error saving quarantine list: {e}", file=sys.stderr)
+
+    def _log(self, entry: Dict):
+        entry = dict(entry, time=time.time())
+        self.recent.append(entry)
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except Exception as e:
+            print(f"Error writing failure log: {e}", file=sys.stderr)
+
+    def read_log(self, limit: int = 200) -> List[Dict]:
+        """Newest-last failure log entries, from the file when there is one"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return list(self.recent)[-limit:]
+        try:
+            with open(self.log_path, 'r') as f:
+                lines = deque(f, maxlen=limit)
+            return [json.loads(line) for line in lines if line.strip()]
+        except Exception as e:
+            print(f"Error reading failure log: {e}", file=sys.stderr)
+            return list(self.recent)[-limit:]
+
+    def is_quarantined(self, wallpaper_id: str) -> bool:
+        return str(wallpaper_id) in self.quarantined
+
+    def release(self, wallpaper_id: Optional[str] = None):
+        """Lift the quarantine for one wallpaper, or for all of them"""
+        with self.lock:
+            if wallpaper_id is None:
+                self.quarantined.clear()
+                self.failures.clear()
+            else:
+                self.quarantined.discard(str(wallpaper_id))
+                self.failures.pop(str(wallpaper_id), None)
+            self._save_quarantine()
+
+    def cancel_restart(self, display: str):
+        """Drop a pending restart, e.g. because the display got a new wallpaper"""
+        with self.lock:
+            timer = self.pending.pop(display, None)
+        if timer:
+            timer.cancel()
+
+    def restart_count(self, display: str) -> int:
+        """Engines restarted on display because the previous one crashed"""
+        with self.lock:
+            return self.restarts.get(display, 0)
+
+    def record_crash(self, proc, was_active: bool):
+        """Handle an engine that exited without being asked to.
+
+        was_active says whether it was the engine shown on its display; one
+        that died while starting counts towards quarantine but is not restarted.
+        """
+        now = time.monotonic()
+        uptime = now - proc.started
+        wallpaper_id = proc.wallpaper_id
+        display = proc.display
+        entry = {'display': display, 'wallpaper_id': wallpaper_id,
+                 'returncode': proc.returncode, 'uptime': round(uptime, 3)}
+
+        with self.lock:
+            failures = self.failures.setdefault(wallpaper_id, deque())
+            failures.append(now)
+            while failures and now - failures[0] > self.failure_window:
+                failures.popleft()
+
+            if self._quarantine_locked(wallpaper_id, failures, entry):
+                return
+            if not was_active:
+                # Restart attempts that die like this are rescheduled by _fire()
+                self._log(dict(entry, action='failed_start'))
+                return
+
+            if uptime >= self.stable_after:
+                self.consecutive[display] = 0
+            self._schedule_locked(display, wallpaper_id, entry)
+            print(f"Engine on {display} crashed (status {proc.returncode}), restarting", file=sys.stderr)
+
+    def _quarantine_locked(self, wallpaper_id: str, failures: deque, entry: Dict) -> bool:
+        """Quarantine wallpaper_id if it failed often enough; caller holds the lock"""
+        if len(failures) < self.quarantine_after and wallpaper_id not in self.quarantined:
+            return False
+        if wallpaper_id not in self.quarantined:
+            self.quarantined.add(wallpaper_id)
+            self._save_quarantine()
+            self._log(dict(entry, action='quarantine'))
+            print(f"Quarantined wallpaper {wallpaper_id} after {len(failures)} failures", file=sys.stderr)
+        return True
+
+    def _schedule_locked(self, display: str, wallpaper_id: str, entry: Dict):
+        """Next restart of the backoff chain for display; caller holds the lock"""
+        attempt = self.consecutive.get(display, 0) + 1
+        self.consecutive[display] = attempt
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        self._log(dict(entry, action='restart', delay=delay))
+        old = self.pending.pop(display, None)
+        if old:
+            old.cancel()
+        timer = threading.Timer(delay, self._fire, args=(display, wallpaper_id))
+        timer.daemon = True
+        self.pending[display] = timer
+        timer.start()
+
+    def _fire(self, display: str, wallpaper_id: str):
+        with self.lock:
+            self.pending.pop(display, None)
+            if wallpaper_id in self.quarantined:
+                return  # The attempt before this one pushed it over
+        try:
+            result = self.restart(display, wallpaper_id)
+        except Exception as e:
+            print(f"Error restarting engine on {display}: {e}", file=sys.stderr)
+            result = None
+        if result is not None:
+            with self.lock:
+                self.restarts[display] = self.restarts.get(display, 0) + 1
+        if result is None or result.ok:
+            return
+
+        # The restart did not come up, so nothing is active on the display and
+        # no crash callback will continue the chain: schedule the next attempt
+        entry = {'display': display, 'wallpaper_id': wallpaper_id, 'error': result.error}
+        now = time.monotonic()
+        with self.lock:
+            if display in self.pending:
+                return  # Someone else already scheduled the display
+            failures = self.failures.setdefault(wallpaper_id, deque())
+            if result.pid is None:
+                failures.append(now)  # Never spawned, so record_crash() will not count it
+            while failures and now - failures[0] > self.failure_window:
+                failures.popleft()
+            if self._quarantine_locked(wallpaper_id, failures, entry):
+                return
+            self._schedule_locked(display, wallpaper_id, entry)
+        print(f"Restart on {display} failed ({result.error}), trying again", file=sys.stderr)
+
+    def shutdown(self):
+        with self.lock:
+            timers = list(self.pending.values())
+            self.pending.clear()
+        for timer in timers:
+            timer.cancel()
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fixtures', 'fake_engine')
+
+def check(base_delay: float = 0.2, quarantine_after: int = 3) -> int:
+    """Run a crashing wallpaper on the fake engine through the real restart path; returns failures.
+
+    The fake engine with a 'crash' id comes up, then exits after 0.7s. It
+    must be restarted with doubling delays and quarantined on its
+    quarantine_after-th failure, with no restart after that.
+    """
+    import shutil
+    import tempfile
+    from .process_utils import WallpaperManager
+
+    os.environ['PATH'] = FIXTURE_DIR + os.pathsep + os.environ.get('PATH', '')
+    state_dir = tempfile.mkdtemp()
+    manager = WallpaperManager(state_dir=state_dir)
+    health = manager.health
+    health.base_delay = base_delay
+    health.quarantine_after = quarantine_after
+    display, wallpaper_id = 'CHECK-1', 'crash1'
+    try:
+        start = time.time()
+        manager.change_wallpaper(display, wallpaper_id)
+        deadline = time.monotonic() + 5.0 + base_delay * 2 ** quarantine_after
+        while not health.is_quarantined(wallpaper_id) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(base_delay * 2 ** quarantine_after)  # A restart after the quarantine would show up by now
+        log = [e for e in health.read_log() if e.get('display') == display]
+        for entry in log:
+            delay = f", delay {entry['delay']:.1f}s" if 'delay' in entry else ''
+            print(f"      {entry['time'] - start:5.2f}s  {entry['action']}{delay}")
+
+        expected = [('restart', base_delay * 2 ** n) for n in range(quarantine_after - 1)] + [('quarantine', None)]
+        actions = [(e['action'], e.get('delay')) for e in log]
+        checks = [
+            ('restarts with doubling backoff, then quarantine', actions == expected),
+            (f"{quarantine_after - 1} crash restarts counted", health.restart_count(display) == quarantine_after - 1),
+            ('quarantined', health.is_quarantined(wallpaper_id)),
+            ('nothing left on the display', manager.current_wallpaper(display) is None),
+        ]
+        for what, ok in checks:
+            print(f"{'ok' if ok else 'FAIL':>4}  {what}")
+        if actions != expected:
+            print(f"      expected {expected}\n      got      {actions}")
+        return sum(not ok for _, ok in checks)
+    finally:
+        manager.kill_all()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+def main():
+    # python -m utils.health --check
+    if len(sys.argv) >= 2 and sys.argv[1] == '--check':
+        sys.exit(1 if check() else 0)
+    print("Usage: python -m utils.health --check")
+
+if __name__ == "__main__":
+    main()
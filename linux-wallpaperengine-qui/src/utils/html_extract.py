@@ -0,0 +1,210 @@
+"""Extraction of subscribed wallpapers from workshop listing pages.
+
+Each backend takes the raw page bytes and returns (div id, preview src) pairs
+for every div.workshopItemSubscription, in document order. The BeautifulSoup
+backend is the reference implementation; the others must produce identical
+output (see check() and the pages in fixtures/workshop_pages).
+"""
+import glob
+import html as html_lib
+import json
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+SUBSCRIPTION_CLASS = 'workshopItemSubscription'
+PREVIEW_CLASS = 'backgroundImg'
+
+# A comment, or a start/end tag whose quoted attribute values may contain '>'
+TOKEN_RE = re.compile(r'''<!--.*?-->|<(/?)([a-zA-Z][^\s/>]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''', re.S)
+# Elements whose contents html.parser reads as text, up to their end tag
+RAW_TEXT = {name: re.compile(f'</{name}', re.I) for name in ('script', 'style')}
+ATTR_RE = re.compile(r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+
+Pair = Tuple[str, str]
+
+def _has_class(attrs: Dict[str, str], name: str) -> bool:
+    return name in attrs.get('class', '').split()
+
+def _parse_attrs(tag: str) -> Dict[str, str]:
+    """Attributes of a start tag such as '<div class="a b" id="x">'"""
+    attrs = {}
+    body = tag[1:-1]
+    name_end = 0
+    while name_end < len(body) and not body[name_end].isspace() and body[name_end] != '/':
+        name_end += 1
+    for match in ATTR_RE.finditer(body, name_end):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue  # Like html.parser and lxml, the first occurrence wins
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4) or ''
+        attrs[name] = html_lib.unescape(value)
+    return attrs
+
+def extract_scan(html: bytes) -> List[Pair]:
+    """Single-pass tag scanner: only div and img start tags mentioning the classes are parsed.
+
+    Follows html.parser where it matters for the reference backend:
+    comments are skipped, script and style contents are raw text, and a
+    quoted '>' does not end a tag. The preview is the first
+    img.backgroundImg inside the subscription div, found by counting
+    nested divs up to the div's end tag.
+    """
+    text = html.decode('utf-8', errors='replace')
+    pairs = []
+    open_items = []  # [index into pairs, div depth] of subscriptions still open
+    pos = 0
+    while True:
+        match = TOKEN_RE.search(text, pos)
+        if not match:
+            break
+        pos = match.end()
+        name = match.group(2)
+        if name is None:
+            continue  # Comment
+        name = name.lower()
+        if match.group(1):
+            if name == 'div' and open_items:
+                for item in open_items:
+                    item[1] -= 1
+                open_items = [item for item in open_items if item[1] > 0]
+            continue
+        if name in RAW_TEXT:
+            end = RAW_TEXT[name].search(text, pos)
+            pos = end.start() if end else len(text)
+            continue
+        if name == 'div':
+            for item in open_items:
+                item[1] += 1
+            if SUBSCRIPTION_CLASS in match.group(3):
+                attrs = _parse_attrs(match.group(0))
+                if _has_class(attrs, SUBSCRIPTION_CLASS):
+                    pairs.append((attrs.get('id', ''), None))
+                    open_items.append([len(pairs) - 1, 1])
+        elif name == 'img' and open_items and PREVIEW_CLASS in match.group(3):
+            attrs = _parse_attrs(match.group(0))
+            if _has_class(attrs, PREVIEW_CLASS):
+                for index, _ in open_items:
+                    if pairs[index][1] is None:
+                        pairs[index] = (pairs[index][0], attrs.get('src') or '')
+    return [(sub_id, src or '') for sub_id, src in pairs]
+
+def extract_lxml(html: bytes) -> List[Pair]:
+    import lxml.html
+    root = lxml.html.fromstring(html)
+    pairs = []
+    for div in root.xpath(f"//div[contains(concat(' ', normalize-space(@class), ' '), ' {SUBSCRIPTION_CLASS} ')]"):
+        imgs = div.xpath(f".//img[contains(concat(' ', normalize-space(@class), ' '), ' {PREVIEW_CLASS} ')]")
+        src = (imgs[0].get('src') or '') if imgs else ''
+        pairs.append((div.get('id', ''), src))
+    return pairs
+
+def extract_bs4(html: bytes) -> List[Pair]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    pairs = []
+    for sub in soup.find_all('div', class_=SUBSCRIPTION_CLASS):
+        preview_img = sub.find('img', class_=PREVIEW_CLASS)
+        src = (preview_img.get('src') or '') if preview_img else ''
+        pairs.append((sub.get('id', ''), src))
+    return pairs
+
+BACKENDS: Dict[str, Callable[[bytes], List[Pair]]] = {
+    'scan': extract_scan,
+    'lxml': extract_lxml,
+    'bs4': extract_bs4,
+}
+REFERENCE_BACKEND = 'bs4'
+DEFAULT_BACKEND = 'scan'  # Needs no third-party parser; --check holds it to the same output as bs4
+
+def set_default_backend(name: str):
+    global DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown extraction backend: {name}")
+    DEFAULT_BACKEND = name
+
+def extract_subscriptions(html: bytes, backend: Optional[str] = None) -> List[Pair]:
+    """Return (wallpaper id, preview url) for every subscription on the page"""
+    pairs = []
+    for sub_id, src in BACKENDS[backend or DEFAULT_BACKEND](html):
+        if sub_id.startswith('Subscription'):
+            wallpaper_id = sub_id.replace('Subscription', '')
+            if wallpaper_id.isdigit():
+                pairs.append((wallpaper_id, src))
+    return pairs
+
+# Synthetic pages covering the markup the scanner has to get right, with hand-written expected output
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'fixtures', 'workshop_pages')
+
+def load_pages(corpus_dir: str) -> List[Tuple[str, bytes, Optional[List[Pair]]]]:
+    """(name, page bytes, expected pairs or None) for every .html page in corpus_dir"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '*.html'))):
+        with open(path, 'rb') as f:
+            data = f.read()
+        expected = None
+        expected_path = path[:-len('.html')] + '.expected.json'
+        if os.path.exists(expected_path):
+            with open(expected_path, 'r') as f:
+                expected = [tuple(pair) for pair in json.load(f)]
+        pages.append((os.path.basename(path), data, expected))
+    return pages
+
+def check(corpus_dir: str = FIXTURE_DIR, rounds: int = 0) -> bool:
+    """Run every available backend over the pages and compare with the expected output.
+
+    Pages without a .expected.json are compared with the reference backend.
+    With rounds, each backend is also timed.
+    """
+    pages = load_pages(corpus_dir)
+    if not pages:
+        print(f"No .html pages in {corpus_dir}")
+        return False
+    try:
+        reference = {name: extract_subscriptions(data, REFERENCE_BACKEND) for name, data, _ in pages}
+    except ImportError:
+        reference = {}
+    ok = True
+    for backend in BACKENDS:
+        try:
+            results = {name: extract_subscriptions(data, backend) for name, data, _ in pages}
+            elapsed = 0.0
+            if rounds:
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    for _, data, _ in pages:
+                        extract_subscriptions(data, backend)
+                elapsed = (time.perf_counter() - start) / rounds
+        except ImportError as e:
+            print(f"{backend:>5}: unavailable ({e})")
+            continue
+        mismatches = []
+        for name, _, expected in pages:
+            wanted = expected if expected is not None else reference.get(name)
+            if wanted is not None and results[name] != wanted:
+                mismatches.append(name)
+        ok = ok and not mismatches
+        count = sum(len(r) for r in results.values())
+        timing = f"{elapsed * 1000 / len(pages):8.2f} ms/page, " if rounds else ""
+        print(f"{backend:>5}: {timing}{count} items"
+              + (f", MISMATCH in {', '.join(mismatches)}" if mismatches else ", ok"))
+    return ok
+
+def main():
+    # python -m utils.html_extract --check [corpus dir]
+    # python -m utils.html_extract --bench <corpus dir> [rounds]
+    # Record a corpus with: python -m utils.steam_fetcher --record <dir> <steam username>
+    if len(sys.argv) >= 2 and sys.argv[1] == '--check':
+        sys.exit(0 if check(sys.argv[2] if len(sys.argv) > 2 else FIXTURE_DIR) else 1)
+    if len(sys.argv) >= 3 and sys.argv[1] == '--bench':
+        sys.exit(0 if check(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 5) else 1)
+    print("Usage: python -m utils.html_extract --check [corpus dir] | --bench <corpus dir> [rounds]")
+
+if __name__ == "__main__":
+    main()
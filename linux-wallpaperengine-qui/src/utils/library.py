@@ -0,0 +1,390 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SCHEMA_VERSION = 2
+SPACING = 1024  # Gap between the positions of neighbouring rows, room for later inserts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallpapers (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,  -- Order in the subscription listing, sparse
+    preview_url TEXT NOT NULL DEFAULT '',
+    preview_hash TEXT,  -- Thumbnail cache key of preview_url
+    title TEXT NOT NULL DEFAULT '',
+    tags TEXT NOT NULL DEFAULT '',  -- Comma separated
+    type TEXT NOT NULL DEFAULT '',  -- scene, video, web, ...
+    installed_size INTEGER,  -- Bytes on disk, NULL when not installed
+    local_path TEXT,  -- Workshop directory, NULL when not installed
+    preview_path TEXT,  -- preview file inside local_path
+    last_used REAL,
+    use_count INTEGER NOT NULL DEFAULT 0,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wallpapers_position ON wallpapers(position);
+CREATE INDEX IF NOT EXISTS wallpapers_type ON wallpapers(type, position);
+CREATE INDEX IF NOT EXISTS wallpapers_last_used ON wallpapers(last_used);
+CREATE INDEX IF NOT EXISTS wallpapers_use_count ON wallpapers(use_count);
+"""
+
+# Columns added after version 1, for libraries created before them
+MIGRATIONS = [
+    ('local_path', 'ALTER TABLE wallpapers ADD COLUMN local_path TEXT'),
+    ('preview_path', 'ALTER TABLE wallpapers ADD COLUMN preview_path TEXT'),
+]
+
+# Preview urls of rows that only come from the local scan, Steam never listed them
+LOCAL_PREVIEW = 'file://'
+
+# External-content full text index over the searchable columns, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS wallpapers_fts USING fts5(
+    id, title, tags, type, content='wallpapers', content_rowid='rowid', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS wallpapers_fts_insert AFTER INSERT ON wallpapers BEGIN
+    INSERT INTO wallpapers_fts(rowid, id, title, tags, type)
+    VALUES (new.rowid, new.id, new.title, new.tags, new.type);
+END;
+CREATE TRIGGER IF NOT EXISTS wallpapers_fts_delete AFTER DELETE ON wallpapers BEGIN
+    INSERT INTO wallpapers_fts(wallpapers_fts, rowid, id, title, tags, type)
+    VALUES ('delete', old.rowid, old.id, old.title, old.tags, old.type);
+END;
+CREATE TRIGGER IF NOT EXISTS wallpapers_fts_update AFTER UPDATE OF title, tags, type ON wallpapers BEGIN
+    INSERT INTO wallpapers_fts(wallpapers_fts, rowid, id, title, tags, type)
+    VALUES ('delete', old.rowid, old.id, old.title, old.tags, old.type);
+    INSERT INTO wallpapers_fts(rowid, id, title, tags, type)
+    VALUES (new.rowid, new.id, new.title, new.tags, new.type);
+END;
+"""
+
+SORT_ORDERS = {
+    'position': 'w.position',
+    'title': "w.title = '', w.title COLLATE NOCASE, w.position",
+    'last_used': 'w.last_used IS NULL, w.last_used DESC, w.position',
+    'use_count': 'w.use_count DESC, w.position',
+    'size': 'w.installed_size IS NULL, w.installed_size DESC, w.position',
+}
+
+def preview_hash(url: str) -> str:
+    """Same key ThumbnailCache files the preview under"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+def plan_positions(ids: Sequence[str], existing: Dict[str, int]) -> Optional[List[int]]:
+    """Positions for ids in list order, or None when everything has to be renumbered.
+
+    Rows already stored keep their position as long as they are still in the
+    same relative order; new rows are spread over the gaps around them.
+    """
+    positions = [existing.get(wallpaper_id) for wallpaper_id in ids]
+    known = [p for p in positions if p is not None]
+    if any(b <= a for a, b in zip(known, known[1:])):
+        return None  # Reordered
+    i = 0
+    while i < len(positions):
+        if positions[i] is not None:
+            i += 1
+            continue
+        j = i
+        while j < len(positions) and positions[j] is None:
+            j += 1
+        count = j - i
+        low = positions[i - 1] if i > 0 else None
+        high = positions[j] if j < len(positions) else None
+        if low is None and high is None:
+            low, high = -SPACING, count * SPACING
+        elif low is None:
+            low = high - (count + 1) * SPACING
+        elif high is None:
+            high = low + (count + 1) * SPACING
+        if high - low <= count:
+            return None  # Gap used up
+        step = (high - low) // (count + 1)
+        for k in range(count):
+            positions[i + k] = low + step * (k + 1)
+        i = j
+    return positions
+
+def fts_query(text: str) -> str:
+    """Every word as a quoted prefix term, so "anim city" matches "Anime Cityscape" """
+    return ' '.join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+class WallpaperLibrary:
+    """Indexed store of the subscribed wallpapers, in SQLite.
+
+    Holds the subscription order and preview url from Steam, details from
+    the installed project.json (title, tags, type, size, local paths) and
+    usage (last used, use count). Installed wallpapers Steam did not list
+    are kept too, after the subscriptions. Writes are transactional and only touch rows that
+    changed. Searches go through an FTS5 index when the sqlite build has
+    it, LIKE otherwise. The database runs in WAL mode, so the GUI and the
+    daemon can use it at the same time; both scan the workshop, so every
+    read-modify-write holds the database write lock from its first read.
+    One instance may be shared between threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(wallpapers)')}
+            for column, statement in MIGRATIONS:
+                if column not in columns:
+                    self.conn.execute(statement)
+            try:
+                self.conn.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                print(f"Full text search unavailable ({e}), searching with LIKE", file=sys.stderr)
+                self.fts = False
+            self.conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextmanager
+    def _write(self):
+        """Transaction that takes the write lock up front, before anything is read.
+
+        A deferred transaction would only lock at its first write, so the
+        other process could insert the same new rows in between.
+        """
+        with self.lock, self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            yield
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM wallpapers').fetchone()[0]
+
+    def subscriptions(self) -> List[Tuple[str, str]]:
+        """(id, preview url) of every wallpaper in listing order"""
+        with self.lock:
+            return self.conn.execute('SELECT id, preview_url FROM wallpapers ORDER BY position').fetchall()
+
+    def entries(self) -> List[Dict]:
+        """Every column of every wallpaper in listing order"""
+        with self.lock:
+            cursor = self.conn.execute('SELECT * FROM wallpapers ORDER BY position')
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def local_previews(self) -> Dict[str, str]:
+        """preview url -> preview file of every installed wallpaper that has one"""
+        with self.lock:
+            return dict(self.conn.execute('SELECT preview_url, preview_path FROM wallpapers '
+                                          'WHERE preview_path IS NOT NULL'))
+
+    def titles(self) -> Dict[str, str]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT id, title FROM wallpapers WHERE title != ''"))
+
+    def apply_refresh(self, wallpapers: Sequence) -> Dict[str, int]:
+        """Make the library match a fetched subscription list of (id, preview url).
+
+        One transaction; rows whose position and preview are unchanged are
+        not written. Installed wallpapers stay even when not listed.
+        Returns the number of rows added, updated and removed.
+        """
+        now = time.time()
+        with self._write():
+            existing = {row[0]: (row[1], row[2]) for row in
+                        self.conn.execute('SELECT id, position, preview_url FROM wallpapers')}
+            installed = {row[0] for row in
+                         self.conn.execute('SELECT id FROM wallpapers WHERE local_path IS NOT NULL')}
+            ids = [str(w[0]) for w in wallpapers]
+            positions = plan_positions(ids, {i: p for i, (p, _) in existing.items()})
+            if positions is None:
+                positions = [k * SPACING for k in range(len(ids))]
+            added, updated = [], []
+            for wallpaper_id, position, w in zip(ids, positions, wallpapers):
+                url = w[1] or ''
+                old = existing.get(wallpaper_id)
+                if old is None:
+                    added.append((wallpaper_id, position, url, preview_hash(url), now))
+                elif old != (position, url):
+                    updated.append((position, url, preview_hash(url), wallpaper_id))
+            removed = [(i,) for i in existing.keys() - set(ids) - installed]
+            self.conn.executemany('DELETE FROM wallpapers WHERE id = ?', removed)
+            self.conn.executemany('UPDATE wallpapers SET position = ?, preview_url = ?, preview_hash = ? '
+                                  'WHERE id = ?', updated)
+            self.conn.executemany('INSERT INTO wallpapers (id, position, preview_url, preview_hash, added) '
+                                  'VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET position = '
+                                  'excluded.position, preview_url = excluded.preview_url, '
+                                  'preview_hash = excluded.preview_hash', added)
+        return {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
+
+    def apply_local(self, items: Iterable, removed: Iterable[str] = (), full: bool = False) -> Dict[str, int]:
+        """Store what the workshop scan found (LocalWallpaper-like items).
+
+        Installed wallpapers missing from the library are appended after the
+        subscriptions with their local preview as preview url. Ids in removed,
+        and with full every installed row not in items, lose their local
+        details; rows that only came from the scan are dropped.
+        Returns the number of rows added, updated and removed.
+        """
+        items = list(items)
+        now = time.time()
+        with self._write():
+            existing = {row[0]: row[1:] for row in self.conn.execute(
+                'SELECT id, title, tags, type, installed_size, local_path, preview_path FROM wallpapers')}
+            gone = set(str(i) for i in removed)
+            if full:
+                gone |= {i for i, row in existing.items() if row[4] is not None} - {w.id for w in items}
+            position = self.conn.execute('SELECT MAX(position) FROM wallpapers').fetchone()[0]
+            position = -SPACING if position is None else position
+            added, updated = [], []
+            for w in items:
+                details = (w.title, ','.join(w.tags), w.type, w.size, w.path, w.preview_path or None)
+                if w.id not in existing:
+                    position += SPACING
+                    url = w.preview_url or LOCAL_PREVIEW
+                    added.append((w.id, position, url, preview_hash(url), now) + details)
+                elif existing[w.id] != details:
+                    updated.append(details + (w.id,))
+            self.conn.executemany('INSERT INTO wallpapers (id, position, preview_url, preview_hash, added, '
+                                  'title, tags, type, installed_size, local_path, preview_path) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET '
+                                  'title = excluded.title, tags = excluded.tags, type = excluded.type, '
+                                  'installed_size = excluded.installed_size, local_path = excluded.local_path, '
+                                  'preview_path = excluded.preview_path', added)
+            self.conn.executemany('UPDATE wallpapers SET title = ?, tags = ?, type = ?, installed_size = ?, '
+                                  'local_path = ?, preview_path = ? WHERE id = ?', updated)
+            gone = [(i,) for i in gone if i in existing]
+            self.conn.executemany(f"DELETE FROM wallpapers WHERE id = ? AND preview_url LIKE '{LOCAL_PREVIEW}%'",
+                                  gone)
+            self.conn.executemany('UPDATE wallpapers SET installed_size = NULL, local_path = NULL, '
+                                  'preview_path = NULL WHERE id = ?', gone)
+        return {'added': len(added), 'updated': len(updated), 'removed': len(gone)}
+
+    def record_use(self, wallpaper_id: str):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE wallpapers SET last_used = ?, use_count = use_count + 1 WHERE id = ?',
+                              (time.time(), str(wallpaper_id)))
+
+    def search(self, text: str = '', kind: Optional[str] = None, sort: str = 'position',
+               limit: Optional[int] = None) -> List[str]:
+        """Ids matching every word of text (prefixes of id, title, tags or type), optionally of one type"""
+        clauses, params = [], []
+        source = 'wallpapers w'
+        if text.strip():
+            if self.fts:
+                # CROSS JOIN pins the join order: run the full text query once and look
+                # the hits up by rowid. Driven from the type index instead, sqlite would
+                # re-run the match for every row.
+                source = 'wallpapers_fts f CROSS JOIN wallpapers w ON w.rowid = f.rowid'
+                clauses.append('wallpapers_fts MATCH ?1')
+                params.append(fts_query(text))
+            else:
+                for word in text.split():
+                    pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                    clauses.append("(w.id LIKE ?1 ESCAPE '\\' OR w.title LIKE ?1 ESCAPE '\\' "
+                                   "OR w.tags LIKE ?1 ESCAPE '\\' OR w.type LIKE ?1 ESCAPE '\\')"
+                                   .replace('?1', f'?{len(params) + 1}'))
+                    params.append(pattern)
+        if kind:
+            clauses.append(f'w.type = ?{len(params) + 1}')
+            params.append(kind)
+        sql = f"SELECT w.id FROM {source}"
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + SORT_ORDERS[sort]
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        with self.lock:
+            try:
+                return [row[0] for row in self.conn.execute(sql, params)]
+            except sqlite3.OperationalError as e:
+                print(f"Search failed: {e}", file=sys.stderr)
+                return []
+
+    def migrate_json(self, json_path: str) -> bool:
+        """One-time import of the old wallpapers.txt cache; the file is renamed afterwards"""
+        if not os.path.exists(json_path):
+            return False
+        if self.count() == 0:
+            try:
+                with open(json_path, 'r') as f:
+                    cache_data = json.load(f)
+                self.apply_refresh([(str(w['id']), w.get('preview_url') or '') for w in cache_data])
+            except Exception as e:
+                print(f"Error migrating {json_path}: {e}", file=sys.stderr)
+                return False
+            print(f"Migrated {len(cache_data)} wallpapers from {os.path.basename(json_path)}")
+        try:
+            os.replace(json_path, f"{json_path}.migrated")
+        except FileNotFoundError:
+            pass  # The daemon and the GUI both migrate on startup
+        return True
+
+def benchmark(count: int = 20000, queries: Sequence[str] = ('a', 'ani', 'anime city', 'rain night', '1234')):
+    """Time migration, searches and a refresh that prepends a few subscriptions on a synthetic library"""
+    import random
+    import tempfile
+    from .workshop_scanner import LocalWallpaper
+
+    words = ['anime', 'city', 'rain', 'night', 'forest', 'space', 'ocean', 'neon', 'cyberpunk', 'sunset',
+             'mountain', 'lofi', 'pixel', 'abstract', 'snow', 'cat', 'car', 'girl', 'landscape', 'minimal']
+    tags = ['Anime', 'Nature', 'Sci-Fi', 'Game', 'Relaxing', 'Abstract', 'Vehicle', 'Music', 'Pixel art']
+    rng = random.Random(1)
+    subscriptions = [(str(1000000000 + i), f"https://images.example/ugc/{i}/preview.jpg") for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'wallpapers.txt')
+        with open(json_path, 'w') as f:
+            json.dump([{'id': i, 'preview_url': u} for i, u in subscriptions], f)
+        library = WallpaperLibrary(os.path.join(tmp, 'library.db'))
+        start = time.perf_counter()
+        library.migrate_json(json_path)
+        print(f"migrate {count} entries: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        # All but the last subscription are installed; the refresh below drops that one,
+        # and installed rows would be kept
+        installed = subscriptions[:-1]
+        start = time.perf_counter()
+        library.apply_local(LocalWallpaper(
+            id=i, title=' '.join(rng.sample(words, 3)).title(), type=rng.choice(['scene', 'video', 'web']),
+            tags=tuple(rng.sample(tags, 2)), preview_path='', path=f'/workshop/{i}',
+            size=rng.randint(1, 500) << 20, stamp=(0, 0)) for i, _ in installed)
+        print(f"details for {len(installed)} entries: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        start = time.perf_counter()
+        library.subscriptions()
+        print(f"load list: {(time.perf_counter() - start) * 1000:.1f} ms")
+        for query in queries:
+            for kind in (None, 'video'):
+                start = time.perf_counter()
+                rounds = 20
+                for _ in range(rounds):
+                    found = library.search(query, kind=kind)
+                elapsed = (time.perf_counter() - start) / rounds
+                print(f"search {query!r}{' type=' + kind if kind else ''}: "
+                      f"{elapsed * 1000:.2f} ms, {len(found)} results")
+
+        fresh = [(str(2000000000 + i), f"https://images.example/ugc/new{i}.jpg") for i in range(3)]
+        start = time.perf_counter()
+        changes = library.apply_refresh(fresh + subscriptions[:-1])
+        print(f"refresh with 3 new, 1 removed: {(time.perf_counter() - start) * 1000:.1f} ms, {changes}")
+        start = time.perf_counter()
+        changes = library.apply_refresh(list(reversed(subscriptions)))
+        print(f"refresh with the order reversed: {(time.perf_counter() - start) * 1000:.1f} ms, {changes}")
+        library.close()
+
+def main():
+    # python -m utils.library --bench [entries]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--bench':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+        return
+    print("Usage: python -m utils.library --bench [entries]")
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,144 @@
-__all__ = ['fetch_steam_cookies']
+__all__ = ['fetch_steam_cookies', 'forget_steam_session']
 
-import browser_cookie3 as browsercookie
-from typing import Dict
+import base64
+import glob
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
 
-def fetch_steam_cookies() -> Dict[str, str]:
+LOGIN_COOKIE = 'steamLoginSecure'
+
+# Cookie databases browser_cookie3 may read, per browser. Firefox writes
+# through a WAL, so its -wal file changes long before cookies.sqlite does.
+BROWSER_DATABASES = {
+    'firefox': [
+        '~/.mozilla/firefox/*/cookies.sqlite',
+        '~/snap/firefox/common/.mozilla/firefox/*/cookies.sqlite',
+        '~/.var/app/org.mozilla.firefox/.mozilla/firefox/*/cookies.sqlite',
+    ],
+    'chrome': [
+        '~/.config/google-chrome/*/Cookies',
+        '~/.config/google-chrome/*/Network/Cookies',
+        '~/.config/chromium/*/Cookies',
+        '~/.config/chromium/*/Network/Cookies',
+    ],
+}
+
+def database_stamp(browser: str) -> List[Tuple[str, int, int]]:
+    """(path, inode, mtime_ns) of every cookie database of browser and its WAL"""
+    stamp = []
+    for pattern in BROWSER_DATABASES[browser]:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            for candidate in (path, f"{path}-wal"):
+                try:
+                    st = os.stat(candidate)
+                except OSError:
+                    continue
+                stamp.append((candidate, st.st_ino, st.st_mtime_ns))
+    return stamp
+
+def token_expiry(value: str) -> Optional[float]:
+    """exp claim of the JWT inside steamLoginSecure ("<steamid>||<jwt>"), if readable"""
     try:
-        steam_cookies = {}
-        print("Loading cookies for domain: steamcommunity.com")
-        
-        # Try loading cookies from Firefox explicitly
+        token = value.replace('%7C', '|').split('||', 1)[1]
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except Exception:
+        return None
+
+def _read_browser() -> Dict:
+    """Read the login cookie from Firefox, then Chrome. Slow: decrypts the whole store."""
+    import browser_cookie3 as browsercookie
+
+    print("Loading cookies for domain: steamcommunity.com")
+    for browser in ('firefox', 'chrome'):
+        stamp = database_stamp(browser)  # Before reading, so a concurrent write invalidates
         try:
-            cookies = browsercookie.firefox(domain_name='steamcommunity.com')
-            print("Loaded cookies from Firefox.")
+            cookies = getattr(browsercookie, browser)(domain_name='steamcommunity.com')
         except Exception as e:
-            print(f"Failed to load cookies from Firefox: {e}")
-            cookies = None
-        
-        # If Firefox fails, try loading cookies from Chrome
-        if cookies is None:
-            try:
-                cookies = browsercookie.chrome(domain_name='steamcommunity.com')
-                print("Loaded cookies from Chrome.")
-            except Exception as e:
-                print(f"Failed to load cookies from Chrome: {e}")
-                cookies = None
-        
-        if cookies is None:
-            raise Exception("No cookies found. Ensure you are logged into Steam in your browser.")
-        
-        print("Cookies loaded successfully.")
-        
+            print(f"Failed to load cookies from {browser.title()}: {e}")
+            continue
         for cookie in cookies:
-            steam_cookies[cookie.name] = cookie.value
-        #required_cookies = ['sessionid', 'steamLoginSecure']            
-        required_cookies = ['steamLoginSecure']
-        missing_cookies = [c for c in required_cookies if c not in steam_cookies]
-        print("Found cookies:", list(steam_cookies.keys()))
-        if missing_cookies:
-            raise Exception(f"Missing required Steam cookies: {missing_cookies}. Please login to Steam in your browser first.")
-            
-        return steam_cookies
+            if cookie.name == LOGIN_COOKIE:
+                expiries = [e for e in (cookie.expires, token_expiry(cookie.value)) if e]
+                print(f"Loaded the Steam session from {browser.title()}.")
+                return {'value': cookie.value, 'expires': min(expiries) if expiries else None,
+                        'browser': browser, 'stamp': stamp}
+        print(f"No Steam session in {browser.title()}.")
+    raise Exception(f"Missing required Steam cookies: ['{LOGIN_COOKIE}']. Please login to Steam in your browser first.")
+
+def _load_cache(cache_path: Optional[str]) -> Optional[Dict]:
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r') as f:
+            session = json.load(f)
+        session['stamp'] = [tuple(s) for s in session['stamp']]
+        return session
+    except Exception as e:
+        print(f"Error loading cached Steam session: {e}")
+        return None
+
+def _save_cache(cache_path: Optional[str], session: Dict):
+    """Write the session readable by the owner only"""
+    if not cache_path:
+        return
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)  # O_CREAT's mode is ignored for an existing file
+        with os.fdopen(fd, 'w') as f:
+            json.dump(session, f)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Error saving Steam session: {e}")
+
+def _cache_valid(session: Optional[Dict]) -> bool:
+    if not session or not session.get('value'):
+        return False
+    if session.get('expires') and session['expires'] <= time.time() + 60:
+        return False  # Expired, or about to be during the refresh
+    return database_stamp(session['browser']) == session['stamp']
+
+def load_steam_session(cache_path: Optional[str] = None, force: bool = False) -> Tuple[Dict[str, str], str]:
+    """Steam cookies plus where they came from: 'cache', 'firefox' or 'chrome'.
+
+    The browser store is only read when there is no cached session, it has
+    expired, the browser's cookie database changed since it was cached, or
+    force is set (Steam rejected it).
+    """
+    session = None if force else _load_cache(cache_path)
+    if not _cache_valid(session):
+        session = _read_browser()
+        _save_cache(cache_path, session)
+        source = session['browser']
+    else:
+        source = 'cache'
+    return {LOGIN_COOKIE: session['value']}, source
+
+def fetch_steam_cookies(cache_path: Optional[str] = None, force: bool = False) -> Dict[str, str]:
+    try:
+        return load_steam_session(cache_path, force)[0]
     except Exception as e:
         raise Exception(f"Failed to fetch Steam cookies: {str(e)}")
 
+def forget_steam_session(cache_path: Optional[str]):
+    """Drop the cached session, e.g. after Steam rejected it"""
+    if cache_path:
+        try:
+            os.unlink(cache_path)
+        except FileNotFoundError:
+            pass
+
 def main():
-    cookies = fetch_steam_cookies()
-    print("Found Steam cookies:", list(cookies.keys()))
+    # python -m utils.login_fetcher [cache file] [--force]
+    import sys
+    args = [a for a in sys.argv[1:] if a != '--force']
+    start = time.perf_counter()
+    _, source = load_steam_session(args[0] if args else None, force='--force' in sys.argv)
+    print(f"Steam session from {source} in {(time.perf_counter() - start) * 1000:.1f} ms")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,323 @@
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+class PreviewDownloader:
+    """Viewport-ordered, cancellable download queue for preview images.
+
+    Requests carry the list index of their row. Whenever a worker frees
+    up it takes the pending request closest to the current viewport, so
+    rows on screen download first and rows scrolled past wait. Requests
+    further than cancel_distance rows from the viewport are dropped, and a
+    download in flight is abandoned between chunks once its row is that far
+    away. Every request ends with on_done(url, data, cancelled): data is
+    None for failed or cancelled downloads, cancelled tells the two apart.
+
+    All downloads share one keep-alive session. Concurrency adapts to the
+    observed latency: while requests come back about as fast as the best
+    recent ones, the limit grows. When latency climbs because the link or
+    the server is saturated, the limit shrinks in proportion. A download
+    that timed out or lost its connection counts as one that took the
+    whole timeout; an HTTP error, like a removed preview, says nothing
+    about the link and is not counted.
+    """
+    CHUNK_SIZE = 16384
+
+    def __init__(self, on_done: Callable[[str, Optional[bytes], bool], None],
+                 min_workers: int = 2, max_workers: int = 8,
+                 cancel_distance: int = 40, timeout: float = 5.0):
+        self.on_done = on_done
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.cancel_distance = cancel_distance
+        self.timeout = timeout
+        self.limit = float(min_workers)  # Current concurrency limit
+        self.pending: Dict[str, int] = {}  # url -> list index of the row that wants it
+        self.in_flight: Dict[str, int] = {}
+        self.viewport = (0, 0)  # First and last visible index
+        self.min_latency = None
+        self.avg_latency = None
+        self.samples = 0
+        self.stats = {'requested': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'bytes': 0}
+        self.cond = threading.Condition()
+        self.session = self._make_session()
+        self.running = True
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def _make_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def distance(self, index: int) -> int:
+        """Rows between index and the viewport, 0 when it is visible"""
+        first, last = self.viewport
+        if index < first:
+            return first - index
+        return max(0, index - last)
+
+    def request(self, url: str, index: int):
+        """Queue url for the row at index; a queued url just moves to the new index"""
+        with self.cond:
+            if url in self.in_flight:
+                self.in_flight[url] = index
+                return
+            if url not in self.pending:
+                self.stats['requested'] += 1
+            self.pending[url] = index
+            self.cond.notify()
+
+    def update(self, url: str, index: int):
+        """Move a queued or running url to a new index; unknown urls are ignored"""
+        with self.cond:
+            if url in self.in_flight:
+                self.in_flight[url] = index
+            elif url in self.pending:
+                self.pending[url] = index
+                self.cond.notify()
+
+    def set_viewport(self, first: int, last: int):
+        """Called as the view scrolls; drops queued requests that ended up far away"""
+        dropped = []
+        with self.cond:
+            self.viewport = (first, last)
+            for url, index in list(self.pending.items()):
+                if self.distance(index) > self.cancel_distance:
+                    del self.pending[url]
+                    dropped.append(url)
+            self.stats['cancelled'] += len(dropped)
+            self.cond.notify_all()
+        for url in dropped:
+            self._finish(url, None, True)
+
+    def cancel_all(self):
+        with self.cond:
+            dropped = list(self.pending)
+            self.pending.clear()
+            self.stats['cancelled'] += len(dropped)
+        for url in dropped:
+            self._finish(url, None, True)
+
+    def shutdown(self):
+        self.cancel_all()
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.session.close()
+
+    def _finish(self, url: str, data: Optional[bytes], cancelled: bool):
+        try:
+            self.on_done(url, data, cancelled)
+        except Exception as e:
+            print(f"Error in preview callback: {e}", file=sys.stderr)
+
+    def _next(self) -> Optional[str]:
+        """Block until a slot under the limit and a request are available. Caller holds the condition."""
+        while self.running:
+            if self.pending and len(self.in_flight) < int(self.limit):
+                url = min(self.pending, key=lambda u: self.distance(self.pending[u]))
+                self.in_flight[url] = self.pending.pop(url)
+                return url
+            self.cond.wait()
+        return None
+
+    def _worker(self):
+        from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+        while True:
+            with self.cond:
+                url = self._next()
+            if url is None:
+                return
+            start = time.monotonic()
+            data = None
+            cancelled = False
+            congested = False
+            try:
+                with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    chunks = []
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        chunks.append(chunk)
+                        with self.cond:
+                            if self.distance(self.in_flight[url]) > self.cancel_distance:
+                                cancelled = True
+                                break
+                    if not cancelled:
+                        data = b''.join(chunks)
+            except (Timeout, ConnectionError, ChunkedEncodingError) as e:
+                congested = True
+                print(f"Error downloading preview {url}: {e}", file=sys.stderr)
+            except Exception as e:
+                print(f"Error downloading preview {url}: {e}", file=sys.stderr)
+            latency = time.monotonic() - start
+
+            with self.cond:
+                del self.in_flight[url]
+                if cancelled:
+                    self.stats['cancelled'] += 1
+                elif data is None:
+                    self.stats['failed'] += 1
+                    if congested:
+                        # A saturated link shows up as timeouts and resets before it shows up as
+                        # slow completions, so count it as a request that took the whole timeout
+                        self._adapt(max(latency, self.timeout))
+                else:
+                    self.stats['completed'] += 1
+                    self.stats['bytes'] += len(data)
+                    self._adapt(latency)
+                self.cond.notify_all()
+            self._finish(url, data, cancelled)
+
+    def _adapt(self, latency: float):
+        """Gradient concurrency limit from latency samples. Caller holds the condition."""
+        self.samples += 1
+        if self.min_latency is None or latency < self.min_latency or self.samples % 100 == 0:
+            self.min_latency = latency  # Re-probe the floor now and then, networks change
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+        # 1.0 while latency sits at its floor, smaller as requests start queueing up somewhere
+        gradient = max(0.5, min(1.0, self.min_latency / self.avg_latency))
+        headroom = 1.0 if self.pending else 0.0
+        self.limit = max(self.min_workers, min(self.max_workers, self.limit * gradient + headroom))
+
+def serve_previews(image_dir: str, latency: float = 0.05, congestion: float = 0.0):
+    """Serve the files in image_dir on localhost, each after latency seconds.
+
+    congestion adds that many seconds per request already being served,
+    like a saturated link. Returns the server; server.connections counts
+    TCP connections opened, to check keep-alive.
+    """
+    import os
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {'active': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            super().setup()
+            with lock:
+                self.server.connections += 1
+
+        def do_GET(self):
+            path = os.path.join(image_dir, os.path.basename(self.path.split('?')[0]))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            with lock:
+                state['active'] += 1
+                delay = latency + congestion * (state['active'] - 1)
+            time.sleep(delay)
+            with lock:
+                state['active'] -= 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark(image_dir: str, latency: float = 0.05, congestion: float = 0.01, count: int = 300):
+    """Compare the old FIFO download path with the scheduler against a local stand-in.
+
+    Simulates a list of count previews: the first screen is requested in
+    order, then the view jumps to the middle of the list. Reports when the
+    rows visible after the jump had their previews, and how many
+    connections each approach opened.
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+
+    files = sorted(f for f in os.listdir(image_dir) if os.path.isfile(os.path.join(image_dir, f)))
+    if not files:
+        print(f"No files in {image_dir}")
+        return
+    visible = 6
+    jump_to = count // 2
+
+    def urls(server):
+        base = f"http://127.0.0.1:{server.server_address[1]}/"
+        return [f"{base}{files[i % len(files)]}?n={i}" for i in range(count)]
+
+    # Old path: every row scrolled through queued in list order, bare requests.get
+    server = serve_previews(image_dir, latency, congestion)
+    all_urls = urls(server)
+    done = {}
+    start = time.monotonic()
+
+    def fetch(url):
+        try:
+            requests.get(url, timeout=10).content
+        finally:
+            done[url] = time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Scrolling down to the middle binds every row on the way
+        for url in all_urls[:jump_to + visible]:
+            executor.submit(fetch, url)
+    target = all_urls[jump_to:jump_to + visible]
+    fifo_visible = max(done[u] for u in target)
+    fifo_connections = server.connections
+    server.shutdown()
+
+    # Scheduler: same rows requested, viewport updates as the view moves
+    server = serve_previews(image_dir, latency, congestion)
+    all_urls = urls(server)
+    done = {}
+    finished = threading.Event()
+    target = set(all_urls[jump_to:jump_to + visible])
+
+    def on_done(url, data, cancelled):
+        done[url] = (time.monotonic() - start, data is not None)
+        if target.issubset(done):
+            finished.set()
+
+    downloader = PreviewDownloader(on_done)
+    start = time.monotonic()
+    downloader.set_viewport(0, visible - 1)
+    for step in range(0, jump_to + 1, visible):
+        downloader.set_viewport(step, step + visible - 1)
+        for index in range(step, min(step + visible, count)):
+            downloader.request(all_urls[index], index)
+    finished.wait(60)
+    sched_visible = max(done[u][0] for u in target)
+    downloader.shutdown()
+    sched_connections = server.connections
+    server.shutdown()
+
+    print(f"{'':>10} {'visible after jump':>19} {'connections':>12}")
+    print(f"{'fifo':>10} {fifo_visible:>18.2f}s {fifo_connections:>12}")
+    print(f"{'scheduled':>10} {sched_visible:>18.2f}s {sched_connections:>12}")
+    print(f"scheduler: {downloader.stats}, final limit {downloader.limit:.1f}, "
+          f"latency avg {downloader.avg_latency or 0:.3f}s / floor {downloader.min_latency or 0:.3f}s")
+
+def main():
+    # python -m utils.preview_downloader --bench <dir with sample previews> [latency] [congestion]
+    if len(sys.argv) >= 3 and sys.argv[1] == '--bench':
+        latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+        congestion = float(sys.argv[4]) if len(sys.argv) > 4 else 0.01
+        benchmark(sys.argv[2], latency, congestion)
+        return
+    print("Usage: python -m utils.preview_downloader --bench <dir with sample previews> [latency] [congestion]")
+
+if __name__ == "__main__":
+    main()
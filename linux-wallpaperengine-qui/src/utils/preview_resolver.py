@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+from .thumbnail_cache import ThumbnailCache
+from .thumbnail_decode import ThumbnailDecoder
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Where a preview came from, in the order they are tried. Cancelled previews
+# belong to rows scrolled past before their download finished.
+SOURCES = ('memory', 'cache', 'local', 'network', 'failed', 'cancelled')
+
+class PreviewResolver:
+    """Finds a preview thumbnail on this machine before anything is downloaded.
+
+    resolve() tries the thumbnail cache, then the preview file the installed
+    workshop item ships with. A thumbnail decoded from the local file is
+    put in the cache under the preview url, so the next start is a cache
+    hit. None means the caller has to download. Every lookup is counted
+    per source; the GUI reports its own memory hits, downloads,
+    failures and cancellations through record(). Runs on worker threads.
+    """
+
+    def __init__(self, thumbnail_cache: ThumbnailCache, decoder: ThumbnailDecoder):
+        self.thumbnail_cache = thumbnail_cache
+        self.decoder = decoder
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(SOURCES, 0)
+        self.local_seconds = 0.0
+
+    def record(self, source: str):
+        with self.lock:
+            self.counts[source] += 1
+
+    def resolve(self, url: str, local_path: Optional[str] = None) -> Optional['Image.Image']:
+        img = self.thumbnail_cache.get(url)
+        if img is not None:
+            self.record('cache')
+            return img
+        if local_path:
+            start = time.perf_counter()
+            try:
+                img = self.decoder.decode_file(local_path)
+            except Exception as e:
+                print(f"Error decoding {local_path}: {e}", file=sys.stderr)
+            else:
+                elapsed = time.perf_counter() - start
+                self.thumbnail_cache.put(url, img)
+                with self.lock:
+                    self.counts['local'] += 1
+                    self.local_seconds += elapsed
+                return img
+        return None
+
+    def stats(self) -> Dict:
+        """Counts and hit rates per source, plus the average local decode time"""
+        with self.lock:
+            counts = dict(self.counts)
+            local_ms = self.local_seconds * 1000 / counts['local'] if counts['local'] else 0.0
+        total = sum(counts.values())
+        return {'total': total, 'counts': counts, 'local_ms': local_ms,
+                'rates': {s: counts[s] / total if total else 0.0 for s in SOURCES}}
+
+    def summary(self) -> str:
+        stats = self.stats()
+        parts = [f"{s} {stats['counts'][s]} ({stats['rates'][s]:.0%})" for s in SOURCES]
+        return f"Previews: {stats['total']} lookups, " + ', '.join(parts)
+
+def benchmark(count: int = 500):
+    """Resolve the previews of a fixture workshop twice, cold and with a warm cache.
+
+    The preview urls point at an address that cannot answer, so any
+    fallback to the network shows up as a miss.
+    """
+    import shutil
+    import tempfile
+    from PIL import Image
+    from .workshop_scanner import WorkshopScanner, make_fixture
+
+    tmp = tempfile.mkdtemp()
+    try:
+        content_dir = os.path.join(tmp, 'content')
+        make_fixture(content_dir, count)
+        # Real Steam previews are a few hundred KB of JPEG
+        sample = Image.linear_gradient('L').resize((1024, 1024)).convert('RGB')
+        for name in os.listdir(content_dir):
+            os.remove(os.path.join(content_dir, name, 'preview.gif'))
+            sample.save(os.path.join(content_dir, name, 'preview.jpg'), quality=90)
+        scanner = WorkshopScanner([content_dir])
+        scanner.refresh()
+        previews = {f"http://192.0.2.1/ugc/{w.id}/preview.jpg": w.preview_path for w in scanner.wallpapers()}
+
+        decoder = ThumbnailDecoder()
+        resolver = PreviewResolver(ThumbnailCache(os.path.join(tmp, 'thumbnails')), decoder)
+        for label in ('cold cache', 'warm cache'):
+            start = time.perf_counter()
+            misses = sum(resolver.resolve(url, path) is None for url, path in previews.items())
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {len(previews)} previews in {elapsed * 1000:.0f} ms "
+                  f"({elapsed * 1000 / len(previews):.2f} ms each), {misses} would hit the network")
+        print(resolver.summary())
+        print(f"local decode: {resolver.stats()['local_ms']:.2f} ms per preview")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    # python -m utils.preview_resolver --bench [previews]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--bench':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+        return
+    print("Usage: python -m utils.preview_resolver --bench [previews]")
+
+if __name__ == "__main__":
+    main()
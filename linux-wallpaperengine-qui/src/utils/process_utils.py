@@ -1,14 +1,24 @@
 import subprocess
-import psutil
 import threading
-from queue import Queue
 import time
 import os
 import signal
 import sys
+from typing import NamedTuple, Optional
+from .supervisor import ProcessSupervisor
+from .command_scheduler import CommandScheduler
+from .governor import Governor
+from .telemetry import TelemetrySampler
+from .health import HealthMonitor
+from .engine_registry import EngineRegistry, ACTIVE, STANDBY, STARTING
+from .workshop import warm_assets
 
 def kill_wallpaper_processes():
-    """Kill all running instances of linux-wallpaperengine and linux-wallpaper"""
+    """Kill all running instances of linux-wallpaperengine and linux-wallpaper.
+
+    Matches by command line, so it can hit processes we did not start. Only
+    a manual last resort; WallpaperManager tracks its own engines.
+    """
     try:
         # Kill all instances of linux-wallpaperengine
         subprocess.run(
@@ -29,30 +39,48 @@ def kill_wallpaper_processes():
     except Exception as e:
         print(f"Error killing wallpaper processes: {e}", file=sys.stderr)
 
-def preexec_function():
-    """Safely configure the child process"""
-    try:
-        # Create new process group
-        os.setpgrp()
-        # Ignore signals that might be sent to parent
-        signal.signal(signal.SIGINT, signal.SIG_IGN)
-    except Exception as e:
-        print(f"Error in preexec_fn: {e}", file=sys.stderr)
-        # Don't raise, as this would crash the child process
-        pass
+PREFETCH_OFF = 'off'  # Cold start on every switch
+PREFETCH_WARM = 'warm'  # Preload the next wallpaper's files into the page cache
+PREFETCH_STANDBY = 'standby'  # Also spawn its engine early and keep it stopped
+
+class LaunchResult(NamedTuple):
+    display: str
+    ok: bool
+    pid: Optional[int]
+    stop_time: float  # Seconds spent retiring the previous engine
+    ready_time: float  # Seconds from spawn until ready, or until it died
+    error: str = ''
 
 class WallpaperManager:
-    def __init__(self):
-        # Kill any existing processes first
-        kill_wallpaper_processes()
-        self.processes = {}
-        self.command_queue = Queue()
+    READY_WINDOW = 0.5  # An engine that survives this long after spawn counts as started
+    DEBOUNCE_WINDOW = 0.15  # Quiet period before a queued change is carried out
+
+    def __init__(self, state_dir=None):
+        self.supervisor = ProcessSupervisor()
+        self.supervisor.add_exit_callback(self._on_engine_exit)
+        self.processes = {}  # display name -> EngineProcess
         self.running = True
-        self.worker_thread = threading.Thread(target=self._process_commands, daemon=True)
-        self.worker_thread.start()
-        self._cleanup_old_processes()
-        self.lock = threading.Lock()  # Add thread lock
+        self.lock = threading.Lock()  # Guards the process tables, never held across waits
+        self.display_locks = {}  # display name -> Lock serializing switches on that display
+        # Bursts of clicks collapse into one switch per display
+        self.scheduler = CommandScheduler(self._change_wallpaper, self.current_wallpaper,
+                                          debounce=self.DEBOUNCE_WINDOW)
         self.silent_mode = True  # Add silent mode flag
+        self.prefetch_mode = PREFETCH_OFF
+        self.max_standby_per_display = 1
+        self.standby = {}  # display name -> [EngineProcess], stopped, oldest first
+        self.governor = Governor(self.active_processes)
+        self.paused = False  # Engines frozen by pause()
+        self.governor_held = False  # Governor stopped by pause(), restarted by resume()
+        self.start_counts = {}  # display name -> engines started on it
+        self.telemetry = TelemetrySampler(self.active_processes, self.restart_count, self.spawn_count)
+        self.health = HealthMonitor(
+            self._restart_display,
+            log_path=os.path.join(state_dir, ".engine_failures.log") if state_dir else None,
+            quarantine_path=os.path.join(state_dir, ".quarantine.json") if state_dir else None
+        )
+        self.registry = EngineRegistry(os.path.join(state_dir, ".engines.json") if state_dir else None)
+        self._adopt_engines()
         
     def toggle_silent_mode(self):
         """Toggle silent mode flag"""
@@ -60,88 +88,287 @@ class WallpaperManager:
         print(f"Silent mode {'enabled' if self.silent_mode else 'disabled'}")
         return self.silent_mode 
     
-    def _cleanup_old_processes(self):
-        """Clean up any leftover processes from previous runs"""
-        kill_wallpaper_processes()
+    def _adopt_engines(self):
+        """Take over the engines a previous session left running.
 
-    def _process_commands(self):
-        while self.running:
-            try:
-                cmd = self.command_queue.get(timeout=1)
-                if cmd is None:
-                    break
-                display_name, wallpaper_id = cmd
-                self._change_wallpaper(display_name, wallpaper_id)
-            except Exception:
+        Active engines that are still the processes we recorded keep showing
+        their wallpaper untouched. Standbys, half-started engines and
+        duplicates for a display are ours but unwanted, so they are stopped.
+        Entries whose process is gone (or whose pid now belongs to something
+        else) are simply dropped.
+        """
+        stale = []
+        for entry in self.registry.take_all():
+            proc = self.supervisor.adopt(entry['pid'], entry['display'], entry['wallpaper_id'],
+                                         entry['start_ticks'], entry.get('command'))
+            if proc is None:
                 continue
+            if entry.get('role') == ACTIVE and entry['display'] not in self.processes:
+                # It may have been frozen by the governor when the last session ended
+                self.supervisor.send_signal(proc, signal.SIGCONT)
+                self.processes[proc.display] = proc
+                self.registry.record(proc, ACTIVE)
+                print(f"Adopted engine {proc.pid} on {proc.display} showing {proc.wallpaper_id}")
+            else:
+                stale.append(proc)
+        if stale:
+            print(f"Stopping {len(stale)} leftover engine(s) from the previous session")
+            self.supervisor.terminate_many(stale)
 
-    def _change_wallpaper(self, display_name, wallpaper_id):
+    def current_wallpaper(self, display_name):
+        """Wallpaper id shown on display_name, or None"""
+        with self.lock:
+            proc = self.processes.get(display_name)
+        return proc.wallpaper_id if proc and proc.is_running() else None
+
+    def active_processes(self):
+        """Engines currently showing a wallpaper, standbys excluded"""
+        with self.lock:
+            return list(self.processes.values())
+
+    def enable_governor(self, policy=None):
+        """Start pausing/throttling the engines under load, see governor.GovernorPolicy"""
+        if policy is not None:
+            self.governor.policy = policy
+        if self.paused:
+            self.governor_held = True  # Starts with resume()
+        else:
+            self.governor.start()
+
+    def disable_governor(self):
+        self.governor_held = False
+        if not self.paused:  # While paused the governor is only held, and the engines stay frozen
+            self.governor.stop()
+
+    def governor_enabled(self):
+        return self.governor.running or self.governor_held
+
+    def pause(self):
+        """Freeze every active engine until resume(); the governor is held meanwhile.
+
+        Engines that become active while paused (set, next, crash restarts)
+        are frozen as soon as they are up, see _change_wallpaper().
+        """
+        if self.paused:
+            return
+        if self.governor.running:
+            self.governor_held = True
+            self.governor.stop()  # Otherwise it would resume them
+        with self.lock:
+            # Flipped under the lock so a switch finishing meanwhile sees it
+            self.paused = True
+            procs = list(self.processes.values())
+        for proc in procs:
+            self.supervisor.send_signal(proc, signal.SIGSTOP)
+
+    def resume(self):
+        if not self.paused:
+            return
+        with self.lock:
+            self.paused = False
+            procs = list(self.processes.values())
+        for proc in procs:
+            self.supervisor.send_signal(proc, signal.SIGCONT)
+        if self.governor_held:
+            self.governor_held = False
+            self.governor.start()
+
+    def _on_engine_exit(self, proc):
+        """Supervisor callback: spot engines that died without being told to"""
+        self.registry.forget(proc)
+        if proc.expected_exit:
+            return
+        with self.lock:
+            was_active = self.processes.get(proc.display) is proc
+            if was_active:
+                del self.processes[proc.display]
+            for pool in self.standby.values():
+                if proc in pool:
+                    pool.remove(proc)
+        self.health.record_crash(proc, was_active)
+
+    def _restart_display(self, display_name, wallpaper_id):
+        """Backoff timer callback: the LaunchResult of the restart, or None if the
+        display got a new engine meanwhile"""
+        if self.running and self.current_wallpaper(display_name) is None:
+            return self._change_wallpaper(display_name, wallpaper_id)
+        return None
+
+    def restart_count(self, display_name):
+        """Crash restarts on display_name; wallpaper changes do not count"""
+        return self.health.restart_count(display_name)
+
+    def spawn_count(self, display_name):
+        """Engines that became active on display_name, for any reason"""
         with self.lock:
+            return self.start_counts.get(display_name, 0)
+
+    def enable_telemetry(self, interval=None, json_path=None, prometheus_path=None):
+        """Start sampling engine resource usage, optionally exporting it to files"""
+        if interval is not None:
+            self.telemetry.interval = interval
+        self.telemetry.json_path = json_path
+        self.telemetry.prometheus_path = prometheus_path
+        self.telemetry.start()
+
+    def set_debounce_window(self, seconds):
+        self.scheduler.debounce = max(0.0, seconds)
+
+    def _display_lock(self, display_name):
+        with self.lock:
+            return self.display_locks.setdefault(display_name, threading.Lock())
+
+    def _change_wallpaper(self, display_name, wallpaper_id):
+        """Switch one display and wait until the new engine is up; returns a LaunchResult"""
+        with self._display_lock(display_name):
+            stop_time = 0.0
             try:
-                # Kill previous process for this display
-                if display_name in self.processes:
-                    try:
-                        pgid = os.getpgid(self.processes[display_name])
-                        os.killpg(pgid, signal.SIGTERM)
-                        time.sleep(0.1)  # Give process time to terminate
-                    except ProcessLookupError:
-                        pass  # Process already terminated
-                    except Exception as e:
-                        print(f"Error killing previous process: {e}", file=sys.stderr)
-
-                # Start new process
-                process = self.run_wallpaper_engine(wallpaper_id, display_name)
-                if process and process.poll() is None:  # Check if process started successfully
-                    self.processes[display_name] = process.pid
-                    
+                with self.lock:
+                    old = self.processes.pop(display_name, None)
+                    proc = None
+                    if self.prefetch_mode != PREFETCH_OFF:
+                        proc = self._take_standby(display_name, wallpaper_id)
+
+                if self.prefetch_mode != PREFETCH_OFF:
+                    # Make before break: the old image stays up until the new engine is ready
+                    if proc is None:
+                        proc = self.run_wallpaper_engine(wallpaper_id, display_name)
+                    ready = proc is not None and self.supervisor.wait_ready([proc], self.READY_WINDOW)
+                    start = time.monotonic()
+                    if old and ready:
+                        self.supervisor.terminate(old)
+                    elif old:
+                        # Keep showing the old wallpaper rather than a blank display
+                        with self.lock:
+                            self.processes.setdefault(display_name, old)
+                    stop_time = time.monotonic() - start
+                else:
+                    # Stop the previous engine for this display; returns as soon as it has exited
+                    start = time.monotonic()
+                    if old:
+                        self.supervisor.terminate(old)
+                    stop_time = time.monotonic() - start
+                    proc = self.run_wallpaper_engine(wallpaper_id, display_name)
+                    ready = proc is not None and self.supervisor.wait_ready([proc], self.READY_WINDOW)
+
+                if proc is None:
+                    return LaunchResult(display_name, False, None, stop_time, 0.0, 'failed to spawn')
+                if ready:
+                    with self.lock:
+                        self.processes[display_name] = proc
+                        self.start_counts[display_name] = self.start_counts.get(display_name, 0) + 1
+                        if self.paused:
+                            # Shown once, then frozen like the rest until resume()
+                            self.supervisor.send_signal(proc, signal.SIGSTOP)
+                    self.registry.set_role(proc, ACTIVE)
+                    self._log_switch(old, proc)
+                timings = proc.timings()
+                ready_time = timings.get('ready', timings.get('exited', 0.0))
+                error = '' if ready else f"exited with status {proc.returncode} after {ready_time:.2f}s"
+                return LaunchResult(display_name, ready, proc.pid, stop_time, ready_time, error)
             except Exception as e:
                 print(f"Error in _change_wallpaper: {e}", file=sys.stderr)
+                return LaunchResult(display_name, False, None, stop_time, 0.0, str(e))
+
+    def set_prefetch_mode(self, mode, max_standby_per_display=None):
+        """Select PREFETCH_OFF, PREFETCH_WARM or PREFETCH_STANDBY"""
+        self.prefetch_mode = mode
+        if max_standby_per_display is not None:
+            self.max_standby_per_display = max(1, max_standby_per_display)
+        if mode != PREFETCH_STANDBY:
+            self.clear_standby()
+
+    def prepare_next(self, display_name, wallpaper_id):
+        """Get a wallpaper ready ahead of the change that will show it"""
+        if self.prefetch_mode == PREFETCH_OFF:
+            return
+        threading.Thread(target=warm_assets, args=(str(wallpaper_id),), daemon=True).start()
+        if self.prefetch_mode != PREFETCH_STANDBY:
+            return
+
+        retired = []
+        with self.lock:
+            pool = self.standby.setdefault(display_name, [])
+            pool[:] = [p for p in pool if p.is_running()]
+            if any(p.wallpaper_id == str(wallpaper_id) for p in pool):
+                return
+            while len(pool) >= self.max_standby_per_display:
+                retired.append(pool.pop(0))
+            proc = self.run_wallpaper_engine(wallpaper_id, display_name)
+            if proc:
+                # Freeze it right after exec; it is resumed when its turn comes
+                self.supervisor.send_signal(proc, signal.SIGSTOP)
+                proc.mark('standby')
+                self.registry.set_role(proc, STANDBY)
+                pool.append(proc)
+        self.supervisor.terminate_many(retired)
+
+    def _take_standby(self, display_name, wallpaper_id):
+        """Resume and return a standby engine for this change, if one is waiting"""
+        pool = self.standby.get(display_name, [])
+        for proc in pool:
+            if proc.wallpaper_id == str(wallpaper_id) and proc.is_running():
+                pool.remove(proc)
+                self.supervisor.send_signal(proc, signal.SIGCONT)
+                proc.mark('resumed')
+                self.registry.set_role(proc, STARTING)
+                return proc
+        return None
+
+    def clear_standby(self, display_name=None):
+        """Retire standby engines for one display, or all of them"""
+        with self.lock:
+            displays = [display_name] if display_name else list(self.standby)
+            retired = [p for d in displays for p in self.standby.pop(d, [])]
+        self.supervisor.terminate_many(retired)
+
+    def _log_switch(self, old, new):
+        """Print how long the previous engine took to go away"""
+        if old and 'exited' in old.timings():
+            stop = old.timings()
+            print(f"Display {new.display}: previous engine exited "
+                  f"{(stop['exited'] - stop.get('sigterm', 0)) * 1000:.0f}ms after SIGTERM"
+                  f"{' (needed SIGKILL)' if 'sigkill' in stop else ''}")
 
     def change_wallpaper(self, display_name, wallpaper_id):
-        """Queue a wallpaper change request"""
-        self.command_queue.put((display_name, wallpaper_id))
+        """Queue a wallpaper change request; newer requests for the display replace it"""
+        self.health.cancel_restart(display_name)
+        self.scheduler.submit(display_name, wallpaper_id)
 
     def change_wallpaper_all_displays(self, wallpaper_id, displays):
-        """Change wallpaper on multiple displays"""
-        with self.lock:
-            # First kill all existing wallpaper processes
-            for display in displays:
-                if display in self.processes:
-                    try:
-                        pgid = os.getpgid(self.processes[display])
-                        os.killpg(pgid, signal.SIGTERM)
-                    except Exception as e:
-                        print(f"Error killing process for display {display}: {e}")
-
-            # Small delay to ensure all processes are terminated
-            time.sleep(0.2)
-
-            # Start new processes for each display
-            for display in displays:
-                process = self.run_wallpaper_engine(wallpaper_id, display)
-                if process and process.poll() is None:
-                    self.processes[display] = process.pid
-                time.sleep(0.1)  # Small delay between starts
+        """Change wallpaper on multiple displays at once, returns {display: LaunchResult}"""
+        results = {}
+        for display in displays:
+            self.scheduler.cancel(display)  # This request supersedes anything queued
+            self.health.cancel_restart(display)
+
+        def switch(display):
+            results[display] = self._change_wallpaper(display, wallpaper_id)
+
+        # Every display kills and spawns in parallel, so monitors change together
+        threads = [threading.Thread(target=switch, args=(d,), daemon=True) for d in displays]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for result in results.values():
+            if not result.ok:
+                print(f"Failed to start wallpaper {wallpaper_id} on {result.display}: {result.error}",
+                      file=sys.stderr)
+        return results
 
     def kill_all(self):
         """Kill all wallpaper processes"""
         self.running = False
-        self.command_queue.put(None)  # Signal worker to stop
-        
-        # Kill process groups
-        for pgid in self.processes.values():
-            try:
-                os.killpg(pgid, signal.SIGTERM)
-                time.sleep(0.1)  # Give processes time to terminate gracefully
-                try:
-                    os.killpg(pgid, signal.SIGKILL)  # Force kill if still running
-                except ProcessLookupError:
-                    pass  # Process already terminated
-            except Exception as e:
-                print(f"Error killing process {pgid}: {e}")
+        self.scheduler.stop()
+        self.governor.stop()
+        self.telemetry.stop()
+        self.health.shutdown()
         
-        # Additional cleanup
-        kill_wallpaper_processes()
+        # SIGTERM every engine, escalating to SIGKILL only for ones that hang.
+        # Each exit also drops the engine from the registry.
+        self.supervisor.shutdown()
         
         self.processes.clear()
 
@@ -158,14 +385,15 @@ class WallpaperManager:
             ])
             print(f"Executing command: {' '.join(command)}")
             
-            process = subprocess.Popen(
+            proc = self.supervisor.spawn(
                 command,
+                str(display_name),
+                str(wallpaper_id),
                 stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                preexec_fn=preexec_function,
-                start_new_session=True
+                stderr=subprocess.DEVNULL
             )
-            return process
+            self.registry.record(proc, STARTING)
+            return proc
         except Exception as e:
             print(f"Error running wallpaper engine: {e}", file=sys.stderr)
             return None
@@ -1,46 +1,313 @@
 import requests
-from bs4 import BeautifulSoup
-from typing import Dict, List, NamedTuple
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional
+import hashlib
+import math
 import re
+from urllib.parse import urlparse
+from .html_extract import extract_subscriptions
+
+WORKSHOP_APPID = 431960
+PER_PAGE = 30  # Largest page size the workshop listing accepts
+MAX_WORKERS = 4
+
+TOTAL_RE = re.compile(r'of\s+([\d,]+)\s+entries')
+PAGE_LINK_RE = re.compile(r'[?&]p=(\d+)')
+
+class SteamAuthError(Exception):
+    """Steam did not accept the session cookie"""
 
 class WallpaperInfo(NamedTuple):
     id: str
     preview_url: str
-#ef fetch_wallpaper_ids(steam_url: str, cookies: Dict[str, str]) -> List[WallpaperInfo]:
-def fetch_wallpaper_ids(steam_url: str, cookies: str) -> List[WallpaperInfo]:
-    all_wallpapers = []
-    page = 1
+
+def create_session(pool_size: int = MAX_WORKERS) -> requests.Session:
+    """Session with a keep-alive pool large enough for the page workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def page_url(steam_url: str, page: int, per_page: int = PER_PAGE) -> str:
     base_url = steam_url.split('?')[0]
-    
-    while True:
-        current_url = f"{base_url}?appid=431960&browsefilter=mysubscriptions&p={page}"
-        response = requests.get(current_url, cookies=cookies)
+    return f"{base_url}?appid={WORKSHOP_APPID}&browsefilter=mysubscriptions&p={page}&numperpage={per_page}"
+
+def parse_wallpapers(html: bytes) -> List[WallpaperInfo]:
+    """Extract the subscribed wallpapers listed on one workshop page"""
+    return [WallpaperInfo(id=wallpaper_id, preview_url=preview_url)
+            for wallpaper_id, preview_url in extract_subscriptions(html)]
+
+def parse_total_count(html: bytes) -> Optional[int]:
+    """Total subscription count from the "Showing 1-30 of N entries" banner"""
+    match = TOTAL_RE.search(html.decode('utf-8', errors='replace'))
+    return int(match.group(1).replace(',', '')) if match else None
+
+def parse_page_count(html: bytes, per_page: int = PER_PAGE) -> Optional[int]:
+    """Number of pages in the listing, from the entry count or the paging links"""
+    total = parse_total_count(html)
+    if total is not None:
+        return max(1, math.ceil(total / per_page))
+    pages = [int(p) for p in PAGE_LINK_RE.findall(html.decode('utf-8', errors='replace'))]
+    return max(pages) if pages else None
+
+def check_auth(response: requests.Response):
+    """Raise SteamAuthError if Steam refused the session or bounced us to its login page"""
+    if response.status_code in (401, 403) or '/login' in urlparse(response.url).path:
+        raise SteamAuthError(f"Steam rejected the session (HTTP {response.status_code}, {response.url})")
+
+def fetch_page(session: requests.Session, url: str, cookies: Dict[str, str]) -> bytes:
+    response = session.get(url, cookies=cookies, timeout=15)
+    check_auth(response)
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch wallpapers: HTTP {response.status_code}")
+    return response.content
+
+def _iter_remaining_pages(session: requests.Session, steam_url: str, cookies: Dict[str, str],
+                          first_page: bytes, first_wallpapers: List[WallpaperInfo],
+                          max_workers: int, per_page: int) -> Iterator[List[WallpaperInfo]]:
+    """Yield the parsed wallpapers of pages 2..N in page order"""
+    # Trust the size of the page we got over the one we asked for
+    page_count = parse_page_count(first_page, len(first_wallpapers) or per_page)
+    if page_count is None:
+        # No paging info, fall back to walking until an empty page
+        page = 2
+        while True:
+            wallpapers = parse_wallpapers(fetch_page(session, page_url(steam_url, page, per_page), cookies))
+            if not wallpapers:
+                break
+            yield wallpapers
+            page += 1
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(fetch_page, session, page_url(steam_url, page, per_page), cookies)
+            for page in range(2, page_count + 1)
+        ]
+        try:
+            # Wait in page order so output order is stable regardless of arrival order
+            for future in futures:
+                yield parse_wallpapers(future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+
+def iter_wallpapers(steam_url: str, cookies: Dict[str, str],
+                    max_workers: int = MAX_WORKERS,
+                    per_page: int = PER_PAGE,
+                    session: Optional[requests.Session] = None) -> Iterator[WallpaperInfo]:
+    """Yield subscribed wallpapers in listing order as their pages arrive.
+
+    Page 1 is fetched first to learn the page count; the remaining pages are
+    fetched concurrently with at most max_workers requests in flight.
+    """
+    own_session = session is None
+    if own_session:
+        session = create_session(max_workers)
+    try:
+        first_page = fetch_page(session, page_url(steam_url, 1, per_page), cookies)
+        first_wallpapers = parse_wallpapers(first_page)
+        yield from first_wallpapers
+        for wallpapers in _iter_remaining_pages(session, steam_url, cookies, first_page,
+                                                first_wallpapers, max_workers, per_page):
+            yield from wallpapers
+    finally:
+        if own_session:
+            session.close()
+
+class RefreshResult(NamedTuple):
+    wallpapers: List[WallpaperInfo]
+    added: List[WallpaperInfo]
+    removed: List[WallpaperInfo]
+    updated: List[WallpaperInfo]  # Same id, new preview_url
+    state: Dict
+    requests: int
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+def page_hash(wallpapers: List[WallpaperInfo]) -> str:
+    """Hash of a page's extracted content; the raw HTML carries per-request noise"""
+    digest = hashlib.sha1()
+    for w in wallpapers:
+        digest.update(f"{w.id}\t{w.preview_url}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def diff_wallpapers(cached: List[WallpaperInfo], current: List[WallpaperInfo], state: Dict,
+                    requests_made: int) -> RefreshResult:
+    cached_by_id = {w.id: w for w in cached}
+    current_ids = {w.id for w in current}
+    added = [w for w in current if w.id not in cached_by_id]
+    removed = [w for w in cached if w.id not in current_ids]
+    updated = [w for w in current
+               if w.id in cached_by_id and cached_by_id[w.id].preview_url != w.preview_url]
+    return RefreshResult(current, added, removed, updated, state, requests_made)
+
+def refresh_wallpapers(steam_url: str, cookies: Dict[str, str],
+                       cached: List[WallpaperInfo], state: Optional[Dict] = None,
+                       max_workers: int = MAX_WORKERS,
+                       per_page: int = PER_PAGE,
+                       session: Optional[requests.Session] = None) -> RefreshResult:
+    """Refresh the cached subscription list, fetching as few pages as possible.
+
+    Page 1 is always probed (conditionally, if the server gave validators last
+    time). If it and the reported total match the saved state nothing else is
+    requested. If the only change is new subscriptions prepended to page 1,
+    they are merged onto the cached list without fetching further pages.
+    Anything else falls back to a full concurrent fetch. state is the dict
+    returned in the previous RefreshResult.
+    """
+    state = state or {}
+    own_session = session is None
+    if own_session:
+        session = create_session(max_workers)
+    try:
+        headers = {}
+        if cached and state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if cached and state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        response = session.get(page_url(steam_url, 1, per_page), cookies=cookies,
+                               headers=headers, timeout=15)
+        if response.status_code == 304:
+            return RefreshResult(cached, [], [], [], state, 1)
+        check_auth(response)
         if response.status_code != 200:
             raise Exception(f"Failed to fetch wallpapers: HTTP {response.status_code}")
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        subscriptions = soup.find_all('div', class_='workshopItemSubscription')
-        if not subscriptions:
-            break
-            
-        for sub in subscriptions:
-            sub_id = sub.get('id', '')
-            if sub_id.startswith('Subscription'):
-                wallpaper_id = sub_id.replace('Subscription', '')
-                if wallpaper_id.isdigit():
-                    preview_img = sub.find('img', class_='backgroundImg')
-                    preview_url = preview_img.get('src') if preview_img else ''
-                    all_wallpapers.append(WallpaperInfo(id=wallpaper_id, preview_url=preview_url))
-        page += 1
+        first_page = response.content
+        first_wallpapers = parse_wallpapers(first_page)
+        total = parse_total_count(first_page)
+        first_hash = page_hash(first_wallpapers)
+        new_state = {
+            'total': total,
+            'first_page_hash': first_hash,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+        if cached and total is not None and total == state.get('total') \
+                and first_hash == state.get('first_page_hash'):
+            return RefreshResult(cached, [], [], [], new_state, 1)
+
+        # New subscriptions show up at the top of the listing; if page 1 is
+        # just new items followed by the head of the cache, merge them in place.
+        cached_ids = {w.id for w in cached}
+        new_count = next((i for i, w in enumerate(first_wallpapers) if w.id in cached_ids),
+                         len(first_wallpapers))
+        if cached and total is not None and 0 < new_count < len(first_wallpapers) \
+                and total == len(cached) + new_count \
+                and first_wallpapers[new_count:] == cached[:len(first_wallpapers) - new_count]:
+            return diff_wallpapers(cached, first_wallpapers[:new_count] + cached, new_state, 1)
+
+        current = list(first_wallpapers)
+        requests_made = 1
+        for wallpapers in _iter_remaining_pages(session, steam_url, cookies, first_page,
+                                                first_wallpapers, max_workers, per_page):
+            current.extend(wallpapers)
+            requests_made += 1
+        return diff_wallpapers(cached, current, new_state, requests_made)
+    finally:
+        if own_session:
+            session.close()
+
+#ef fetch_wallpaper_ids(steam_url: str, cookies: Dict[str, str]) -> List[WallpaperInfo]:
+def fetch_wallpaper_ids(steam_url: str, cookies: str) -> List[WallpaperInfo]:
+    all_wallpapers = list(iter_wallpapers(steam_url, cookies))
 
     if not all_wallpapers:
         raise Exception("No wallpapers found. Make sure you're logged in and have subscribed wallpapers.")
 
     return all_wallpapers
 
+def serve_recorded_pages(page_dir: str, latency: float = 0.0):
+    """Serve page<N>.html files from page_dir on localhost as a stand-in for the workshop.
+
+    Returns the running server; its base URL is http://127.0.0.1:<port>/.
+    """
+    import os
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            page = parse_qs(urlparse(self.path).query).get('p', ['1'])[0]
+            path = os.path.join(page_dir, f"page{page}.html")
+            body = b'<html><body></body></html>'
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark(page_dir: str, latency: float = 0.05, workers: int = MAX_WORKERS):
+    """Compare serial and concurrent fetching against recorded pages"""
+    import time
+    server = serve_recorded_pages(page_dir, latency)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    try:
+        results = {}
+        for label, max_workers in (('serial', 1), ('concurrent', workers)):
+            start = time.perf_counter()
+            wallpapers = list(iter_wallpapers(url, {}, max_workers=max_workers))
+            elapsed = time.perf_counter() - start
+            results[label] = (wallpapers, elapsed)
+            print(f"{label:>10}: {len(wallpapers)} wallpapers in {elapsed:.3f}s")
+        if results['serial'][0] != results['concurrent'][0]:
+            print("WARNING: serial and concurrent results differ")
+        print(f"speedup: {results['serial'][1] / results['concurrent'][1]:.2f}x")
+    finally:
+        server.shutdown()
+
+def record_pages(steam_url: str, cookies: Dict[str, str], out_dir: str, per_page: int = PER_PAGE):
+    """Save every subscription page as out_dir/page<N>.html for benchmarks"""
+    import os
+    os.makedirs(out_dir, exist_ok=True)
+    with create_session() as session:
+        page = 1
+        page_count = None
+        while page_count is None or page <= page_count:
+            html = fetch_page(session, page_url(steam_url, page, per_page), cookies)
+            if page_count is None:
+                page_count = parse_page_count(html, len(parse_wallpapers(html)) or per_page) or 1
+            with open(os.path.join(out_dir, f"page{page}.html"), 'wb') as f:
+                f.write(html)
+            page += 1
+    print(f"Saved {page - 1} pages to {out_dir}")
+
 def main():
     """Remove hardcoded example"""
+    import sys
+    if len(sys.argv) >= 3 and sys.argv[1] == '--bench':
+        # python -m utils.steam_fetcher --bench <dir with page1.html, page2.html, ...> [latency]
+        latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+        benchmark(sys.argv[2], latency)
+        return
+    if len(sys.argv) >= 4 and sys.argv[1] == '--record':
+        # python -m utils.steam_fetcher --record <dir> <steam username>
+        from .login_fetcher import fetch_steam_cookies
+        steam_url = f"https://steamcommunity.com/id/{sys.argv[3]}/myworkshopfiles/"
+        record_pages(steam_url, fetch_steam_cookies(), sys.argv[2])
+        return
     print("Please run through the GUI application")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,251 @@
+import os
+import select
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+class ProcStat(NamedTuple):
+    state: str  # R, S, T, Z, ...
+    pgid: int
+    start_ticks: int  # Start time in clock ticks since boot, unique per pid incarnation
+
+def read_proc_stat(pid: int) -> Optional[ProcStat]:
+    """State, process group and start time of pid from /proc, None if there is no such process"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, fields are counted after its closing paren
+    fields = stat[stat.rfind(b')') + 2:].split()
+    return ProcStat(fields[0].decode(), int(fields[2]), int(fields[19]))
+
+class EngineProcess:
+    """A wallpaper engine plus the timestamps of its lifecycle transitions.
+
+    Usually our own child; an engine adopted from an earlier session has no
+    Popen and is identified by pid plus start time instead.
+    """
+
+    def __init__(self, popen: Optional[subprocess.Popen], display: str, wallpaper_id: str,
+                 pid: Optional[int] = None, started: Optional[float] = None,
+                 command: Optional[List[str]] = None):
+        self.popen = popen
+        self.pid = popen.pid if popen else pid
+        self.pgid = self.pid  # start_new_session makes the child its own group leader
+        self.display = display
+        self.wallpaper_id = wallpaper_id
+        self.command = command or []
+        stat = read_proc_stat(self.pid)
+        self.start_ticks = stat.start_ticks if stat else None
+        self.started = time.monotonic() if started is None else started
+        self.transitions = [('spawned' if popen else 'adopted', self.started)]
+        self.exited = threading.Event()
+        self.returncode = None
+        self.pidfd = None
+        self.expected_exit = False  # Set once we asked it to stop
+
+    def poll(self) -> bool:
+        """Reap without blocking; True once the process has exited"""
+        if self.popen is not None:
+            # Popen.poll() reaps with WNOHANG, so this never blocks
+            return self.popen.poll() is not None
+        # Not our child: its exit status goes to its new parent, so only check it is gone.
+        # A zombie or a different start time (pid reused) both mean our engine exited.
+        stat = read_proc_stat(self.pid)
+        return stat is None or stat.state == 'Z' or stat.start_ticks != self.start_ticks
+
+    def mark(self, state: str):
+        self.transitions.append((state, time.monotonic()))
+
+    def is_running(self) -> bool:
+        return not self.exited.is_set()
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds from spawn to each recorded transition"""
+        return {state: at - self.started for state, at in self.transitions}
+
+    def __repr__(self):
+        return f"EngineProcess(pid={self.pid}, display={self.display!r}, wallpaper={self.wallpaper_id!r})"
+
+class ProcessSupervisor:
+    """Owns the engine child processes and reaps them as soon as they exit.
+
+    A watcher thread blocks on the children's pidfds (or polls with
+    WNOHANG where pidfds are unavailable), so exits are observed within
+    milliseconds and no zombies are left behind.
+    """
+    POLL_INTERVAL = 0.05  # Fallback polling period without pidfd support
+    TERM_TIMEOUT = 2.0  # Grace period between SIGTERM and SIGKILL
+    KILL_TIMEOUT = 1.0
+
+    def __init__(self, history_size: int = 100):
+        self.lock = threading.Lock()
+        self.procs: Dict[int, EngineProcess] = {}
+        self.history = deque(maxlen=history_size)  # Exited processes, newest last
+        self.exit_callbacks: List[Callable[[EngineProcess], None]] = []
+        self.use_pidfd = hasattr(os, 'pidfd_open')
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        self.running = True
+        self.watcher_thread = threading.Thread(target=self._watch, daemon=True)
+        self.watcher_thread.start()
+
+    def add_exit_callback(self, callback: Callable[[EngineProcess], None]):
+        """Register callback(proc), called from the watcher thread on every exit"""
+        self.exit_callbacks.append(callback)
+
+    def spawn(self, command: List[str], display: str, wallpaper_id: str, **popen_kwargs) -> EngineProcess:
+        popen = subprocess.Popen(command, start_new_session=True, **popen_kwargs)
+        proc = EngineProcess(popen, display, wallpaper_id, command=list(command))
+        self._register(proc)
+        return proc
+
+    def adopt(self, pid: int, display: str, wallpaper_id: str, start_ticks: int,
+              command: Optional[List[str]] = None) -> Optional[EngineProcess]:
+        """Take over an engine spawned by an earlier session.
+
+        The process must still be the one recorded: same start time (so not
+        a reused pid) and still its own process group leader. The command
+        line is not compared, as wrapper scripts may exec into the engine.
+        Returns None otherwise.
+        """
+        stat = read_proc_stat(pid)
+        if stat is None or stat.state == 'Z' or stat.start_ticks != start_ticks or stat.pgid != pid:
+            return None
+        # Translate the start time from boot-relative ticks to our monotonic clock
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / CLOCK_TICKS
+        proc = EngineProcess(None, display, wallpaper_id, pid=pid,
+                             started=time.monotonic() - max(0.0, age), command=command)
+        if proc.start_ticks != start_ticks:
+            return None  # Exited in the meantime
+        self._register(proc)
+        return proc
+
+    def _register(self, proc: EngineProcess):
+        if self.use_pidfd:
+            try:
+                proc.pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                proc.pidfd = None  # Kernel without pidfd support, polled instead
+        with self.lock:
+            self.procs[proc.pid] = proc
+        self._wake()
+
+    def running_processes(self) -> List[EngineProcess]:
+        with self.lock:
+            return list(self.procs.values())
+
+    def _wake(self):
+        try:
+            os.write(self.wake_w, b'x')
+        except OSError:
+            pass
+
+    def _watch(self):
+        poller = select.poll()
+        poller.register(self.wake_r, select.POLLIN)
+        registered = set()
+        while self.running:
+            procs = self.running_processes()
+            for proc in procs:
+                if proc.pidfd is not None and proc.pidfd not in registered:
+                    poller.register(proc.pidfd, select.POLLIN)
+                    registered.add(proc.pidfd)
+            needs_polling = any(proc.pidfd is None for proc in procs)
+            timeout = self.POLL_INTERVAL * 1000 if needs_polling else None
+            try:
+                poller.poll(timeout)
+                os.read(self.wake_r, 4096)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError as e:
+                print(f"Error in process watcher: {e}", file=sys.stderr)
+
+            for proc in self.running_processes():
+                if proc.poll():
+                    if proc.pidfd in registered:
+                        poller.unregister(proc.pidfd)
+                        registered.discard(proc.pidfd)
+                    self._handle_exit(proc)
+
+    def _handle_exit(self, proc: EngineProcess):
+        proc.returncode = proc.popen.returncode if proc.popen else None  # Unknown for adopted engines
+        proc.mark('exited')
+        if proc.pidfd is not None:
+            os.close(proc.pidfd)
+            proc.pidfd = None
+        with self.lock:
+            self.procs.pop(proc.pid, None)
+            self.history.append(proc)
+        proc.exited.set()
+        for callback in self.exit_callbacks:
+            try:
+                callback(proc)
+            except Exception as e:
+                print(f"Error in exit callback: {e}", file=sys.stderr)
+
+    def wait_ready(self, procs: List[EngineProcess], window: float) -> bool:
+        """Wait until every process has survived window seconds since spawn.
+
+        Returns False as soon as any of them exits; all are waited on together.
+        """
+        for proc in procs:
+            # A resumed standby is measured from its resume, not its spawn
+            since = max(at for state, at in proc.transitions if state in ('spawned', 'resumed'))
+            remaining = since + window - time.monotonic()
+            if proc.exited.wait(max(0.0, remaining)):
+                return False
+        for proc in procs:
+            proc.mark('ready')
+        return True
+
+    @staticmethod
+    def send_signal(proc: EngineProcess, sig: int):
+        """Signal the whole process group of proc"""
+        try:
+            os.killpg(proc.pgid, sig)
+        except ProcessLookupError:
+            pass  # Already gone
+
+    def terminate(self, proc: EngineProcess, grace: Optional[float] = None) -> bool:
+        """Stop one process; see terminate_many"""
+        return self.terminate_many([proc], grace)
+
+    def terminate_many(self, procs: List[EngineProcess], grace: Optional[float] = None) -> bool:
+        """SIGTERM the process groups, escalate to SIGKILL after grace seconds.
+
+        Returns as soon as every process has been reaped, and True if they all were.
+        """
+        grace = self.TERM_TIMEOUT if grace is None else grace
+        procs = [p for p in procs if p.is_running()]
+        for proc in procs:
+            proc.expected_exit = True
+            self.send_signal(proc, signal.SIGTERM)
+            self.send_signal(proc, signal.SIGCONT)  # A stopped standby only acts on SIGTERM once resumed
+            proc.mark('sigterm')
+
+        deadline = time.monotonic() + grace
+        for proc in procs:
+            proc.exited.wait(max(0.0, deadline - time.monotonic()))
+
+        stubborn = [p for p in procs if p.is_running()]
+        for proc in stubborn:
+            self.send_signal(proc, signal.SIGKILL)
+            proc.mark('sigkill')
+        deadline = time.monotonic() + self.KILL_TIMEOUT
+        for proc in stubborn:
+            proc.exited.wait(max(0.0, deadline - time.monotonic()))
+        return all(not p.is_running() for p in procs)
+
+    def shutdown(self):
+        """Terminate every child and stop the watcher"""
+        self.terminate_many(self.running_processes())
+        self.running = False
+        self._wake()
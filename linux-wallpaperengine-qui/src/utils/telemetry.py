@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+class EngineStats(NamedTuple):
+    timestamp: float  # time.time() of the sample
+    display: str
+    wallpaper_id: str
+    pid: int
+    cpu_percent: float  # Whole process group, 100 = one core
+    rss_bytes: int
+    pss_bytes: int
+    threads: int
+    uptime: float
+    restarts: int  # Crash restarts on the display
+    spawns: int  # Engines started on the display, wallpaper changes included
+
+def read_proc_stats(pgids) -> Dict[int, Dict[str, int]]:
+    """Sum CPU ticks, RSS and thread counts per process group in a single /proc scan"""
+    totals = {pgid: {'ticks': 0, 'rss': 0, 'threads': 0, 'pids': []} for pgid in pgids}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue  # Exited during the scan
+        # The command name may contain spaces, fields are counted after its closing paren
+        fields = stat[stat.rfind(b')') + 2:].split()
+        pgid = int(fields[2])
+        if pgid not in totals:
+            continue
+        group = totals[pgid]
+        group['ticks'] += int(fields[11]) + int(fields[12])  # utime + stime
+        group['threads'] += int(fields[17])
+        group['rss'] += int(fields[21]) * PAGE_SIZE
+        group['pids'].append(int(entry))
+    return totals
+
+def read_pss(pid: int) -> int:
+    """Proportional set size from smaps_rollup, 0 where unavailable"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class TelemetrySampler:
+    """Background sampler of per-display engine resource usage.
+
+    Keeps a ring buffer of EngineStats per display and, when paths are set,
+    rewrites a JSON snapshot and a Prometheus textfile-collector file after
+    every sample.
+    """
+
+    def __init__(self, get_processes: Callable[[], List],
+                 get_restarts: Callable[[str], int] = lambda display: 0,
+                 get_spawns: Callable[[str], int] = lambda display: 0,
+                 interval: float = 5.0, history: int = 120,
+                 json_path: Optional[str] = None,
+                 prometheus_path: Optional[str] = None):
+        self.get_processes = get_processes  # Active EngineProcess objects
+        self.get_restarts = get_restarts
+        self.get_spawns = get_spawns
+        self.interval = interval
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path  # e.g. /var/lib/node_exporter/textfile/wallpaper.prom
+        self.history: Dict[str, deque] = {}
+        self.history_size = history
+        self.last_ticks = {}  # pid -> (ticks, monotonic time)
+        self.lock = threading.Lock()
+        self.running = False
+        self.wake = threading.Event()
+        self.thread = None
+
+    def sample(self) -> List[EngineStats]:
+        """Take one sample of every engine and record it"""
+        procs = self.get_processes()
+        now = time.monotonic()
+        totals = read_proc_stats([p.pgid for p in procs])
+        stats = []
+        for proc in procs:
+            group = totals.get(proc.pgid)
+            if not group or not group['pids']:
+                continue
+            prev = self.last_ticks.get(proc.pid)
+            cpu = 0.0
+            if prev and now > prev[1]:
+                cpu = (group['ticks'] - prev[0]) / CLOCK_TICKS / (now - prev[1]) * 100
+            self.last_ticks[proc.pid] = (group['ticks'], now)
+            stats.append(EngineStats(
+                timestamp=time.time(),
+                display=proc.display,
+                wallpaper_id=proc.wallpaper_id,
+                pid=proc.pid,
+                cpu_percent=max(0.0, cpu),
+                rss_bytes=group['rss'],
+                pss_bytes=sum(read_pss(pid) for pid in group['pids']),
+                threads=group['threads'],
+                uptime=now - proc.started,
+                restarts=self.get_restarts(proc.display),
+                spawns=self.get_spawns(proc.display),
+            ))
+        live = {p.pid for p in procs}
+        self.last_ticks = {pid: v for pid, v in self.last_ticks.items() if pid in live}
+
+        with self.lock:
+            for s in stats:
+                self.history.setdefault(s.display, deque(maxlen=self.history_size)).append(s)
+        self._export(stats)
+        return stats
+
+    def latest(self) -> Dict[str, EngineStats]:
+        with self.lock:
+            return {display: h[-1] for display, h in self.history.items() if h}
+
+    def snapshot(self) -> Dict:
+        """JSON-friendly view: latest sample plus history per display"""
+        with self.lock:
+            return {display: {'latest': h[-1]._asdict() if h else None,
+                              'history': [s._asdict() for s in h]}
+                    for display, h in self.history.items()}
+
+    @staticmethod
+    def _write_atomic(path: str, text: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _export(self, stats: List[EngineStats]):
+        try:
+            if self.json_path:
+                self._write_atomic(self.json_path, json.dumps(self.snapshot()))
+            if self.prometheus_path:
+                self._write_atomic(self.prometheus_path, self.prometheus_text(stats))
+        except OSError as e:
+            print(f"Error writing engine telemetry: {e}", file=sys.stderr)
+
+    @staticmethod
+    def prometheus_text(stats: List[EngineStats]) -> str:
+        metrics = [
+            ('wallpaper_engine_cpu_percent', 'gauge', 'CPU usage of the engine process group', 'cpu_percent'),
+            ('wallpaper_engine_rss_bytes', 'gauge', 'Resident set size of the process group', 'rss_bytes'),
+            ('wallpaper_engine_pss_bytes', 'gauge', 'Proportional set size of the process group', 'pss_bytes'),
+            ('wallpaper_engine_threads', 'gauge', 'Threads in the process group', 'threads'),
+            ('wallpaper_engine_uptime_seconds', 'gauge', 'Seconds since the engine was spawned', 'uptime'),
+            ('wallpaper_engine_restarts_total', 'counter', 'Engines restarted after a crash on this display',
+             'restarts'),
+            ('wallpaper_engine_spawns_total', 'counter', 'Engines started on this display, wallpaper changes included',
+             'spawns'),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for s in stats:
+                labels = f'display="{s.display}",wallpaper="{s.wallpaper_id}"'
+                lines.append(f"{name}{{{labels}}} {getattr(s, field)}")
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wake.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    def _run(self):
+        while self.running:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Telemetry sample failed: {e}", file=sys.stderr)
+            self.wake.wait(self.interval)
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from PIL import Image  # Imported on first use, PIL is slow to load
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_TRAILER = b'IEND\xaeB`\x82'
+
+class ThumbnailCache:
+    """Content-addressed on-disk cache of resized preview thumbnails.
+
+    Entries are PNG files named after the sha256 of the preview URL. The
+    file mtime doubles as the LRU stamp so the eviction order survives
+    restarts, and total size is kept under ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> size in bytes, oldest first
+        self.total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from the files already on disk"""
+        found = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.png'):
+                        # Leftover temp file from an interrupted write
+                        if entry.name.startswith('.tmp'):
+                            self._remove_file(entry.path)
+                        continue
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        except OSError as e:
+            print(f"Error scanning thumbnail cache: {e}", file=sys.stderr)
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        with self.lock:
+            self._evict()
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def is_valid(data: bytes) -> bool:
+        """Cheap integrity check: PNG signature at the start and IEND at the end"""
+        return data.startswith(PNG_SIGNATURE) and data.endswith(PNG_TRAILER)
+
+    def __contains__(self, url: str) -> bool:
+        with self.lock:
+            return self.key_for(url) in self.entries
+
+    def get(self, url: str) -> Optional['Image.Image']:
+        """Return the cached thumbnail for url, or None on a miss"""
+        key = self.key_for(url)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+
+        from PIL import Image
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if not self.is_valid(data):
+                raise ValueError("truncated or corrupt thumbnail")
+            img = Image.open(BytesIO(data))
+            img.load()
+            os.utime(path)  # Persist the LRU position
+            return img
+        except Exception as e:
+            print(f"Dropping thumbnail cache entry {key}: {e}", file=sys.stderr)
+            self._discard(key)
+            return None
+
+    def put(self, url: str, img: 'Image.Image'):
+        """Store a thumbnail; the write is atomic so readers never see partial files"""
+        key = self.key_for(url)
+        buf = BytesIO()
+        img.save(buf, format='PNG')
+        data = buf.getvalue()
+
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing thumbnail cache: {e}", file=sys.stderr)
+            if tmp_path:
+                self._remove_file(tmp_path)
+            return
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _discard(self, key: str):
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+        self._remove_file(self._path(key))
+
+    def _evict(self):
+        """Drop least recently used entries until under budget. Caller holds the lock."""
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self._remove_file(self._path(key))
+
+    def clear(self):
+        with self.lock:
+            for key in self.entries:
+                self._remove_file(self._path(key))
+            self.entries.clear()
+            self.total_bytes = 0
@@ -0,0 +1,195 @@
+import mmap
+import sys
+from io import BytesIO
+from typing import Tuple
+
+THUMBNAIL_SIZE = (100, 100)
+
+def decode_thumbnail(data, size: Tuple[int, int] = THUMBNAIL_SIZE):
+    """Decode image bytes (or a binary file object) straight to a size thumbnail, doing as little work as possible.
+
+    JPEGs are decoded at a reduced DCT scale (draft mode) and other formats
+    are pre-shrunk with reduce() by a power of two, both stopping at twice
+    the target so the final LANCZOS pass keeps its quality. Animated GIFs
+    only have their first frame decoded.
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+    target_w, target_h = size
+    if img.format == 'JPEG':
+        # Picks the smallest 1/1, 1/2, 1/4 or 1/8 scale still at least this large
+        img.draft('RGB', (target_w * 2, target_h * 2))
+    # load() decodes the current frame only; is_animated/n_frames would scan them all
+    img.load()
+
+    if img.mode not in ('RGB', 'RGBA'):
+        has_alpha = img.mode in ('LA', 'PA', 'RGBa') or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    factor = min(img.width // (target_w * 2), img.height // (target_h * 2))
+    if factor >= 2:
+        img = img.reduce(1 << (factor.bit_length() - 1))  # Largest power of two <= factor
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+def decode_thumbnail_file(path: str, size: Tuple[int, int] = THUMBNAIL_SIZE):
+    """decode_thumbnail() of a file on disk, read through a memory map instead of into a bytes copy"""
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file; let PIL report it
+            return decode_thumbnail(f, size)
+        with mapped:
+            return decode_thumbnail(mapped, size)
+
+def decode_thumbnail_full(data: bytes, size: Tuple[int, int] = THUMBNAIL_SIZE):
+    """The old path: full decode at original resolution, then LANCZOS. Kept for the benchmark."""
+    from PIL import Image
+    img = Image.open(BytesIO(data))
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+class ThumbnailDecoder:
+    """Decode stage for preview thumbnails.
+
+    By default decode() runs in the calling thread. With processes > 0 the
+    work goes to a process pool instead, so decodes run on several cores
+    rather than contending for the GIL. Workers are started with
+    forkserver, never forked from the threaded GUI process.
+    """
+
+    def __init__(self, processes: int = 0, size: Tuple[int, int] = THUMBNAIL_SIZE):
+        self.size = size
+        self.processes = processes
+        self.pool = None
+        if processes > 0:
+            # Imported here, multiprocessing is a noticeable part of startup otherwise
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(max_workers=processes,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+
+    def decode(self, data: bytes):
+        if self.pool is not None:
+            from concurrent.futures.process import BrokenProcessPool
+            try:
+                return self.pool.submit(decode_thumbnail, data, self.size).result()
+            except BrokenProcessPool as e:
+                print(f"Decode pool failed ({e}), decoding in-process", file=sys.stderr)
+                self.pool = None
+        return decode_thumbnail(data, self.size)
+
+    def decode_file(self, path: str):
+        """Like decode() for an image file; pool workers get the path, not the bytes"""
+        if self.pool is not None:
+            from concurrent.futures.process import BrokenProcessPool
+            try:
+                return self.pool.submit(decode_thumbnail_file, path, self.size).result()
+            except BrokenProcessPool as e:
+                print(f"Decode pool failed ({e}), decoding in-process", file=sys.stderr)
+                self.pool = None
+        return decode_thumbnail_file(path, self.size)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+def _peak_rss_kb() -> int:
+    """Peak RSS of this process plus the largest of its reaped children"""
+    import resource
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def _workers_peak_rss_kb(pool) -> int:
+    """Summed peak RSS of the live workers of a process pool.
+
+    The workers are children of the forkserver, not of this process, and
+    shutdown(wait=False) does not reap them, so RUSAGE_CHILDREN never
+    includes them. Read before shutdown.
+    """
+    total = 0
+    for pid in list(getattr(pool, '_processes', None) or {}):
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total
+
+def _run_mode(mode: str, sample_dir: str, rounds: int, workers: int):
+    """Decode every sample in this process with one pipeline and print a result line"""
+    import json
+    import os
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    samples = []
+    for name in sorted(os.listdir(sample_dir)):
+        with open(os.path.join(sample_dir, name), 'rb') as f:
+            samples.append(f.read())
+
+    decoder = None
+    if mode == 'full':
+        decode = decode_thumbnail_full
+    else:
+        decoder = ThumbnailDecoder(processes=workers if mode == 'processes' else 0)
+        decode = decoder.decode
+
+    # Same shape as the GUI: a 4-thread executor feeding the decode stage
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(decode, samples[:workers]))  # Warm up the pool
+        start = time.perf_counter()
+        for _ in range(rounds):
+            thumbnails = list(executor.map(decode, samples))
+        elapsed = time.perf_counter() - start
+    workers_kb = 0
+    if decoder:
+        if decoder.pool is not None:
+            workers_kb = _workers_peak_rss_kb(decoder.pool)
+        decoder.shutdown()
+    sizes = {t.size for t in thumbnails}
+    print(json.dumps({'mode': mode, 'count': len(samples) * rounds, 'seconds': elapsed,
+                      'peak_rss_kb': _peak_rss_kb() + workers_kb, 'workers_rss_kb': workers_kb,
+                      'sizes': sorted(sizes)}))
+
+def benchmark(sample_dir: str, rounds: int = 3, workers: int = 0):
+    """Compare the full-decode path with the fast pipeline, threaded and with processes.
+
+    Each pipeline runs in a fresh interpreter so peak RSS is measured separately.
+    """
+    import json
+    import os
+    import subprocess
+
+    workers = workers or os.cpu_count() or 2
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Peak RSS includes the pool workers, summed; shared pages count once per worker
+    print(f"{'pipeline':>10} {'thumbs/s':>9} {'peak RSS':>9} {'of which workers':>17}")
+    for mode in ('full', 'threads', 'processes'):
+        out = subprocess.run([sys.executable, '-m', 'utils.thumbnail_decode', '--run-mode', mode,
+                              sample_dir, str(rounds), str(workers)],
+                             cwd=src_dir, capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{mode:>10}: failed\n{out.stderr}")
+            continue
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:>10} {result['count'] / result['seconds']:>9.1f} "
+              f"{result['peak_rss_kb'] / 1024:>6.0f} MB {result['workers_rss_kb'] / 1024:>14.0f} MB")
+
+def main():
+    # python -m utils.thumbnail_decode --bench <dir of sample previews> [rounds] [processes]
+    if len(sys.argv) >= 3 and sys.argv[1] == '--bench':
+        rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        benchmark(sys.argv[2], rounds, workers)
+        return
+    if len(sys.argv) >= 6 and sys.argv[1] == '--run-mode':
+        _run_mode(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+        return
+    print("Usage: python -m utils.thumbnail_decode --bench <dir of sample previews> [rounds] [processes]")
+
+if __name__ == "__main__":
+    main()
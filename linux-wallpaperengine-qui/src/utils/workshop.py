@@ -0,0 +1,51 @@
+import os
+import sys
+from typing import List, Optional
+
+WORKSHOP_APPID = '431960'
+
+# Where Steam keeps workshop downloads, native install first, then Flatpak
+STEAM_ROOTS = [
+    '~/.steam/steam',
+    '~/.local/share/Steam',
+    '~/.var/app/com.valvesoftware.Steam/.local/share/Steam',
+]
+
+def workshop_content_dirs() -> List[str]:
+    """Existing steamapps/workshop/content/431960 directories"""
+    dirs = []
+    for root in STEAM_ROOTS:
+        path = os.path.join(os.path.expanduser(root), 'steamapps', 'workshop', 'content', WORKSHOP_APPID)
+        if os.path.isdir(path) and os.path.realpath(path) not in [os.path.realpath(d) for d in dirs]:
+            dirs.append(path)
+    return dirs
+
+def find_wallpaper_dir(wallpaper_id: str) -> Optional[str]:
+    for content_dir in workshop_content_dirs():
+        path = os.path.join(content_dir, str(wallpaper_id))
+        if os.path.isdir(path):
+            return path
+    return None
+
+def warm_assets(wallpaper_id: str) -> int:
+    """Ask the kernel to read a wallpaper's files into the page cache ahead of use.
+
+    Uses POSIX_FADV_WILLNEED so the readahead happens asynchronously and this
+    returns quickly. Returns the number of bytes hinted.
+    """
+    path = find_wallpaper_dir(wallpaper_id)
+    if not path or not hasattr(os, 'posix_fadvise'):
+        return 0
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                fd = os.open(os.path.join(dirpath, name), os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    total += os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                print(f"Error warming {name}: {e}", file=sys.stderr)
+    return total
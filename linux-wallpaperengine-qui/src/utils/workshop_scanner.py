@@ -0,0 +1,455 @@
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from .workshop import workshop_content_dirs
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+CONTENT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+ITEM_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+
+PREVIEW_NAMES = ('preview.jpg', 'preview.gif', 'preview.png', 'preview.jpeg', 'preview.webp')
+
+class LocalWallpaper(NamedTuple):
+    id: str
+    title: str
+    type: str  # scene, video, web, ... lower case
+    tags: Tuple[str, ...]
+    preview_path: str  # Absolute path of the preview image, '' if there is none
+    path: str  # The item's workshop directory
+    size: int  # Bytes on disk
+    stamp: Tuple[int, int]  # (directory mtime_ns, project.json mtime_ns) it was parsed at
+
+    @property
+    def preview_url(self) -> str:
+        """Where the GUI loads the preview from when Steam did not list the item"""
+        return 'file://' + self.preview_path if self.preview_path else ''
+
+def item_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Cheap change detector for one item: mtimes of its directory and its project.json"""
+    try:
+        return os.stat(path).st_mtime_ns, os.stat(os.path.join(path, 'project.json')).st_mtime_ns
+    except OSError:
+        return None
+
+def tree_size(path: str) -> int:
+    size = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        size += tree_size(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return size
+
+def parse_item(path: str) -> Optional[LocalWallpaper]:
+    """Read one workshop item directory; None while it has no readable project.json"""
+    stamp = item_stamp(path)
+    if stamp is None:
+        return None
+    try:
+        with open(os.path.join(path, 'project.json'), 'rb') as f:
+            project = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Skipping {path}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(project, dict):
+        return None
+    preview = ''
+    names = ([project['preview']] if isinstance(project.get('preview'), str) else []) + list(PREVIEW_NAMES)
+    for name in names:
+        candidate = os.path.join(path, name)
+        if os.path.isfile(candidate):
+            preview = candidate
+            break
+    tags = project.get('tags') or []
+    return LocalWallpaper(
+        id=os.path.basename(path),
+        title=str(project.get('title') or ''),
+        type=str(project.get('type') or '').lower(),
+        tags=tuple(str(t) for t in tags) if isinstance(tags, list) else (),
+        preview_path=preview,
+        path=path,
+        size=tree_size(path),
+        stamp=stamp,
+    )
+
+def list_items(content_dirs: List[str]) -> Dict[str, str]:
+    """id -> directory of every item; the first content dir wins for duplicates"""
+    items = {}
+    for content_dir in content_dirs:
+        try:
+            with os.scandir(content_dir) as entries:
+                for entry in entries:
+                    if entry.name.isdigit() and entry.name not in items and entry.is_dir():
+                        items[entry.name] = entry.path
+        except OSError as e:
+            print(f"Error listing {content_dir}: {e}", file=sys.stderr)
+    return items
+
+class WorkshopScanner:
+    """The wallpapers installed in the local workshop folders, kept up to date.
+
+    refresh() stats every item and parses only the project.json files that
+    changed since the last scan, in parallel. The result is saved to
+    index_path, so a warm start costs one stat per item. start() follows
+    changes with inotify, re-parsing just the items that were touched, and
+    falls back to periodic refresh() where inotify is unavailable.
+    Listeners get (changed items, removed ids) on the watcher thread.
+    """
+    DEBOUNCE = 0.5  # Steam writes an item as a burst of files
+    POLL_INTERVAL = 30.0
+
+    def __init__(self, content_dirs: Optional[List[str]] = None, index_path: Optional[str] = None,
+                 workers: int = 8):
+        self.content_dirs = content_dirs
+        self.index_path = index_path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.items: Dict[str, LocalWallpaper] = self._load_index()
+        self.listeners: List[Callable[[List[LocalWallpaper], List[str]], None]] = []
+        self.stats = {'parsed': 0, 'reused': 0, 'events': 0}
+        self.running = False
+        self.thread = None
+        self.wake_r, self.wake_w = None, None
+
+    def dirs(self) -> List[str]:
+        return self.content_dirs if self.content_dirs is not None else workshop_content_dirs()
+
+    def add_listener(self, callback: Callable[[List[LocalWallpaper], List[str]], None]):
+        self.listeners.append(callback)
+
+    def wallpapers(self) -> List[LocalWallpaper]:
+        """Installed items, newest install first like the subscription listing"""
+        with self.lock:
+            return sorted(self.items.values(), key=lambda w: w.stamp[0], reverse=True)
+
+    def _load_index(self) -> Dict[str, LocalWallpaper]:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                return {entry['id']: LocalWallpaper(**dict(entry, tags=tuple(entry['tags']),
+                                                           stamp=tuple(entry['stamp'])))
+                        for entry in json.load(f)}
+        except Exception as e:
+            print(f"Error loading workshop index: {e}", file=sys.stderr)
+            return {}
+
+    def _save_index(self):
+        """Write the index atomically. Caller holds the lock."""
+        if not self.index_path:
+            return
+        try:
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"  # The GUI and the daemon both scan
+            with open(tmp_path, 'w') as f:
+                json.dump([w._asdict() for w in self.items.values()], f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Error saving workshop index: {e}", file=sys.stderr)
+
+    def _update(self, paths: Dict[str, Optional[str]], full: bool) -> Tuple[List[LocalWallpaper], List[str]]:
+        """Re-check the given id -> directory (None if gone); with full, ids not given are gone too"""
+        with self.lock:
+            known = dict(self.items)
+        removed = [i for i in known if (full and i not in paths) or (i in paths and paths[i] is None)]
+        todo = []
+        for wallpaper_id, path in paths.items():
+            if path is None:
+                continue
+            old = known.get(wallpaper_id)
+            if old is not None and old.path == path and item_stamp(path) == old.stamp:
+                self.stats['reused'] += 1
+                continue
+            todo.append(path)
+        if len(todo) > 1 and self.workers > 1:
+            # A batch per thread: per-item futures cost more than a cached parse
+            workers = min(self.workers, len(todo))
+            batches = [todo[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda batch: [parse_item(path) for path in batch], batches))
+            todo = [path for batch in batches for path in batch]
+            parsed = [item for batch in results for item in batch]
+        else:
+            parsed = [parse_item(path) for path in todo]
+        self.stats['parsed'] += len(todo)
+        changed = []
+        for path, item in zip(todo, parsed):
+            if item is None:
+                if os.path.basename(path) in known:
+                    removed.append(os.path.basename(path))  # project.json went away or is broken
+            elif known.get(item.id) != item:
+                changed.append(item)
+        if changed or removed:
+            with self.lock:
+                for item in changed:
+                    self.items[item.id] = item
+                for wallpaper_id in removed:
+                    self.items.pop(wallpaper_id, None)
+                self._save_index()
+        return changed, removed
+
+    def _notify(self, changed: List[LocalWallpaper], removed: List[str]):
+        if not (changed or removed):
+            return
+        for callback in self.listeners:
+            try:
+                callback(changed, removed)
+            except Exception as e:
+                print(f"Error in workshop listener: {e}", file=sys.stderr)
+
+    def refresh(self) -> Tuple[List[LocalWallpaper], List[str]]:
+        """Bring the items up to date with the disk; returns (changed, removed)"""
+        changed, removed = self._update(list_items(self.dirs()), full=True)
+        self._notify(changed, removed)
+        return changed, removed
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.wake_r, self.wake_w = os.pipe()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        os.write(self.wake_w, b'x')
+
+    def _run(self):
+        try:
+            self._watch()
+        except Exception as e:
+            if self.running:
+                print(f"inotify unavailable ({e}), rescanning the workshop every "
+                      f"{self.POLL_INTERVAL:.0f}s instead", file=sys.stderr)
+        while self.running:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error scanning the workshop: {e}", file=sys.stderr)
+            select.select([self.wake_r], [], [], self.POLL_INTERVAL)
+
+    def _watch(self):
+        """Follow changes through inotify until stop()"""
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        watches: Dict[int, Tuple[str, Optional[str]]] = {}  # wd -> (path, item id or None for a content dir)
+
+        def add_watch(path, mask, wallpaper_id):
+            wd = libc.inotify_add_watch(fd, os.fsencode(path), mask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if wallpaper_id is None:
+                    raise OSError(err, f"cannot watch {path}")
+                print(f"Cannot watch {path}: {os.strerror(err)}", file=sys.stderr)
+                return
+            watches[wd] = (path, wallpaper_id)
+
+        try:
+            content_dirs = self.dirs()
+            for content_dir in content_dirs:
+                add_watch(content_dir, CONTENT_MASK, None)
+            # Catch up with whatever happened while nobody was watching
+            self.refresh()
+            for wallpaper_id, path in list_items(content_dirs).items():
+                add_watch(path, ITEM_MASK, wallpaper_id)
+
+            dirty: Dict[str, float] = {}  # id -> time of its last event
+            rescan = False
+            while self.running:
+                timeout = None
+                if dirty or rescan:
+                    timeout = max(0.0, min(dirty.values(), default=time.monotonic()) + self.DEBOUNCE
+                                  - time.monotonic())
+                readable, _, _ = select.select([fd, self.wake_r], [], [], timeout)
+                if fd in readable:
+                    for wd, mask, name in self._read_events(fd):
+                        self.stats['events'] += 1
+                        if mask & IN_Q_OVERFLOW:
+                            rescan = True
+                            continue
+                        if wd not in watches:
+                            continue
+                        path, wallpaper_id = watches[wd]
+                        if mask & IN_IGNORED:
+                            del watches[wd]
+                            continue
+                        if wallpaper_id is None:
+                            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                                rescan = True
+                            elif name.isdigit():
+                                dirty[name] = time.monotonic()
+                                if mask & (IN_CREATE | IN_MOVED_TO):
+                                    add_watch(os.path.join(path, name), ITEM_MASK, name)
+                        else:
+                            dirty[wallpaper_id] = time.monotonic()
+
+                now = time.monotonic()
+                if rescan and not dirty:
+                    rescan = False
+                    self.refresh()
+                    for wallpaper_id, path in list_items(content_dirs).items():
+                        if not any(w == wallpaper_id for _, w in watches.values()):
+                            add_watch(path, ITEM_MASK, wallpaper_id)
+                ready = [i for i, t in dirty.items() if now - t >= self.DEBOUNCE]
+                if ready:
+                    for wallpaper_id in ready:
+                        del dirty[wallpaper_id]
+                    present = list_items(content_dirs)
+                    changed, removed = self._update({i: present.get(i) for i in ready}, full=False)
+                    self._notify(changed, removed)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _read_events(fd: int):
+        """(wd, mask, name) for every queued event"""
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].split(b'\0', 1)[0].decode(errors='replace')
+                offset += length
+                yield wd, mask, name
+
+# A 1x1 GIF, so fixtures need no image library
+FIXTURE_PREVIEW = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+                   b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+def make_fixture(content_dir: str, count: int, start_id: int = 1000000000):
+    """Fill content_dir with count fake workshop items"""
+    types = ['scene', 'video', 'web']
+    tags = ['Anime', 'Nature', 'Sci-Fi', 'Game', 'Relaxing', 'Abstract']
+    for i in range(count):
+        path = os.path.join(content_dir, str(start_id + i))
+        os.makedirs(path, exist_ok=True)
+        kind = types[i % len(types)]
+        with open(os.path.join(path, 'project.json'), 'w') as f:
+            json.dump({'title': f"Fixture wallpaper {i}", 'type': kind.title(), 'preview': 'preview.gif',
+                       'tags': [tags[i % len(tags)], tags[(i * 7) % len(tags)]],
+                       'file': 'scene.pkg' if kind == 'scene' else 'video.mp4'}, f)
+        with open(os.path.join(path, 'preview.gif'), 'wb') as f:
+            f.write(FIXTURE_PREVIEW)
+        with open(os.path.join(path, 'scene.pkg' if kind == 'scene' else 'video.mp4'), 'wb') as f:
+            f.write(b'\0' * (4096 + i % 8192))
+
+def drop_page_cache() -> bool:
+    """Evict cached file data so a scan hits the disk; needs root"""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+def benchmark(content_dir: Optional[str] = None, count: int = 2000):
+    """Cold scan serial vs parallel, warm start from the index, and inotify latency.
+
+    Without content_dir a temporary fixture tree of count items is used.
+    """
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp()
+    try:
+        if content_dir is None:
+            content_dir = os.path.join(tmp, 'content')
+            make_fixture(content_dir, count)
+        index_path = os.path.join(tmp, 'index.json')
+        for workers in (1, 8):
+            scanner = WorkshopScanner([content_dir], workers=workers)
+            cache = 'dropped' if drop_page_cache() else 'warm'
+            start = time.perf_counter()
+            changed, _ = scanner.refresh()
+            print(f"cold scan, {workers} worker(s), page cache {cache}: "
+                  f"{(time.perf_counter() - start) * 1000:.0f} ms, {len(changed)} items")
+        scanner = WorkshopScanner([content_dir], index_path=index_path)
+        scanner.refresh()
+        start = time.perf_counter()
+        warm = WorkshopScanner([content_dir], index_path=index_path)
+        changed, removed = warm.refresh()
+        items = warm.wallpapers()
+        print(f"warm start from the index: {(time.perf_counter() - start) * 1000:.1f} ms, "
+              f"{len(items)} items, {len(changed)} re-parsed")
+
+        if not os.access(content_dir, os.W_OK) or content_dir != os.path.join(tmp, 'content'):
+            return  # Do not touch a real workshop folder
+        seen = threading.Event()
+        events = []
+        warm.add_listener(lambda c, r: (events.append((c, r)), seen.set()))
+        warm.start()
+        time.sleep(0.3)  # Let the watches go in
+        for label, action in (
+                ('new item', lambda: make_fixture(content_dir, 1, start_id=1900000000)),
+                ('edited project.json', lambda: make_fixture(content_dir, 1, start_id=1000000001)),
+                ('removed item', lambda: shutil.rmtree(os.path.join(content_dir, '1000000002')))):
+            seen.clear()
+            events.clear()
+            start = time.perf_counter()
+            action()
+            ok = seen.wait(5)
+            changed, removed = events[-1] if events else ([], [])
+            print(f"inotify, {label}: {'seen' if ok else 'MISSED'} after "
+                  f"{(time.perf_counter() - start) * 1000:.0f} ms "
+                  f"(debounce {WorkshopScanner.DEBOUNCE * 1000:.0f} ms), "
+                  f"{len(changed)} changed, {len(removed)} removed")
+        warm.stop()
+        print(f"scanner stats: {warm.stats}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main():
+    # python -m utils.workshop_scanner --bench [content dir] [fixture size]
+    # python -m utils.workshop_scanner --fixture <content dir> [count]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--bench':
+        content_dir = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].isdigit() else None
+        count = int(sys.argv[-1]) if sys.argv[-1].isdigit() else 2000
+        benchmark(content_dir, count)
+        return
+    if len(sys.argv) >= 3 and sys.argv[1] == '--fixture':
+        make_fixture(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 100)
+        return
+    scanner = WorkshopScanner()
+    scanner.refresh()
+    for item in scanner.wallpapers():
+        print(f"{item.id}  {item.type:<6} {item.title}  [{', '.join(item.tags)}]")
+
+if __name__ == "__main__":
+    main()
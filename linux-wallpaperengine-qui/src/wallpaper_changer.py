@@ -1,24 +1,371 @@
-import tkinter as tk
-from gui import LoginApp
-import core
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from utils.control import STARTUP_TIMEOUT, ControlClient, ControlError, ControlServer, default_socket_path
+from utils.process_utils import WallpaperManager
+from utils.auto_switch import AutoSwitchScheduler
+from utils.display_utils import DisplayTopology
+from utils.library import WallpaperLibrary
+from utils.workshop_scanner import WorkshopScanner
 
-class WallpaperChanger:
-    def __init__(self, screen_root):
-        self.screen_root = screen_root
-        self.wallpaper_ids = []
+# Same files the GUI uses: library, config and engine state
+STATE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    def fetch_wallpaper_ids(self):
-        # This method will interact with the steam_fetcher to get wallpaper IDs
-        pass
+def read_config_value(config_file, key, default=None):
+    """Read an optional key=value setting from the config file"""
+    try:
+        if os.path.exists(config_file):
+            with open(config_file, 'r') as f:
+                for line in f:
+                    if line.startswith(f'{key}='):
+                        return line.strip().split('=', 1)[1]
+    except Exception as e:
+        print(f"Error loading config: {e}", file=sys.stderr)
+    return default
 
-    def change_wallpaper(self, wallpaper_id):
-        command = f"linux-wallpaperengine --silent --screen-root {self.screen_root} {wallpaper_id}"
-        # Execute the command to change the wallpaper
-        pass
+def read_config_number(config_file, key, default):
+    """A numeric setting; a value that does not parse is reported and replaced by default"""
+    value = read_config_value(config_file, key, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        print(f"Ignoring {key}={value!r} in the config, using {default}", file=sys.stderr)
+        return float(default)
 
-    def update_wallpaper(self):
-        # This method will fetch wallpaper IDs and change the wallpaper
+def read_rss_kb(pid='self') -> int:
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
         pass
+    return 0
+
+class WallpaperChanger:
+    """Headless owner of the wallpaper engines, controlled over a Unix socket.
+
+    Holds the WallpaperManager, the auto-switch scheduler and the wallpaper
+    library (library.db, shared with the GUI; no images), where every
+    wallpaper shown is counted as used. Installed wallpapers are scanned
+    from the workshop folders and followed with inotify, so the library
+    is usable before the GUI ever fetched the subscriptions. The GUI and the command line client
+    are both clients; every request goes through dispatch(), which may be
+    called from several connection threads at once.
+    """
+
+    def __init__(self, state_dir=STATE_DIR, stopping=None):
+        self.state_dir = state_dir
+        self.config_file = os.path.join(state_dir, ".config")
+        self.library = WallpaperLibrary(os.path.join(state_dir, "library.db"))
+        self.library.migrate_json(os.path.join(state_dir, "wallpapers.txt"))
+        self.workshop = WorkshopScanner(index_path=os.path.join(state_dir, ".workshop_index"))
+        self.workshop.refresh()
+        self.library.apply_local(self.workshop.wallpapers(), full=True)
+        self.workshop.add_listener(lambda changed, removed: self.library.apply_local(changed, removed))
+        self.workshop.start()
+        self.started = time.time()
+        self.stopping = stopping or threading.Event()
+        # Adopts engines left running by a previous session instead of restarting them
+        self.manager = WallpaperManager(state_dir=state_dir)
+        self.auto_switcher = AutoSwitchScheduler(
+            self.show,
+            self.manager.prepare_next,
+            state_file=os.path.join(state_dir, ".autoswitch_state"),
+            skip=self.manager.health.is_quarantined
+        )
+        self.display_topology = DisplayTopology()
+        self.commands = {
+            'ping': lambda: True,
+            'set': self.set_wallpaper,
+            'next': self.next_wallpaper,
+            'pause': self.pause,
+            'resume': self.resume,
+            'status': self.status,
+            'list': self.list_wallpapers,
+            'playlist': self.set_playlist,
+            'config': self.configure,
+            'stats': self.stats,
+            'failures': self.failures,
+            'release': self.release,
+            'quit': self.stopping.set,
+        }
+        self.manager.enable_telemetry(
+            interval=read_config_number(self.config_file, 'telemetry_interval', 5),
+            json_path=os.path.join(state_dir, ".engine_stats.json"),
+            prometheus_path=read_config_value(self.config_file, 'prometheus_textfile')
+        )
+
+    def dispatch(self, cmd, args):
+        handler = self.commands.get(cmd)
+        if handler is None:
+            raise ValueError(f"Unknown command {cmd!r}")
+        return handler(**args)
+
+    def show(self, display, wallpaper_id):
+        """Queue wallpaper_id for display and count it as used"""
+        self.manager.change_wallpaper(display, wallpaper_id)
+        self.library.record_use(wallpaper_id)
+
+    def display_names(self, displays=None):
+        """The given displays, or every connected one"""
+        if displays:
+            return [str(d) for d in displays]
+        self.display_topology.refresh()
+        names = [d.name for d in self.display_topology.displays()]
+        if not names:
+            raise ValueError("No displays detected")
+        return names
+
+    def set_wallpaper(self, wallpaper_id, displays=None, wait=False):
+        """Show wallpaper_id on displays (default all). With wait, returns once the engines are up."""
+        wallpaper_id = str(wallpaper_id)
+        displays = self.display_names(displays)
+        if wait:
+            results = self.manager.change_wallpaper_all_displays(wallpaper_id, displays)
+            self.library.record_use(wallpaper_id)
+            return {display: result._asdict() for display, result in results.items()}
+        for display in displays:
+            self.show(display, wallpaper_id)
+        return {display: 'queued' for display in displays}
+
+    def next_wallpaper(self, display=None):
+        """Advance auto-switching displays; other displays step through the library"""
+        if display:
+            displays = [display]
+        else:
+            displays = sorted(set(self.auto_switcher.status()) | {p.display for p in self.manager.active_processes()})
+            displays = displays or self.display_names()
+        playlists = self.auto_switcher.status()
+        ids = [i for i, _ in self.library.subscriptions() if not self.manager.health.is_quarantined(i)]
+        result = {}
+        for name in displays:
+            if name in playlists:
+                self.auto_switcher.skip(name)
+                result[name] = 'playlist'
+                continue
+            if not ids:
+                raise ValueError("The wallpaper library is empty")
+            current = self.manager.current_wallpaper(name)
+            wallpaper_id = ids[(ids.index(current) + 1) % len(ids)] if current in ids else ids[0]
+            self.show(name, wallpaper_id)
+            result[name] = wallpaper_id
+        return result
+
+    def pause(self):
+        """Hold auto-switching and freeze the engines"""
+        self.auto_switcher.pause()
+        self.manager.pause()
+        return True
+
+    def resume(self):
+        self.manager.resume()
+        self.auto_switcher.resume()
+        return True
+
+    def status(self):
+        displays = {}
+        for proc in self.manager.active_processes():
+            displays[proc.display] = {'wallpaper_id': proc.wallpaper_id, 'pid': proc.pid}
+        return {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'rss_kb': read_rss_kb(),
+            'library': self.library.count(),
+            'displays': displays,
+            'playlists': self.auto_switcher.status(),
+            'quarantined': sorted(self.manager.health.quarantined),
+            **self.configure(),
+        }
+
+    def list_wallpapers(self, search='', kind=None, sort='position'):
+        """Library entries matching search, each with the displays currently showing it"""
+        shown = {}
+        for proc in self.manager.active_processes():
+            shown.setdefault(proc.wallpaper_id, []).append(proc.display)
+        entries = self.library.entries()
+        if search or kind or sort != 'position':
+            by_id = {w['id']: w for w in entries}
+            entries = [by_id[i] for i in self.library.search(search, kind=kind, sort=sort)]
+        return [dict(w, displays=sorted(shown.get(w['id'], []))) for w in entries]
+
+    def set_playlist(self, wallpaper_ids, displays=None, interval=300, switch_now=True):
+        """Auto-switch displays (default all) through wallpaper_ids; an empty list stops it"""
+        if not wallpaper_ids:
+            targets = displays or list(self.auto_switcher.status())
+            for display in targets:
+                self.auto_switcher.remove(display)
+                self.manager.clear_standby(display)
+            return self.auto_switcher.status()
+        for display in self.display_names(displays):
+            self.auto_switcher.set_playlist(display, wallpaper_ids, interval, switch_now=switch_now)
+        return self.auto_switcher.status()
+
+    def configure(self, silent=None, prefetch=None, governor=None):
+        """Change the given engine settings; returns all of them"""
+        if silent is not None:
+            self.manager.silent_mode = bool(silent)
+        if prefetch is not None:
+            self.manager.set_prefetch_mode(prefetch)
+        if governor is not None:
+            if governor:
+                self.manager.enable_governor()
+            else:
+                self.manager.disable_governor()
+        return {
+            'silent': self.manager.silent_mode,
+            'prefetch': self.manager.prefetch_mode,
+            'governor': self.manager.governor_enabled(),
+            'governor_state': self.manager.governor.state,
+            'paused': self.manager.paused,
+        }
+
+    def stats(self):
+        telemetry = self.manager.telemetry
+        return {'interval': telemetry.interval,
+                'displays': {display: s._asdict() for display, s in telemetry.latest().items()}}
+
+    def failures(self, limit=200):
+        health = self.manager.health
+        return {'log': health.read_log(limit), 'quarantined': sorted(health.quarantined)}
+
+    def release(self, wallpaper_id=None):
+        """Lift the quarantine for one wallpaper or all of them"""
+        self.manager.health.release(wallpaper_id)
+        return sorted(self.manager.health.quarantined)
+
+    def shutdown(self):
+        self.workshop.stop()
+        self.auto_switcher.shutdown()
+        self.manager.kill_all()
+        self.library.close()
+
+def run_daemon(socket_path=None):
+    socket_path = socket_path or default_socket_path()
+    ready = threading.Event()
+    state = {'changer': None}
+
+    def dispatch(cmd, args):
+        # ping is answered while the changer is still being built, so clients
+        # know the daemon is up; everything else waits for it
+        if cmd == 'ping':
+            return True
+        if not ready.wait(STARTUP_TIMEOUT) or state['changer'] is None:
+            raise ControlError("The wallpaper daemon is still starting" if not ready.is_set()
+                               else "The wallpaper daemon failed to start")
+        return state['changer'].dispatch(cmd, args)
+
+    try:
+        # Claim the socket before adopting engines, a running daemon owns them
+        server = ControlServer(socket_path, dispatch)
+    except (ControlError, OSError) as e:
+        print(f"Cannot start the daemon: {e}", file=sys.stderr)
+        return 1
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stopping.set())
+    server.start()
+    try:
+        # Scans the workshop, migrates the library and adopts running engines
+        state['changer'] = WallpaperChanger(stopping=stopping)
+        ready.set()
+        print(f"Wallpaper daemon {os.getpid()} listening on {socket_path}")
+        sys.stdout.flush()
+        while not stopping.wait(1.0):
+            pass
+    finally:
+        ready.set()
+        server.stop()  # Also removes the socket file
+        if state['changer'] is not None:
+            state['changer'].shutdown()
+    return 0
+
+def print_status(status):
+    print(f"Daemon {status['pid']}, up {status['uptime']:.0f}s, {status['rss_kb'] / 1024:.1f} MB RSS, "
+          f"{status['library']} wallpapers in the library")
+    print(f"Paused: {'yes' if status['paused'] else 'no'}, silent: {'on' if status['silent'] else 'off'}, "
+          f"prefetch: {status['prefetch']}, governor: "
+          f"{status['governor_state'] if status['governor'] else 'off'}")
+    displays = sorted(set(status['displays']) | set(status['playlists']))
+    for display in displays:
+        line = f"{display}: "
+        engine = status['displays'].get(display)
+        line += f"{engine['wallpaper_id']} (pid {engine['pid']})" if engine else "no engine"
+        playlist = status['playlists'].get(display)
+        if playlist:
+            line += (f", auto-switching {playlist['wallpapers']} wallpapers every "
+                     f"{playlist['interval']:.0f}s, next in {playlist['next_in']:.0f}s")
+        print(line)
+    if not displays:
+        print("No wallpapers shown")
+    print(f"Quarantined: {', '.join(status['quarantined']) or 'none'}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Control the wallpaper daemon. Without a command the GUI is started.")
+    parser.add_argument('--socket', help=f"control socket (default {default_socket_path()})")
+    parser.add_argument('--json', action='store_true', help="print raw JSON replies")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('daemon', help="run the headless daemon in the foreground")
+    set_parser = commands.add_parser('set', help="show a wallpaper")
+    set_parser.add_argument('wallpaper_id')
+    set_parser.add_argument('displays', nargs='*', help="default: every connected display")
+    set_parser.add_argument('--wait', action='store_true', help="wait until the engines are up")
+    next_parser = commands.add_parser('next', help="switch to the next wallpaper")
+    next_parser.add_argument('display', nargs='?')
+    playlist_parser = commands.add_parser('playlist', help="auto-switch through wallpapers")
+    playlist_parser.add_argument('wallpaper_ids', nargs='*', help="none to stop auto-switching")
+    playlist_parser.add_argument('--display', action='append', dest='displays')
+    playlist_parser.add_argument('--interval', type=float, default=300)
+    list_parser = commands.add_parser('list', help="list or search the wallpaper library")
+    list_parser.add_argument('search', nargs='*', help="words to look for in id, title, tags and type")
+    list_parser.add_argument('--type', dest='kind', help="scene, video, web, ...")
+    list_parser.add_argument('--sort', default='position',
+                             choices=['position', 'title', 'last_used', 'use_count', 'size'])
+    for name, help_text in (('pause', "hold auto-switching and freeze the engines"),
+                            ('resume', "undo pause"), ('status', "show what is running"),
+                            ('quit', "stop the daemon and its engines")):
+        commands.add_parser(name, help=help_text)
+    args = parser.parse_args()
+
+    if args.command is None:
+        import core
+        core.main()
+        return 0
+    if args.command == 'daemon':
+        return run_daemon(args.socket)
+
+    request = {
+        'set': lambda: ('set', {'wallpaper_id': args.wallpaper_id, 'displays': args.displays,
+                                'wait': args.wait}),
+        'next': lambda: ('next', {'display': args.display}),
+        'list': lambda: ('list', {'search': ' '.join(args.search), 'kind': args.kind, 'sort': args.sort}),
+        'playlist': lambda: ('playlist', {'wallpaper_ids': args.wallpaper_ids, 'displays': args.displays,
+                                          'interval': args.interval}),
+    }.get(args.command, lambda: (args.command, {}))
+    cmd, cmd_args = request()
+    try:
+        result = ControlClient(args.socket).call(cmd, **cmd_args)
+    except ControlError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(result, indent=1))
+    elif cmd == 'status':
+        print_status(result)
+    elif cmd == 'list':
+        for w in result:
+            print(f"{w['id']}  {w['title'] or '-'}"
+                  f"{'  [' + ', '.join(w['displays']) + ']' if w['displays'] else ''}")
+    elif isinstance(result, dict):
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    return 0
 
 if __name__ == "__main__":
-    core.main()
\ No newline at end of file
+    sys.exit(main())